@@ -0,0 +1,114 @@
+"""Benchmarks AI SDK data stream encoding: coalesced chunks vs one chunk per word.
+
+Streams the same answers over loopback TCP connections twice: once with one
+`0:` part written per word, as /invoke did before `encode_updates()`, and
+once through `encode_updates()`. Each chunk is written and drained on its
+own, like an ASGI server sending one body message per chunk. Words are
+produced in bursts of `--burst` with a yield to the event loop in between,
+roughly like model output arriving in network reads.
+
+Usage: python scripts/bench-data-stream.py [--streams 50] [--words 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncGenerator, AsyncIterator, Callable
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.data_stream import encode_updates, finish_part  # noqa: E402
+
+Encoder = Callable[[int, int], AsyncIterator[str]]
+
+WORDS = 'horses "gallop" across\\ open\nfields while riders keep pace'.split(" ")
+
+
+async def updates(words: int, burst: int) -> AsyncGenerator[tuple[str, str], None]:
+    """Yield `words` text updates, yielding to the event loop every `burst`."""
+    for index in range(words):
+        if index % burst == 0:
+            await asyncio.sleep(0)
+        yield "text", WORDS[index % len(WORDS)] + " "
+
+
+async def word_by_word(words: int, burst: int) -> AsyncGenerator[str, None]:
+    """Yield one `0:` part per word, then the finish part."""
+    async for _, word in updates(words, burst):
+        yield f"0:{json.dumps(word)}\n"
+    yield finish_part("stop")
+
+
+async def coalesced(words: int, burst: int) -> AsyncGenerator[str, None]:
+    """Yield the chunks of `encode_updates()`, then the finish part."""
+    async for chunk in encode_updates(updates(words, burst)):
+        yield chunk
+    yield finish_part("stop")
+
+
+async def run(
+    encoder: Encoder, streams: int, words: int, burst: int
+) -> dict[str, float]:
+    """Stream `streams` answers made by `encoder` and return chunks, bytes and times."""
+    totals: dict[str, float] = {"chunks": 0, "bytes": 0}
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async for chunk in encoder(words, burst):
+            data = chunk.encode()
+            writer.write(data)
+            await writer.drain()
+            totals["chunks"] += 1
+            totals["bytes"] += len(data)
+        writer.close()
+
+    async def read(port: int) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while await reader.read(65536):
+            pass
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(read(port) for _ in range(streams)))
+    totals["wall"] = time.perf_counter() - wall
+    totals["cpu"] = time.process_time() - cpu
+    server.close()
+    await server.wait_closed()
+    return totals
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run both encoders and print their chunks, bytes, throughput and CPU time."""
+    await run(coalesced, 2, 100, args.burst)  # warm up
+    results = {}
+    for name, encoder in (("word-by-word", word_by_word), ("coalesced", coalesced)):
+        results[name] = await run(encoder, args.streams, args.words, args.burst)
+
+    total_words = args.streams * args.words
+    sys.stdout.write(
+        f"{args.streams} streams x {args.words} words, bursts of {args.burst}\n"
+    )
+    sys.stdout.write(
+        f"{'encoder':<14}{'chunks':>10}{'bytes':>12}{'words/s':>12}{'cpu s':>9}\n"
+    )
+    for name, result in results.items():
+        sys.stdout.write(
+            f"{name:<14}{result['chunks']:>10}{result['bytes']:>12}"
+            f"{total_words / result['wall']:>12.0f}{result['cpu']:>9.2f}\n"
+        )
+    old, new = results["word-by-word"], results["coalesced"]
+    sys.stdout.write(
+        f"throughput: {old['wall'] / new['wall']:.1f}x, chunks: {old['chunks'] / new['chunks']:.0f}x fewer\n"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--words", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,130 @@
+"""Benchmarks the local BM25 index on a synthetic corpus.
+
+Writes `--docs` documents of `--words` words drawn from a Zipf-distributed
+vocabulary, indexes them, then reports index size and build time, search
+latency percentiles for `--queries` queries of 1-4 words from the same
+distribution, and the time of an incremental refresh after `--changes`
+documents were rewritten or added.
+
+Usage: python scripts/bench-local-index.py [--docs 100000] [--queries 1000]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Sequence
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.local_index import LocalIndex  # noqa: E402
+
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    """Return `size` random words of 3 to 9 letters."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def write_corpus(
+    path: str,
+    docs: int,
+    words: int,
+    vocab: list[str],
+    cum_weights: Sequence[float],
+    rng: random.Random,
+    prefix: str = "doc",
+) -> None:
+    """Write `docs` documents of `words` words drawn from `vocab`."""
+    for number in range(docs):
+        folder = os.path.join(path, f"{number % 100:02d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{prefix}-{number}.txt"), "w") as f:
+            f.write(" ".join(rng.choices(vocab, cum_weights=cum_weights, k=words)))
+
+
+def percentile(samples: list[float], share: float) -> float:
+    """Return the `share` percentile of `samples` in milliseconds."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000
+
+
+def size_of(path: str) -> int:
+    """Return the total size in bytes of the files under `path`."""
+    return sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(path)
+        for file in files
+    )
+
+
+def main(args: argparse.Namespace) -> None:
+    """Build, search and refresh an index of a synthetic corpus."""
+    rng = random.Random(7)
+    vocab = vocabulary(args.vocabulary, rng)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocab))))
+    with tempfile.TemporaryDirectory() as root:
+        docs_dir, index_dir = os.path.join(root, "docs"), os.path.join(root, "index")
+        started = time.perf_counter()
+        write_corpus(docs_dir, args.docs, args.words, vocab, weights, rng)
+        sys.stdout.write(
+            f"wrote {args.docs} documents in {time.perf_counter() - started:.1f}s\n"
+        )
+
+        index = LocalIndex(docs_dir, index_dir)
+        result = index.refresh()
+        sys.stdout.write(
+            f"built index in {result['seconds']:.1f}s: {size_of(index_dir) / 1e6:.0f} MB, "
+            f"{index.stats()['terms']} terms\n"
+        )
+
+        started = time.perf_counter()
+        reopened = LocalIndex(docs_dir, index_dir)
+        reopened.load()
+        sys.stdout.write(
+            f"opened index in {(time.perf_counter() - started) * 1000:.0f} ms\n"
+        )
+
+        queries = [
+            " ".join(rng.choices(vocab, cum_weights=weights, k=rng.randint(1, 4)))
+            for _ in range(args.queries)
+        ]
+        latencies: list[float] = []
+        for query in queries:
+            started = time.perf_counter()
+            reopened.search(query, k=3)
+            latencies.append(time.perf_counter() - started)
+        sys.stdout.write(
+            f"search: p50 {percentile(latencies, 0.5):.2f} ms, "
+            f"p95 {percentile(latencies, 0.95):.2f} ms, "
+            f"p99 {percentile(latencies, 0.99):.2f} ms, "
+            f"mean {statistics.mean(latencies) * 1000:.2f} ms\n"
+        )
+
+        time.sleep(0.01)  # a later mtime for the rewritten files
+        write_corpus(docs_dir, args.changes, args.words, vocab, weights, rng)
+        write_corpus(
+            docs_dir, args.changes, args.words, vocab, weights, rng, prefix="new"
+        )
+        result = index.refresh()
+        sys.stdout.write(
+            f"refresh after {args.changes} changed and {args.changes} new documents: "
+            f"{result['seconds'] * 1000:.0f} ms, {result['segments']} segments\n"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=120)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=100)
+    main(parser.parse_args())
@@ -0,0 +1,140 @@
+"""Benchmarks the overhead of /metrics instrumentation on /invoke.
+
+Runs /invoke in process against a fake model that calls create_horse_fact and
+answers instantly, so requests are as short as they get and the relative cost
+of recording is at its highest. Requests alternate between metrics enabled and
+disabled; the direct cost of the recording calls made per request is also
+measured and compared to the mean request time.
+
+Usage: python scripts/bench-metrics.py [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from typing import AsyncGenerator
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+from google.adk.agents import Agent  # noqa: E402
+from google.adk.models.base_llm import BaseLlm  # noqa: E402
+from google.adk.models.llm_request import LlmRequest  # noqa: E402
+from google.adk.models.llm_response import LlmResponse  # noqa: E402
+from google.genai import types  # noqa: E402
+from typing_extensions import override  # noqa: E402
+
+from src import app as app_module  # noqa: E402
+from src import metrics  # noqa: E402
+from src.orchestrator import root_agent  # noqa: E402
+from src.utils import create_horse_fact  # noqa: E402
+
+
+class InstantLlm(BaseLlm):
+    """Calls create_horse_fact, then streams a short answer."""
+
+    model: str = "instant-llm"
+
+    @override
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        last = llm_request.contents[-1]
+        if not any(part.function_response for part in last.parts or []):
+            call = types.FunctionCall(name="create_horse_fact", args={})
+            yield LlmResponse(
+                content=types.Content(
+                    role="model", parts=[types.Part(function_call=call)]
+                )
+            )
+            return
+        for word in ("Horses ", "cannot ", "sleep."):
+            yield LlmResponse(
+                content=types.Content(role="model", parts=[types.Part(text=word)]),
+                partial=True,
+            )
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text="Horses cannot sleep.")]
+            ),
+            turn_complete=True,
+        )
+
+
+async def timed_requests(
+    client: httpx.AsyncClient, count: int, enabled: bool
+) -> list[float]:
+    """Return the durations of `count` /invoke requests with metrics `enabled`."""
+    samples = []
+    for index in range(count):
+        metrics.registry.enabled = enabled
+        body = {"messages": [{"role": "user", "content": f"horse {index} {enabled}"}]}
+        started = time.perf_counter()
+        response = await client.post("/invoke", json=body)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return samples
+
+
+def recording_cost(rounds: int = 100_000) -> float:
+    """Return the cost of the recording calls one AI SDK request makes."""
+    labels = ("horse", "custom", "ai_sdk")
+    metrics.registry.enabled = True
+    started = time.perf_counter()
+    for _ in range(rounds):
+        metrics.REQUESTS.inc(labels)
+        metrics.request_labels.set(labels)
+        for stage in ("parse", "routing", "first_model_event", "final_response"):
+            metrics.observe_stage(stage, 0.001, labels)
+        metrics.observe_stage("stream_flush", 0.0001, labels)
+        metrics.TOOL_SECONDS.observe(
+            0.0001, ("create_horse_fact", "a", "horse", "ai_sdk")
+        )
+        # Timestamps taken for the stages and each streamed part.
+        for _ in range(12):
+            time.perf_counter()
+    return (time.perf_counter() - started) / rounds
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Compare request times with metrics on and off and write the results."""
+    root_agent._custom = Agent(
+        name="custom_tools_agent",
+        model=InstantLlm(),
+        tools=[create_horse_fact],
+        before_tool_callback=metrics.before_tool,
+        after_tool_callback=metrics.after_tool,
+    )
+    app_module.RESPONSE_CACHE_ENABLED = False
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await timed_requests(client, 100, True)  # warm up
+            on, off = [], []
+            for _ in range(10):
+                on += await timed_requests(client, args.requests // 20, True)
+                off += await timed_requests(client, args.requests // 20, False)
+
+    mean_on, mean_off = statistics.mean(on), statistics.mean(off)
+    cost = recording_cost()
+    sys.stdout.write(
+        f"requests per arm: {len(on)}\n"
+        f"mean request, metrics on:  {mean_on * 1000:.3f} ms\n"
+        f"mean request, metrics off: {mean_off * 1000:.3f} ms\n"
+        f"end-to-end difference:     {(mean_on / mean_off - 1) * 100:+.2f}% (noisy)\n"
+        f"recording cost / request:  {cost * 1e6:.1f} us\n"
+        f"recording overhead:        {cost / mean_off * 100:.3f}% of request time\n"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
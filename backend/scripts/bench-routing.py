@@ -0,0 +1,116 @@
+"""Benchmarks orchestrator routing throughput with a large route table.
+
+Compares the compiled RouteTable against checking each route in turn.
+
+Usage: python scripts/bench-routing.py [--routes 500] [--queries 20000]
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+from typing import Callable
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.routing import Route, RouteTable  # noqa: E402
+
+
+def random_word(rng: random.Random, length: int) -> str:
+    """Return a random lowercase word of `length` letters."""
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def make_routes(rng: random.Random, count: int, regex_share: float) -> list[Route]:
+    """Return `count` random routes, `regex_share` of them using a pattern."""
+    routes = []
+    for index in range(count):
+        if rng.random() < regex_share:
+            patterns = (rf"\b{random_word(rng, 5)}\d+\b",)
+            routes.append(Route(name=f"r{index}", agent="custom", patterns=patterns))
+        else:
+            keywords = tuple(random_word(rng, rng.randint(5, 9)) for _ in range(3))
+            routes.append(Route(name=f"r{index}", agent="custom", keywords=keywords))
+    return routes
+
+
+def make_queries(rng: random.Random, routes: list[Route], count: int) -> list[str]:
+    """Return `count` random queries, half holding a keyword of some route."""
+    queries = []
+    for _ in range(count):
+        words = [random_word(rng, rng.randint(2, 8)) for _ in range(12)]
+        route = rng.choice(routes)
+        if route.keywords and rng.random() < 0.5:
+            words.insert(rng.randint(0, len(words)), rng.choice(route.keywords))
+        queries.append(" ".join(words))
+    return queries
+
+
+def linear_router(routes: list[Route], default: Route) -> Callable[[str], Route]:
+    """Return a router checking each route in turn."""
+    compiled = [
+        (
+            route,
+            [k.lower() for k in route.keywords],
+            [re.compile(p, re.I) for p in route.patterns],
+        )
+        for route in routes
+    ]
+
+    def match(text: str) -> Route:
+        text = text.lower()
+        for route, keywords, patterns in compiled:
+            if any(k in text for k in keywords) or any(
+                p.search(text) for p in patterns
+            ):
+                return route
+        return default
+
+    return match
+
+
+def throughput(
+    match: Callable[[str], Route], queries: list[str]
+) -> tuple[float, float]:
+    """Return the queries per second and microseconds per query of `match`."""
+    start = time.perf_counter()
+    for query in queries:
+        match(query)
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, elapsed / len(queries) * 1e6
+
+
+def main() -> None:
+    """Run the benchmark for growing route tables and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--regex-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    default = Route(name="search", agent="search")
+    for count in sorted({10, 100, args.routes}):
+        routes = make_routes(rng, count, args.regex_share)
+        queries = make_queries(rng, routes, args.queries)
+        start = time.perf_counter()
+        table = RouteTable(routes, default=default)
+        compile_ms = (time.perf_counter() - start) * 1000
+        linear = linear_router(routes, default)
+        assert all(table.match(q) == linear(q) for q in queries[:1000])
+
+        compiled_qps, compiled_us = throughput(table.match, queries)
+        linear_qps, linear_us = throughput(linear, queries)
+        sys.stdout.write(
+            f"routes={count:<4} "
+            f"compiled: {compiled_qps:>9,.0f} q/s ({compiled_us:.1f}us)  "
+            f"linear: {linear_qps:>9,.0f} q/s ({linear_us:.1f}us)  "
+            f"compile={compile_ms:.1f}ms\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmarks append and load latency of the SQLite session service.
+
+Usage: python scripts/bench-sqlite-sessions.py [--sessions 10000] [--turns 3]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from google.adk.events import Event  # noqa: E402
+from google.adk.sessions import Session  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from src.sqlite_session_service import SqliteSessionService  # noqa: E402
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Return the `pct` percentile of `samples`."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name: str, samples: list[float]) -> None:
+    """Write the count, median, p99 and mean of `samples` in milliseconds."""
+    ms = [s * 1000 for s in samples]
+    sys.stdout.write(
+        f"{name:<28} n={len(ms):<7} p50={percentile(ms, 50):.3f}ms "
+        f"p99={percentile(ms, 99):.3f}ms mean={statistics.fmean(ms):.3f}ms\n"
+    )
+
+
+def make_event(author: str, text: str) -> Event:
+    """Return an event of `author` holding `text`."""
+    return Event(
+        author=author,
+        invocation_id="bench",
+        content=types.Content(
+            role="user" if author == "user" else "model", parts=[types.Part(text=text)]
+        ),
+    )
+
+
+async def run(
+    db_path: str, sessions: int, turns: int
+) -> tuple[list[float], list[float], float, list[float], list[float], int]:
+    """Time creating, appending to and loading `sessions` sessions."""
+    service = SqliteSessionService(db_path)
+    create: list[float] = []
+    append: list[float] = []
+    load: list[float] = []
+    recent: list[float] = []
+
+    handles: list[Session] = []
+    for i in range(sessions):
+        start = time.perf_counter()
+        handles.append(
+            await service.create_session(
+                app_name="bench", user_id=f"u{i % 100}", session_id=f"s{i}"
+            )
+        )
+        create.append(time.perf_counter() - start)
+
+    wall = time.perf_counter()
+    for turn in range(turns):
+        for session in handles:
+            for author in ("user", "agent"):
+                event = make_event(author, f"{author} turn {turn} of {session.id}")
+                start = time.perf_counter()
+                await service.append_event(session, event)
+                append.append(time.perf_counter() - start)
+            # Let the write-behind task run as it would between requests.
+            await asyncio.sleep(0)
+    await service.flush()
+    append_wall = time.perf_counter() - wall
+
+    for i in range(0, sessions, max(1, sessions // 2000)):
+        start = time.perf_counter()
+        await service.get_session(
+            app_name="bench", user_id=f"u{i % 100}", session_id=f"s{i}"
+        )
+        load.append(time.perf_counter() - start)
+    service.max_events = 2
+    for i in range(0, sessions, max(1, sessions // 2000)):
+        start = time.perf_counter()
+        await service.get_session(
+            app_name="bench", user_id=f"u{i % 100}", session_id=f"s{i}"
+        )
+        recent.append(time.perf_counter() - start)
+
+    batches = service.flushed_batches
+    await service.close()
+    return create, append, append_wall, load, recent, batches
+
+
+def main() -> None:
+    """Run the benchmark and write the report."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        create, append, append_wall, load, recent, batches = asyncio.run(
+            run(db_path, args.sessions, args.turns)
+        )
+        size_mb = os.path.getsize(db_path) / 1e6
+
+    sys.stdout.write(
+        f"sessions={args.sessions} events={len(append)} batches={batches} "
+        f"db={size_mb:.1f}MB\n"
+    )
+    report("create_session", create)
+    report("append_event (request path)", append)
+    sys.stdout.write(
+        f"{'append throughput':<28} {len(append) / append_wall:,.0f} events/s "
+        "incl. commits\n"
+    )
+    report(f"get_session (full, {2 * args.turns} ev)", load)
+    report("get_session (last 2 events)", recent)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    sys.stdout.write(f"max RSS {rss_mb:.0f}MB\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Benchmarks server cold start and checks it against a time budget.
+
+1. Imports `src.app` in fresh interpreters with `-X importtime` and breaks the
+   import time down by package (self time of all modules in each package).
+2. Starts uvicorn with the eager (`src.app:app`) and the lazy (`src.asgi:app`)
+   entry points and measures the time until `/health` and `/ready` answer.
+
+Exits with status 1 if the median import time of `src.app` exceeds
+`--import-budget-ms` or the lazy server takes longer than
+`--health-budget-ms` to answer `/health`, so it can guard against regressions
+in CI.
+
+Usage: python scripts/bench-startup.py [--runs 3] [--import-budget-ms 2500]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..")
+
+
+def package(module: str) -> str:
+    """Return the group a module is reported under, e.g. google.adk or src.app."""
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] in ("google", "src") else parts[0]
+
+
+def import_times(module: str) -> tuple[float, dict[str, float]]:
+    """Return the total and per-package import time of `module` in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND,
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "MODEL_BACKEND": "fake"},
+    )
+    by_package: dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[12:].split("|"))
+        by_package[package(name)] += int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    return total, by_package
+
+
+def time_to_health(target: str, timeout: float = 60.0) -> tuple[float, float]:
+    """Start uvicorn with `target` and return seconds until /health and /ready."""
+    socket_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            target,
+            "--uds",
+            socket_path,
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACKEND,
+        env={**os.environ, "MODEL_BACKEND": "fake"},
+    )
+    client = httpx.Client(
+        transport=httpx.HTTPTransport(uds=socket_path), base_url="http://bench"
+    )
+    healthy = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if healthy is None and client.get("/health").status_code == 200:
+                    healthy = time.perf_counter() - started
+                if client.get("/ready").status_code == 200:
+                    ready = time.perf_counter() - started
+                    return (healthy if healthy is not None else ready), ready
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"{target} did not become ready in {timeout}s")
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Report import and startup times and exit non-zero when over budget."""
+    totals: list[float] = []
+    packages: defaultdict[str, list[float]] = defaultdict(list)
+    for _ in range(args.runs):
+        total, by_package = import_times("src.app")
+        totals.append(total)
+        for name, seconds in by_package.items():
+            packages[name].append(seconds)
+    import_ms = statistics.median(totals) * 1000
+    sys.stdout.write(f"import src.app: {import_ms:.0f} ms (median of {args.runs})\n")
+    ranked = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+    for name, samples in ranked[: args.top]:
+        sys.stdout.write(f"  {name:<32}{statistics.median(samples) * 1000:>8.0f} ms\n")
+    lazy_ms = import_times("src.asgi")[0] * 1000
+    sys.stdout.write(f"import src.asgi: {lazy_ms:.0f} ms\n")
+
+    sys.stdout.write(f"{'entry point':<16}{'health':>10}{'ready':>10}\n")
+    lazy_health = 0.0
+    for target in ("src.app:app", "src.asgi:app"):
+        health, ready = time_to_health(target)
+        if target == "src.asgi:app":
+            lazy_health = health * 1000
+        sys.stdout.write(f"{target:<16}{health * 1000:>8.0f}ms{ready * 1000:>8.0f}ms\n")
+
+    failures: list[str] = []
+    if import_ms > args.import_budget_ms:
+        failures.append(
+            f"import src.app {import_ms:.0f} ms > {args.import_budget_ms} ms"
+        )
+    if lazy_health > args.health_budget_ms:
+        failures.append(
+            f"lazy /health {lazy_health:.0f} ms > {args.health_budget_ms} ms"
+        )
+    for failure in failures:
+        sys.stdout.write(f"OVER BUDGET: {failure}\n")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--import-budget-ms", type=float, default=2500)
+    parser.add_argument("--health-budget-ms", type=float, default=500)
+    main(parser.parse_args())
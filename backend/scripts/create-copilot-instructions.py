@@ -1,17 +1,20 @@
-from pathlib import Path
+"""Write copilot-instructions.txt with the dependencies and folder structure."""
+
 import os
+import sys
+from pathlib import Path
 
 import pathspec
 
 
-def read_pyproject_toml(script_path):
-    """Reads and returns the full content of pyproject.toml located in the script's directory."""
+def read_pyproject_toml(script_path: Path) -> str:
+    """Read and return the full content of pyproject.toml located in the script's directory."""
     pyproject_toml_path = script_path.parent.parent / "pyproject.toml"
 
     if not pyproject_toml_path.exists():
         return "No pyproject.toml file found in the script directory."
 
-    with open(pyproject_toml_path, "r") as file:
+    with open(pyproject_toml_path) as file:
         try:
             pyproject_content = file.read()
             return pyproject_content
@@ -19,14 +22,14 @@ def read_pyproject_toml(script_path):
             return f"Error reading pyproject.toml file: {e}"
 
 
-def get_folder_structure(script_path, ignore_file=".gitignore"):
-    """Generates a folder structure representation, respecting .gitignore with glob syntax, and always ignoring .git directory."""
+def get_folder_structure(script_path: Path, ignore_file: str = ".gitignore") -> str:
+    """Generate a folder structure representation, respecting .gitignore with glob syntax, and always ignoring .git directory."""
     project_root = script_path.parents[2]
     gitignore_path = project_root / ignore_file
 
     ignored_paths = None
     if gitignore_path.exists():
-        with open(gitignore_path, "r") as file:
+        with open(gitignore_path) as file:
             ignored_paths = pathspec.PathSpec.from_lines("gitwildmatch", file)
 
     folder_structure = []
@@ -55,7 +58,6 @@ def get_folder_structure(script_path, ignore_file=".gitignore"):
 
         for filename in filenames:
             file_path = relative_path / filename
-            file_path_parts = file_path.parts
 
             if not ignored_paths or not ignored_paths.match_file(str(file_path)):
                 # Adjust indent for files
@@ -69,8 +71,8 @@ def get_folder_structure(script_path, ignore_file=".gitignore"):
     return "\n".join(folder_structure)
 
 
-def create_copilot_instructions():
-    """Creates the copilot-instructions.txt file and prints pyproject.toml content to stdout."""
+def create_copilot_instructions() -> None:
+    """Create the copilot-instructions.txt file and print pyproject.toml content to stdout."""
     script_path = Path(__file__).resolve()
     pyproject_content = read_pyproject_toml(script_path)
     instructions = (
@@ -86,7 +88,7 @@ def create_copilot_instructions():
     with open(output_path, "w") as file:
         file.write(instructions)
 
-    print(f"copilot-instructions.txt has been created at {output_path}.")
+    sys.stdout.write(f"copilot-instructions.txt has been created at {output_path}.\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+"""Drives /invoke at a target request rate and reports latency and throughput.
+
+By default it starts the server itself with MODEL_BACKEND=fake, so no API key
+is needed; FAKE_GEMINI_* variables (latency, token rate, tool calls, injected
+429s and timeouts) are passed through. Use --url to load an already running
+server instead (memory growth is then not reported).
+
+Requests arrive open-loop at --rps, with at most --concurrency in flight, and
+alternate between the legacy JSON and the AI SDK streaming format unless
+--format picks one. Queries are unique by default so the response cache and
+single flight do not hide the agent's cost.
+
+Usage: python scripts/load-test.py [--rps 20] [--duration 30] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Coroutine
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+# Format, status code or error, latency and time to first byte, in seconds.
+Result = tuple[str, int | str, float, float | None]
+
+QUERIES = ["tell me a horse fact", "roll a dice", "what is the capital of peru"]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Return the `pct` percentile of `samples`."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_mb(pid: int) -> float | None:
+    """Return the resident memory of a process in MB (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def free_port() -> int:
+    """Return a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def start_server(port: int) -> subprocess.Popen[bytes]:
+    """Start the server with the fake model on `port` and wait until it answers."""
+    env = {"MODEL_BACKEND": "fake", "LOG_LEVEL": "WARNING", **os.environ}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.app:app", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/runs/stats", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+def payload(index: int, request_format: str, unique: bool) -> dict[str, Any]:
+    """Return the body of request `index` in `request_format`."""
+    query = QUERIES[index % len(QUERIES)]
+    if unique:
+        query = f"{query} #{index}"
+    if request_format == "legacy":
+        return {"query": query}
+    return {"messages": [{"role": "user", "content": query}]}
+
+
+async def one_request(
+    client: httpx.AsyncClient,
+    url: str,
+    index: int,
+    request_format: str,
+    unique: bool,
+    results: list[Result],
+) -> None:
+    """Send request `index` and append its result to `results`."""
+    started = time.perf_counter()
+    ttfb = None
+    status: int | str
+    try:
+        async with client.stream(
+            "POST", f"{url}/invoke", json=payload(index, request_format, unique)
+        ) as response:
+            async for _ in response.aiter_raw():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.append((request_format, status, time.perf_counter() - started, ttfb))
+
+
+async def run_load(url: str, args: argparse.Namespace) -> tuple[list[Result], float]:
+    """Send requests to `url` at the target rate; return the results and duration."""
+    formats = ["legacy", "ai_sdk"] if args.format == "mixed" else [args.format]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    timeout = httpx.Timeout(args.request_timeout)
+    results: list[Result] = []
+    tasks = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def limited(coro: Coroutine[Any, Any, None]) -> None:
+        async with slots:
+            await coro
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        total = int(args.rps * args.duration)
+        for index in range(total):
+            # Open loop: send on schedule whether or not earlier requests finished.
+            await asyncio.sleep(
+                max(0.0, started + index / args.rps - time.perf_counter())
+            )
+            request_format = formats[index % len(formats)]
+            tasks.append(
+                asyncio.create_task(
+                    limited(
+                        one_request(
+                            client, url, index, request_format, args.unique, results
+                        )
+                    )
+                )
+            )
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def report(results: list[Result], elapsed: float) -> None:
+    """Write the throughput, status codes and latency percentiles per format."""
+    sys.stdout.write(
+        f"requests: {len(results)} in {elapsed:.1f}s "
+        f"({len(results) / elapsed:.1f} req/s)\n"
+    )
+    statuses: dict[int | str, int] = {}
+    for _, status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    sys.stdout.write(
+        "status codes: "
+        + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items(), key=str))
+        + "\n"
+    )
+    for request_format in sorted({r[0] for r in results}):
+        ok = [r for r in results if r[0] == request_format and r[1] == 200]
+        if not ok:
+            continue
+        latency = [r[2] * 1000 for r in ok]
+        ttfb = [r[3] * 1000 for r in ok if r[3] is not None]
+        sys.stdout.write(
+            f"{request_format:7s} ok={len(ok):5d}  "
+            f"latency ms p50={percentile(latency, 50):7.1f} "
+            f"p95={percentile(latency, 95):7.1f} p99={percentile(latency, 99):7.1f}  "
+            f"ttfb ms p50={percentile(ttfb, 50):7.1f} p95={percentile(ttfb, 95):7.1f} "
+            f"p99={percentile(ttfb, 99):7.1f}\n"
+        )
+
+
+def main() -> None:
+    """Run the load test and write the report."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="load a running server instead of starting one")
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--format", choices=["mixed", "legacy", "ai_sdk"], default="mixed"
+    )
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument(
+        "--repeat-queries",
+        dest="unique",
+        action="store_false",
+        help="reuse a few queries so caching and single flight apply",
+    )
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        rss_before = rss_mb(server.pid) if server else None
+        results, elapsed = asyncio.run(run_load(url.rstrip("/"), args))
+        rss_after = rss_mb(server.pid) if server else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report(results, elapsed)
+    if rss_before is not None and rss_after is not None:
+        sys.stdout.write(
+            f"server memory: {rss_before:.1f} MB -> {rss_after:.1f} MB "
+            f"({rss_after - rss_before:+.1f} MB)\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
+"""The agent backend; loads .env settings on import."""
+
+from typing import Any
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from .orchestrator import root_agent
-
 __all__ = ["root_agent"]
+
+
+def __getattr__(name: str) -> Any:
+    # The agents import google-adk, so they are only loaded when asked for;
+    # importing a helper module such as src.telemetry stays cheap.
+    if name == "root_agent":
+        from .orchestrator import root_agent
+
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
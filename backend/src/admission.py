@@ -0,0 +1,329 @@
+"""Admission control, rate limits and retries for agent runs and model calls."""
+
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import AsyncGenerator, Callable
+
+import httpx
+from google.adk.models import Gemini
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai.errors import APIError
+from typing_extensions import override
+
+from src.prompt_cache import prompt_cache_stats
+from src.telemetry import telemetry
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint."""
+
+    def __init__(self, retry_after: float, reason: str) -> None:
+        """Create the error with a Retry-After hint in seconds."""
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Caps concurrent agent runs, with a bounded FIFO wait queue.
+
+    Up to `max_in_flight` runs are admitted at once. Further requests wait in a
+    queue of at most `max_queue` entries for up to `queue_timeout` seconds;
+    requests that find the queue full, or time out waiting, are rejected with
+    `Overloaded` so the server can answer 503 right away instead of piling up
+    timeouts. The Retry-After hint is estimated from recent run durations.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 64,
+        queue_timeout: float | None = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a controller with no runs in flight.
+
+        Args:
+            max_in_flight: Runs admitted at once.
+            max_queue: Requests that may wait for a slot.
+            queue_timeout: Seconds a request waits before it is rejected;
+                None waits until a slot frees up.
+            clock: Returns the current time in seconds.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._clock = clock
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_run_seconds = 1.0
+
+    def retry_after(self) -> float:
+        """Estimate how long until a new request would be admitted."""
+        backlog = len(self._waiters) + 1
+        return max(1.0, self.avg_run_seconds * backlog / self.max_in_flight)
+
+    async def acquire(self) -> float:
+        """Wait for a run slot.
+
+        Returns:
+            The admission time, to be passed back to `release()`.
+
+        Raises:
+            Overloaded: If the wait queue is full or the wait timed out.
+        """
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return self._clock()
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after(), "Admission queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except TimeoutError:
+            if waiter.done():
+                # The slot was handed over just as the wait timed out.
+                self.admitted += 1
+                return self._clock()
+            self._waiters.remove(waiter)
+            self.timed_out += 1
+            raise Overloaded(self.retry_after(), "Timed out waiting for admission")
+        except BaseException:
+            if waiter.done():
+                self.release(self._clock())
+            else:
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+        return self._clock()
+
+    def release(self, admitted_at: float) -> None:
+        """Free a run slot, handing it to the next waiter if there is one."""
+        duration = self._clock() - admitted_at
+        self.avg_run_seconds = 0.8 * self.avg_run_seconds + 0.2 * duration
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict[str, float]:
+        """Return admission counters and the current load."""
+        return {
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_run_seconds": round(self.avg_run_seconds, 3),
+        }
+
+
+class TokenBucket:
+    """Token-bucket rate limiter that queues callers instead of failing them.
+
+    Each call reserves a token; when the bucket is empty the caller sleeps
+    until its reserved token has been refilled, so callers are served in order
+    at `rate` per second with bursts of up to `burst`.
+    """
+
+    def __init__(
+        self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Create a full bucket refilled with `rate` tokens per second."""
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        """Wait until a token is available."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def parse_rate_limits(spec: str) -> dict[str, float]:
+    """Parse per-model rate limits written as "model=requests_per_second,..."."""
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, rate = item.split("=", 1)
+            limits[model.strip()] = float(rate)
+    return limits
+
+
+class ModelLimiter:
+    """Per-model request rate limits plus retry policy for model calls."""
+
+    def __init__(
+        self,
+        rates: dict[str, float] | None = None,
+        burst: float = 10.0,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+    ) -> None:
+        """Create a limiter.
+
+        Args:
+            rates: Requests per second per model; models not listed are unlimited.
+            burst: Requests a model may get back to back.
+            max_retries: Retries of a failed model call.
+            base_delay: Backoff of the first retry in seconds.
+            max_delay: Longest backoff in seconds.
+        """
+        self.buckets = {
+            model: TokenBucket(rate, burst) for model, rate in (rates or {}).items()
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.failures = 0
+
+    async def acquire(self, model: str) -> None:
+        """Wait for the model's rate limit, if it has one."""
+        bucket = self.buckets.get(model)
+        if bucket is not None:
+            await bucket.acquire()
+
+    def backoff(self, attempt: int, hint: float | None) -> float:
+        """Return the delay before retry `attempt` (0-based).
+
+        Uses exponential backoff with full jitter, but never waits less than
+        the server's retry-after hint.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        return delay
+
+    def stats(self) -> dict[str, int]:
+        """Return retry counters."""
+        return {"model_retries": self.retries, "model_failures": self.failures}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return whether a model call error is transient (quota, 5xx, network)."""
+    if isinstance(error, APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+_RETRY_DELAY = re.compile(r"retryDelay'?\"?:\s*'?\"?(\d+(?:\.\d+)?)s")
+
+
+def retry_after_hint(error: BaseException) -> float | None:
+    """Return the server's retry-after hint in seconds, if the error has one.
+
+    Looks at the Retry-After response header and at the RetryInfo detail that
+    Gemini includes in quota errors.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    details = getattr(error, "details", None)
+    if details:
+        found = _RETRY_DELAY.search(str(details))
+        if found:
+            return float(found.group(1))
+    return None
+
+
+model_limiter = ModelLimiter(
+    rates=parse_rate_limits(os.getenv("MODEL_RATE_LIMITS", "")),
+    burst=float(os.getenv("MODEL_RATE_BURST", "10")),
+    max_retries=int(os.getenv("MODEL_MAX_RETRIES", "3")),
+    base_delay=float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5")),
+    max_delay=float(os.getenv("MODEL_RETRY_MAX_DELAY", "20")),
+)
+
+
+class AdmittedGemini(Gemini):
+    """Gemini model that applies `model_limiter` to every call.
+
+    Calls wait for the model's rate limit, and quota (429), 5xx and network
+    errors are retried with exponential backoff and jitter, honoring the
+    server's retry-after hint. A call is only retried if it failed before
+    yielding any output. Responses are counted in `prompt_cache_stats`.
+    """
+
+    async def _call_model(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """Make one model call; overridden by stand-in backends."""
+        async for response in super().generate_content_async(llm_request, stream):
+            yield response
+
+    @override
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        attempt = 0
+        while True:
+            await model_limiter.acquire(self.model)
+            produced = False
+            try:
+                async for response in self._call_model(llm_request, stream):
+                    produced = True
+                    prompt_cache_stats.observe(self.model, response)
+                    yield response
+                return
+            except Exception as e:
+                if (
+                    produced
+                    or attempt >= model_limiter.max_retries
+                    or not is_retryable(e)
+                ):
+                    model_limiter.failures += 1
+                    raise
+                delay = model_limiter.backoff(attempt, retry_after_hint(e))
+                telemetry.warning(
+                    "Model call failed, retrying",
+                    model=self.model,
+                    error=str(e),
+                    delay=round(delay, 2),
+                )
+                model_limiter.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+def retry_after_header(seconds: float) -> str:
+    """Format a Retry-After header value (whole seconds, rounded up)."""
+    return str(max(1, math.ceil(seconds)))
@@ -1,18 +1,31 @@
+"""Agent answering with the custom horse fact and dice tools."""
+
 from google.adk.agents import Agent
-from src.utils import create_horse_fact, roll_a_dice
 from google.genai import types
 
+from src.metrics import after_tool, before_tool, on_tool_error
+from src.models import agent_model
+from src.telemetry import end_tool_span, fail_tool_span, start_tool_span
+from src.tool_runtime import tool_runtime
+from src.utils import create_horse_fact, roll_a_dice
 
 custom_tools_agent = Agent(
     name="custom_tools_agent",
-    model="gemini-2.0-flash",
+    model=agent_model("gemini-2.0-flash"),
     instruction=(
         "You are a helpful research assistant that knows horse trivia. "
         "For any user prompt mentioning a horse, use create_horse_fact tool. "
         "For all other queries, use the roll_a_dice tool. "
     ),
     description="An agent that can answer questions.",
-    tools=[create_horse_fact, roll_a_dice],
+    tools=[
+        # The horse fact is fixed, so it can be memoized.
+        tool_runtime.register(create_horse_fact, memoize=True, ttl=3600),
+        tool_runtime.register(roll_a_dice),
+    ],
+    before_tool_callback=[before_tool, start_tool_span],
+    after_tool_callback=[after_tool, end_tool_span],
+    on_tool_error_callback=[on_tool_error, fail_tool_span],
     generate_content_config=types.GenerateContentConfig(
         temperature=0.0,
     ),
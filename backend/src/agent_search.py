@@ -1,14 +1,67 @@
+"""Agents answering from Google search and from the local document index."""
+
 from google.adk.agents import Agent
-from google.adk.tools import google_search
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.tools.google_search_tool import google_search
 from google.genai import types
 
+from src.local_index import LOCAL_SEARCH_RESULTS, local_index, local_search
+from src.metrics import (
+    after_search_model,
+    after_tool,
+    before_search_model,
+    before_tool,
+    on_tool_error,
+)
+from src.models import agent_model
+from src.routing import user_text
+from src.tool_runtime import tool_runtime
+
 agent_search = Agent(
     name="AgentSearch",
-    model="gemini-2.0-flash",
+    model=agent_model("gemini-2.0-flash"),
     instruction="Answer any general query using the google_search tool.",
     tools=[google_search],
+    before_model_callback=before_search_model,
+    after_model_callback=after_search_model,
     description="Agent that answers using Google search only.",
     generate_content_config=types.GenerateContentConfig(
         temperature=0.0,
     ),
 )
+
+
+def add_local_results(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> None:
+    """ADK before_model_callback adding the best local documents to the prompt.
+
+    Saves the model a tool call round trip for the usual case where the
+    documents that made the orchestrator pick this agent answer the query.
+    """
+    if local_index is None:
+        return None
+    hits = local_index.search(user_text(callback_context), k=LOCAL_SEARCH_RESULTS)
+    documents = "\n\n".join(f"[{hit.path}]\n{hit.snippet}" for hit in hits)
+    llm_request.append_instructions([f"Internal documents:\n\n{documents}"])
+    return None
+
+
+agent_local_search = Agent(
+    name="AgentLocalSearch",
+    model=agent_model("gemini-2.0-flash"),
+    instruction=(
+        "Answer the query from the internal documents below and cite their "
+        "paths. Use the local_search tool only if they do not answer it."
+    ),
+    tools=[tool_runtime.register(local_search, timeout=5)],
+    before_model_callback=add_local_results,
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
+    on_tool_error_callback=on_tool_error,
+    description="Agent that answers from the local document index.",
+    generate_content_config=types.GenerateContentConfig(
+        temperature=0.0,
+    ),
+)
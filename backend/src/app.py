@@ -1,61 +1,751 @@
-# mypy: disable - error - code = "no-untyped-def,misc"
-import pathlib
-from fastapi import FastAPI, Response, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
-from orchestrator import root_agent
+"""FastAPI app serving the agent over HTTP, WebSockets and SSE."""
+
+import asyncio
 import json
+import os
+import pathlib
+import secrets
+import time
+import uuid
 from contextlib import asynccontextmanager
+from functools import cache
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+)
 
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from google.adk.agents.run_config import (  # type: ignore[attr-defined]
+    RunConfig,
+    StreamingMode,
+)
+from google.adk.apps import App
+from google.adk.events import Event
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types
+from starlette.background import BackgroundTask
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp
+
+from src import metrics
+from src.admission import (
+    AdmissionController,
+    Overloaded,
+    model_limiter,
+    retry_after_header,
+)
+from src.channels import (
+    Channel,
+    ChannelRegistry,
+    allowed_origins_from_env,
+    origin_allowed,
+)
+from src.compaction import HistoryCompactor
+from src.data_stream import encode_updates, error_part, finish_part, text_part
+from src.local_index import LOCAL_INDEX_REFRESH_SECONDS, keep_fresh, local_index
+from src.model_pool import MODEL_POOL_WARM, MODEL_POOL_WARM_URL, model_pool
+from src.models import uses_gemini
+from src.orchestrator import root_agent, routed_run_config
+from src.prompt_cache import prompt_cache_config, prompt_cache_stats
+from src.response_cache import CacheKey, ResponseCache, normalize_query, parse_ttls
+from src.session_store import BoundedSessionService
+from src.single_flight import SingleFlight
+from src.sqlite_session_service import SqliteSessionService
+from src.supervision import (
+    ClientDisconnected,
+    RunSupervisor,
+    RunTimeout,
+    SupervisedRun,
+    wait_for_disconnect,
+)
+from src.telemetry import LEVELS, TraceMiddleware, telemetry
+from src.tool_runtime import tool_runtime
+from src.workers import WORKER_COUNT, WORKER_INDEX, new_conversation_id
 
 # --- ADK Setup ---
 # This follows the modern programmatic pattern for running an ADK agent.
 APP_NAME = "adk-quickstart-app"
 USER_ID = "default_user"
-SESSION_ID = "default_session"
 
-# 1. Set up session management
-session_service = InMemorySessionService()
+# 1. Set up session management. Each conversation gets its own session, created
+# lazily on its first request. SESSION_BACKEND=sqlite persists sessions across
+# restarts; the default keeps them in a bounded, evicting in-memory store.
+session_service: BoundedSessionService | SqliteSessionService
+if os.getenv("SESSION_BACKEND", "memory").lower() == "sqlite":
+    session_service = SqliteSessionService(
+        db_path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+        max_events=int(os.getenv("SESSION_MAX_EVENTS", "50")),
+    )
+else:
+    session_service = BoundedSessionService(
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+        idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800")),
+        max_events=int(os.getenv("SESSION_MAX_EVENTS", "50")),
+    )
+
+# 2. Fold older turns of long conversations into a summary once they exceed
+# the token or event budget. Runs after the response has been sent.
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() != "false"
+compactor = HistoryCompactor(
+    session_service,
+    max_tokens=int(os.getenv("COMPACTION_MAX_TOKENS", "8000")),
+    max_events=int(os.getenv("COMPACTION_MAX_EVENTS", "40")),
+    keep_events=int(os.getenv("COMPACTION_KEEP_EVENTS", "10")),
+)
+
+# 3. The Runner for the agent is created on first use or during warm-up, see
+# get_runner().
+
+# 4. Stream model output as it is generated on the AI SDK path. Set
+# ADK_STREAMING_MODE=none to only forward final responses.
+STREAMING_MODE = (
+    StreamingMode.NONE
+    if os.getenv("ADK_STREAMING_MODE", "sse").lower() == "none"
+    else StreamingMode.SSE
+)
+stream_run_config = RunConfig(streaming_mode=STREAMING_MODE)
+
+# 5. Cache final responses to repeated first-turn queries. TTLs are per route;
+# a TTL of 0 disables caching for that route (dice rolls must stay random).
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() != "false"
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+    ttls=parse_ttls(os.getenv("RESPONSE_CACHE_TTLS", "dice=0")),
+    default_ttl=float(os.getenv("RESPONSE_CACHE_DEFAULT_TTL", "300")),
+    bucket_seconds=float(os.getenv("RESPONSE_CACHE_BUCKET_SECONDS", "3600")),
+)
+
+# 6. Let concurrent identical first-turn queries share one agent run. Routes
+# with non-deterministic answers are excluded.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() != "false"
+SINGLE_FLIGHT_EXCLUDE_ROUTES = set(
+    os.getenv("SINGLE_FLIGHT_EXCLUDE_ROUTES", "dice").split(",")
+)
+single_flight = SingleFlight()
 
-# 2. Create a Runner for the agent
-runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+# 7. Cap concurrent agent runs. Requests beyond the cap wait in a bounded queue
+# and get a 503 with Retry-After when it is full or the wait times out. Model
+# rate limits and retries are applied per call by AdmittedGemini.
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+)
+
+# 8. Stop agent runs when the client disconnects or the request deadline
+# passes. Clients may ask for a shorter deadline with X-Request-Timeout.
+supervisor = RunSupervisor(timeout=float(os.getenv("REQUEST_TIMEOUT_SECONDS", "120")))
+
+# 9. Batch invocations run at most BATCH_MAX_CONCURRENCY items at a time.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# 10. WebSocket and SSE channels carry concurrent turns of many conversations
+# over one connection. Each channel runs at most CHANNEL_MAX_TURNS turns and
+# buffers at most CHANNEL_BUFFER outgoing messages before turns pause.
+# Browsers may only open the WebSocket from ALLOWED_ORIGINS (or the
+# server's own origin), which CORS allows too.
+CHANNEL_MAX_TURNS = int(os.getenv("CHANNEL_MAX_TURNS", "16"))
+CHANNEL_BUFFER = int(os.getenv("CHANNEL_BUFFER", "64"))
+ALLOWED_ORIGINS = allowed_origins_from_env()
+channels = ChannelRegistry()
+
+# 11. AI SDK streams coalesce text deltas into parts of up to
+# DATA_STREAM_MAX_CHARS characters, flushed at least every
+# DATA_STREAM_MAX_DELAY_MS milliseconds (0 sends every delta on its own).
+DATA_STREAM_MAX_CHARS = int(os.getenv("DATA_STREAM_MAX_CHARS", "512"))
+DATA_STREAM_MAX_DELAY = float(os.getenv("DATA_STREAM_MAX_DELAY_MS", "30")) / 1000
+
+# 12. POST /logging changes log settings at runtime, so it only accepts
+# requests sending `Authorization: Bearer <LOG_ADMIN_TOKEN>`, and is off while
+# LOG_ADMIN_TOKEN is unset.
+LOG_ADMIN_TOKEN = os.getenv("LOG_ADMIN_TOKEN", "")
 # --- End ADK Setup ---
 
+# Headers shared by every response instead of being rebuilt per request.
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "http://localhost:5173",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+}
+DATA_STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "x-vercel-ai-data-stream": "v1",  # Required for AI SDK data stream
+    **CORS_HEADERS,
+}
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Create the default session on startup
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
+
+@cache
+def get_runner() -> Runner:
+    """Return the Runner for the agent, creating it on first use."""
+    adk_app = App(
+        name=APP_NAME, root_agent=root_agent, context_cache_config=prompt_cache_config
+    )
+    return Runner(app=adk_app, session_service=session_service)
+
+
+async def warm_up() -> None:
+    """Prepare what the first request would otherwise set up itself."""
+    started = time.perf_counter()
+    get_runner()
+    root_agent.peek_route("warm up")
+    warmed = 0
+    if MODEL_POOL_WARM > 0 and uses_gemini():
+        warmed = await model_pool.warm_up(MODEL_POOL_WARM_URL, MODEL_POOL_WARM)
+    telemetry.info(
+        "Warmed up",
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        model_connections=warmed,
+    )
+
+
+def event_text(event: Event) -> str:
+    """Return the concatenated non-thought text of an ADK event."""
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(
+        part.text for part in event.content.parts if part.text and not part.thought
+    )
+
+
+def event_progress(event: Event) -> list[dict[str, Any]]:
+    """Return progress entries for the tool calls and results in an ADK event."""
+    progress: list[dict[str, Any]] = []
+    if not event.content or not event.content.parts:
+        return progress
+    for part in event.content.parts:
+        if part.function_call:
+            progress.append(
+                {
+                    "type": "tool_call",
+                    "tool": part.function_call.name,
+                    "agent": event.author,
+                }
+            )
+        elif part.function_response:
+            progress.append(
+                {
+                    "type": "tool_result",
+                    "tool": part.function_response.name,
+                    "agent": event.author,
+                }
+            )
+    return progress
+
+
+async def agent_updates(
+    events: AsyncIterable[Event],
+) -> AsyncGenerator[tuple[str, Any], None]:
+    """Convert ADK events into ("progress", entries) and ("text", delta) updates.
+
+    Partial events carry text deltas and are forwarded immediately. The
+    aggregated non-partial event that closes a streamed turn is skipped so text
+    is not sent twice; a non-partial event is only forwarded when nothing was
+    streamed for its turn (e.g. non-streaming mode). Tool calls and tool
+    results become progress updates.
+
+    Args:
+        events: Async iterable of ADK events from `runner.run_async`.
+
+    Yields:
+        (kind, value) tuples, where kind is "progress" or "text".
+    """
+    streamed = False
+    async for event in events:
+        progress = event_progress(event)
+        if progress:
+            yield "progress", progress
+
+        text = event_text(event)
+        if event.partial:
+            if text:
+                streamed = True
+                yield "text", text
+        else:
+            if text and not streamed:
+                yield "text", text
+            streamed = False
+
+
+def stream_agent_parts(events: AsyncIterable[Event]) -> AsyncGenerator[str, None]:
+    """Convert ADK events into AI SDK data stream parts as they arrive.
+
+    Text deltas are coalesced into `0:` parts and tool calls and results
+    become `2:` data parts, see `agent_updates()` and `encode_updates()`.
+
+    Args:
+        events: Async iterable of ADK events from `runner.run_async`.
+
+    Returns:
+        An async iterator of data stream chunks, without the finish part.
+    """
+    return encode_updates(
+        agent_updates(events),
+        max_chars=DATA_STREAM_MAX_CHARS,
+        max_delay=DATA_STREAM_MAX_DELAY,
+    )
+
+
+async def tap_final_texts(
+    events: AsyncIterable[Event], final_texts: list[str]
+) -> AsyncGenerator[Event, None]:
+    """Yield events, appending the text of each final response to `final_texts`."""
+    async for event in events:
+        if event.is_final_response():
+            final_texts.append(event_text(event))
+        yield event
+
+
+async def tap_usage(
+    events: AsyncIterable[Event], usage: dict[str, int]
+) -> AsyncGenerator[Event, None]:
+    """Yield events, adding the token counts of model responses to `usage`.
+
+    `usage` gets AI SDK style "promptTokens" and "completionTokens" keys once
+    a response reports its usage.
+    """
+    async for event in events:
+        metadata = event.usage_metadata
+        if metadata is not None and not event.partial:
+            usage["promptTokens"] = usage.get("promptTokens", 0) + (
+                metadata.prompt_token_count or 0
+            )
+            usage["completionTokens"] = usage.get("completionTokens", 0) + (
+                metadata.candidates_token_count or 0
+            )
+        yield event
+
+
+def conversation_ids(request: HTTPConnection, body: dict[str, Any]) -> tuple[str, str]:
+    """Return the (user_id, session_id) pair a request belongs to.
+
+    The conversation ID comes from the `conversation_id` field, the AI SDK chat
+    `id` field or the `X-Conversation-Id` header. Requests without one get a
+    fresh session, whose ID routes back to this worker in multi-worker mode.
+    """
+    user_id = body.get("user_id") or request.headers.get("x-user-id") or USER_ID
+    session_id = (
+        body.get("conversation_id")
+        or body.get("id")
+        or request.headers.get("x-conversation-id")
+        or new_conversation_id()
+    )
+    return str(user_id), str(session_id)
+
+
+def response_cache_key(
+    request: HTTPConnection, text: str, route: str, has_history: bool
+) -> CacheKey | None:
+    """Return the response cache key of a query, or None if it must not be cached.
+
+    Only queries without prior conversation history are cached, since their
+    answer does not depend on earlier turns. Clients opt out per request with
+    a `Cache-Control: no-cache` (or `no-store`) header.
+    """
+    if not RESPONSE_CACHE_ENABLED or has_history:
+        return None
+    cache_control = request.headers.get("cache-control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        response_cache.bypass()
+        return None
+    return response_cache.key(text, route)
+
+
+async def record_turn(user_id: str, session_id: str, text: str, answer: str) -> None:
+    """Append a turn answered without running the agent in this conversation.
+
+    Used for answers served from the response cache or shared with another
+    request's run, so the conversation history stays complete.
+    """
+    await session_service.ensure_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    session = await session_service.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    assert session is not None
+    invocation_id = f"e-{uuid.uuid4()}"
+    for author, role, part_text in (
+        ("user", "user", text),
+        (root_agent.name, "model", answer),
+    ):
+        await session_service.append_event(
+            session,
+            Event(
+                invocation_id=invocation_id,
+                author=author,
+                content=types.Content(role=role, parts=[types.Part(text=part_text)]),
+            ),
+        )
+
+
+async def agent_run(
+    user_id: str, session_id: str, text: str, run_config: RunConfig | None = None
+) -> AsyncGenerator[Event, None]:
+    """Run the agent on a user message in the conversation's session."""
+    await session_service.ensure_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    user_content = types.Content(role="user", parts=[types.Part(text=text)])
+    async for event in get_runner().run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=user_content,
+        run_config=run_config,
+    ):
+        yield event
+
+
+async def admitted_run(
+    admitted_at: float,
+    user_id: str,
+    session_id: str,
+    text: str,
+    run_config: RunConfig | None = None,
+) -> AsyncGenerator[Event, None]:
+    """Run the agent in an admission slot, releasing it when the run ends."""
+    try:
+        async for event in agent_run(user_id, session_id, text, run_config):
+            yield event
+    finally:
+        admission.release(admitted_at)
+
+
+async def invoke_agent(
+    user_id: str,
+    session_id: str,
+    text: str,
+    route: str,
+    has_history: bool,
+    run_config: RunConfig | None = None,
+) -> tuple[AsyncIterator[Event], bool]:
+    """Return the agent's events for a query and whether they are shared.
+
+    First-turn queries join an identical in-flight run when there is one
+    (single flight); the shared run always streams partial events, which
+    non-streaming consumers can ignore. New runs must first be admitted.
+    `route` is passed on to the orchestrator, so it does not route again.
+
+    Returns:
+        An async iterator of events and True if they come from a run started
+        by another request, in which case the caller must record the turn.
+
+    Raises:
+        Overloaded: If the run could not be admitted.
+    """
+    key = None
+    if (
+        SINGLE_FLIGHT_ENABLED
+        and not has_history
+        and route not in SINGLE_FLIGHT_EXCLUDE_ROUTES
+    ):
+        key = (normalize_query(text), route)
+        if key in single_flight:
+            shared, _ = single_flight.join(key, None)
+            return shared.subscribe(), True
+
+    admitted_at = await admission.acquire()
+    if key is None:
+        run_config = routed_run_config(run_config, route)
+        return admitted_run(admitted_at, user_id, session_id, text, run_config), False
+    shared_config = routed_run_config(stream_run_config, route)
+    shared, leader = single_flight.join(
+        key,
+        lambda: admitted_run(admitted_at, user_id, session_id, text, shared_config),
+    )
+    if not leader:
+        # Another request started the same run while this one was admitted.
+        admission.release(admitted_at)
+    return shared.subscribe(), not leader
+
+
+def supervise(request: Request, events: AsyncIterator[Event]) -> SupervisedRun:
+    """Start a run that is cancelled on disconnect or at the request deadline."""
+    return supervisor.start(
+        events,
+        disconnected=lambda: wait_for_disconnect(request),
+        timeout=supervisor.deadline(request.headers.get("x-request-timeout")),
+    )
+
+
+def start_request_metrics(
+    labels: tuple[str, str, str], started: float, parsed: float
+) -> None:
+    """Record the parse and routing stages and label the rest of the request.
+
+    Args:
+        labels: The (route, agent, format) labels of the request.
+        started: perf_counter() when the request arrived.
+        parsed: perf_counter() when the request body had been parsed.
+    """
+    metrics.REQUESTS.inc(labels)
+    metrics.observe_stage("parse", parsed - started, labels)
+    metrics.observe_stage("routing", time.perf_counter() - parsed, labels)
+    metrics.request_labels.set(labels)
+
+
+async def timed_events(
+    events: AsyncIterable[Event], started: float, labels: tuple[str, str, str]
+) -> AsyncGenerator[Event, None]:
+    """Yield agent events, recording the time to the first and final event."""
+    first = True
+    final_at = None
+    async for event in events:
+        now = time.perf_counter()
+        if first:
+            metrics.observe_stage("first_model_event", now - started, labels)
+            first = False
+        if event.is_final_response():
+            final_at = now
+        yield event
+    if final_at is not None:
+        metrics.observe_stage("final_response", final_at - started, labels)
+
+
+async def timed_flush(
+    parts: AsyncIterable[str], labels: tuple[str, str, str]
+) -> AsyncGenerator[str, None]:
+    """Yield response parts, recording how long handing them over took."""
+    flushing = 0.0
+    async for part in parts:
+        handed_over = time.perf_counter()
+        yield part
+        flushing += time.perf_counter() - handed_over
+    metrics.observe_stage("stream_flush", flushing, labels)
+
+
+def overloaded_response(error: Overloaded) -> Response:
+    """Return a 503 response telling the client when to retry."""
+    return Response(
+        content=json.dumps({"error": f"Server overloaded: {error.reason}"}),
+        media_type="application/json",
+        status_code=503,
+        headers={
+            **CORS_HEADERS,
+            "Retry-After": retry_after_header(error.retry_after),
+        },
+    )
+
+
+async def answer_query(
+    request: Request,
+    user_id: str,
+    session_id: str,
+    query: str,
+    has_history: bool,
+    response_format: str,
+    started: float,
+    parsed: float,
+) -> tuple[str, bool]:
+    """Answer a query with its final response text, without streaming.
+
+    Goes through routing, the response cache, admission control, single
+    flight and run supervision like any /invoke request.
+
+    Returns:
+        The final response text and whether it was served from the cache.
+
+    Raises:
+        Overloaded: If the run could not be admitted.
+        RunTimeout: If the run passed its deadline.
+        ClientDisconnected: If the client went away.
+    """
+    matched = root_agent.peek_route(query)
+    route = matched.name
+    labels = (route, matched.agent, response_format)
+    start_request_metrics(labels, started, parsed)
+    cache_key = response_cache_key(request, query, route, has_history)
+    cached = response_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        await record_turn(user_id, session_id, query, cached)
+        return cached, True
+
+    response_text = ""
+    events, shared = await invoke_agent(user_id, session_id, query, route, has_history)
+    run = supervise(request, events)
+    async for event in timed_events(run.events(), started, labels):
+        if event.is_final_response() and event.content and event.content.parts:
+            response_text = event.content.parts[0].text or ""
+
+    telemetry.debug("Final response", chars=len(response_text))
+    if shared and response_text:
+        await record_turn(user_id, session_id, query, response_text)
+    if cache_key and response_text:
+        response_cache.put(cache_key, response_text)
+    return response_text, False
+
+
+def compaction_task(user_id: str, session_id: str) -> BackgroundTask | None:
+    """Return a background task that compacts the session after the response."""
+    if not COMPACTION_ENABLED:
+        return None
+    return BackgroundTask(compactor.compact, APP_NAME, user_id, session_id)
+
+
+# Compactions started by channel turns, referenced until they finish.
+_compactions: set[asyncio.Task[bool]] = set()
+
+
+def compact_in_background(user_id: str, session_id: str) -> None:
+    """Compact the session in a task of its own, so the turn can end first."""
+    task = asyncio.create_task(compactor.compact(APP_NAME, user_id, session_id))
+    _compactions.add(task)
+    task.add_done_callback(_compactions.discard)
+
+
+async def stream_turn(
+    connection: HTTPConnection,
+    message: dict[str, Any],
+    send: Callable[[dict[str, Any]], Awaitable[None]],
+) -> None:
+    """Run one turn of a WebSocket or SSE channel, see `Channel`.
+
+    The invoke message holds a `query` and optionally a `conversation_id` and
+    a `timeout` in seconds. The turn sends a "start" message, then "progress"
+    and "text" messages as the agent works, and ends with a "done" message
+    whose finishReason is "stop", "timeout" or "cancelled", or with an "error"
+    message; "done" includes the token `usage` when the model reported it.
+    The agent run is paused while the channel's buffer is full.
+
+    Args:
+        connection: The WebSocket or HTTP request the message came with.
+        message: The invoke message.
+        send: Sends a message of this turn to the client.
+    """
+    started = time.perf_counter()
+    user_id, session_id = conversation_ids(connection, message)
+    query = message.get("query")
+    if not query:
+        await send({"type": "error", "error": "No query provided", "status": 400})
+        return
+    query = str(query)
+    has_history = "conversation_id" in message
+    matched = root_agent.peek_route(query)
+    route = matched.name
+    labels = (route, matched.agent, "channel")
+    start_request_metrics(labels, started, started)
+    await send({"type": "start", "conversation_id": session_id})
+
+    cache_key = response_cache_key(connection, query, route, has_history)
+    cached = response_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        await record_turn(user_id, session_id, query, cached)
+        await send({"type": "text", "text": cached})
+        await send({"type": "done", "finishReason": "stop", "cache": "HIT"})
+        return
+
+    try:
+        events, shared = await invoke_agent(
+            user_id, session_id, query, route, has_history, stream_run_config
+        )
+    except Overloaded as e:
+        await send(
+            {
+                "type": "error",
+                "error": f"Server overloaded: {e.reason}",
+                "status": 503,
+                "retry_after": retry_after_header(e.retry_after),
+            }
+        )
+        return
+    run = supervisor.start(
+        events,
+        timeout=supervisor.deadline(message.get("timeout")),
+        max_buffered=CHANNEL_BUFFER,
     )
+    try:
+        final_texts: list[str] = []
+        usage: dict[str, int] = {}
+        events = timed_events(run.events(), started, labels)
+        events = tap_usage(tap_final_texts(events, final_texts), usage)
+        async for kind, value in agent_updates(events):
+            if kind == "progress":
+                await send({"type": "progress", "progress": value})
+            else:
+                await send({"type": "text", "text": value})
+        final_text = final_texts[-1] if final_texts else ""
+        if shared and final_text:
+            await record_turn(user_id, session_id, query, final_text)
+        if cache_key and final_text:
+            response_cache.put(cache_key, final_text)
+        done: dict[str, Any] = {"type": "done", "finishReason": "stop", "cache": "MISS"}
+        if usage:
+            done["usage"] = usage
+        await send(done)
+    except RunTimeout:
+        telemetry.warning("Agent run timed out", session_id=session_id)
+        await send({"type": "done", "finishReason": "timeout"})
+    except Exception as e:
+        telemetry.error("Agent invocation failed", session_id=session_id, error=str(e))
+        await send(
+            {
+                "type": "error",
+                "error": f"Agent invocation failed: {str(e)}",
+                "status": 500,
+            }
+        )
+    if COMPACTION_ENABLED:
+        compact_in_background(user_id, session_id)
+
+
+def open_channel() -> Channel:
+    """Return a new channel whose turns are run by `stream_turn`."""
+    return Channel(
+        stream_turn, max_turns=CHANNEL_MAX_TURNS, max_buffered=CHANNEL_BUFFER
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm up before serving and release shared resources on shutdown."""
+    # Sessions are created lazily per conversation, see conversation_ids()
+    await warm_up()
+    # The first refresh opens or builds the local index in the background;
+    # until then search-route queries go to web search.
+    refresher = None
+    if local_index is not None:
+        refresher = asyncio.create_task(
+            keep_fresh(local_index, LOCAL_INDEX_REFRESH_SECONDS)
+        )
     yield
-    # No cleanup needed for in-memory session service
+    if refresher is not None:
+        refresher.cancel()
+    # Commit any buffered session writes before exiting
+    if isinstance(session_service, SqliteSessionService):
+        await session_service.close()
+    await model_pool.aclose()
+    tool_runtime.shutdown()
+    telemetry.flush()
 
 
 # Define the FastAPI app
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(TraceMiddleware, telemetry=telemetry)
 
 
 # Add CORS middleware for frontend development
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:5173",
-    ],  # Frontend dev servers
+    allow_origins=ALLOWED_ORIGINS,  # Frontend dev servers
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Conversation-Id", "X-Cache", "Retry-After"],
 )
 
 
 @app.post("/invoke")
-async def invoke(request: Request):
-    """
-    Invokes the agent with a user query. Supports both legacy format and AI SDK format.
+async def invoke(request: Request) -> Response:
+    """Invoke the agent with a user query. Supports both legacy format and AI SDK format.
 
     Args:
         request: The request object, containing the user query in the body.
@@ -63,153 +753,583 @@ async def invoke(request: Request):
     Returns:
         The agent's response (JSON for legacy, streaming for AI SDK).
     """
+    started = time.perf_counter()
     body = await request.json()
-    print(f"DEBUG: Received body: {json.dumps(body, indent=2)}")
+    user_id, session_id = conversation_ids(request, body)
 
     # Check if this is an AI SDK request (has 'messages' field)
     if "messages" in body:
         # AI SDK format - extract latest user message
         messages = body.get("messages", [])
-        print(f"DEBUG: Messages array: {messages}")
         user_message = ""
         for message in reversed(messages):
             if message.get("role") == "user":
                 user_message = message.get("content", "")
-                print(f"DEBUG: Found user message: '{user_message}'")
                 break
+        telemetry.debug(
+            "AI SDK request",
+            session_id=session_id,
+            messages=len(messages),
+            chars=len(user_message),
+        )
 
         if not user_message:
             # No user message found, return error
-            def generate_error_stream():
-                yield '0:"No user message found in request"\n'
-                yield 'd:{"finishReason":"stop"}\n'
+            def generate_error_stream() -> Iterator[str]:
+                yield text_part("No user message found in request")
+                yield finish_part("stop")
 
             return StreamingResponse(
                 generate_error_stream(),
                 media_type="text/plain",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "x-vercel-ai-data-stream": "v1",
-                    "Access-Control-Allow-Origin": "http://localhost:5173",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
-                },
+                headers=DATA_STREAM_HEADERS,
             )
 
-        # Stream the agent response in AI SDK data stream format
-        async def generate_data_stream():
+        has_history = len(messages) > 1
+        parsed = time.perf_counter()
+        matched = root_agent.peek_route(user_message)
+        route = matched.name
+        labels = (route, matched.agent, "ai_sdk")
+        start_request_metrics(labels, started, parsed)
+        cache_key = response_cache_key(request, user_message, route, has_history)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is None:
             try:
-                user_content = types.Content(
-                    role="user", parts=[types.Part(text=user_message)]
+                events, shared = await invoke_agent(
+                    user_id,
+                    session_id,
+                    user_message,
+                    route,
+                    has_history,
+                    stream_run_config,
                 )
-                response_text = ""
-                async for event in runner.run_async(
-                    user_id=USER_ID, session_id=SESSION_ID, new_message=user_content
-                ):
-                    if event.is_final_response() and event.content:
-                        response_text = event.content.parts[0].text
-
-                print(f"DEBUG: Response text: {response_text}")
-
-                # Stream the response word by word for a nice typing effect
-                words = response_text.split()
-                if not words:
-                    # Handle empty response
-                    yield 'd:{"finishReason":"stop"}\n'
-                    return
-
-                for word in words:
-                    # Text parts format: 0:"content"\n
-                    yield f'0:"{word} "\n'
+            except Overloaded as e:
+                return overloaded_response(e)
+            run = supervise(request, events)
+
+        # Stream the agent response in AI SDK data stream format
+        async def generate_data_stream() -> AsyncGenerator[str, None]:
+            if cached is not None:
+                await record_turn(user_id, session_id, user_message, cached)
+                yield text_part(cached) + finish_part("stop")
+                return
+            try:
+                final_texts: list[str] = []
+                usage: dict[str, int] = {}
+                events = timed_events(run.events(), started, labels)
+                events = tap_usage(tap_final_texts(events, final_texts), usage)
+                async for part in stream_agent_parts(events):
+                    yield part
+                final_text = final_texts[-1] if final_texts else ""
+                if shared and final_text:
+                    await record_turn(user_id, session_id, user_message, final_text)
+                if cache_key and final_text:
+                    response_cache.put(cache_key, final_text)
 
                 # Finish message part
-                yield 'd:{"finishReason":"stop"}\n'
+                yield finish_part("stop", usage)
 
+            except ClientDisconnected:
+                telemetry.info(
+                    "Client disconnected, run cancelled", session_id=session_id
+                )
+            except RunTimeout:
+                telemetry.warning("Agent run timed out", session_id=session_id)
+                message = "Sorry, your request took too long and was stopped."
+                yield error_part(message) + finish_part("error")
             except Exception as e:
-                print(f"ERROR: Agent invocation failed: {e}")
+                telemetry.error(
+                    "Agent invocation failed", session_id=session_id, error=str(e)
+                )
                 # Stream error message
-                yield f'0:"Sorry, I encountered an error while processing your request: {str(e)}"\n'
-                yield 'd:{"finishReason":"stop"}\n'
+                message = f"Sorry, I encountered an error while processing your request: {str(e)}"
+                yield error_part(message) + finish_part("error")
 
         return StreamingResponse(
-            generate_data_stream(),
+            timed_flush(generate_data_stream(), labels),
             media_type="text/plain",
+            background=compaction_task(user_id, session_id),
             headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "x-vercel-ai-data-stream": "v1",  # Required for AI SDK data stream
-                "Access-Control-Allow-Origin": "http://localhost:5173",
-                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*",
+                **DATA_STREAM_HEADERS,
+                "X-Conversation-Id": session_id,
+                "X-Cache": "HIT" if cached is not None else "MISS",
             },
         )
     else:
         # Legacy format - direct query
         query = body.get("query")
+        telemetry.debug("Legacy request", session_id=session_id, chars=len(query or ""))
 
         if not query:
             return Response(
                 content=json.dumps({"error": "No query provided"}),
                 media_type="application/json",
                 status_code=400,
-                headers={
-                    "Access-Control-Allow-Origin": "http://localhost:5173",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
-                },
+                headers=CORS_HEADERS,
             )
 
+        has_history = (
+            "conversation_id" in body or "x-conversation-id" in request.headers
+        )
+        parsed = time.perf_counter()
         try:
-            user_content = types.Content(role="user", parts=[types.Part(text=query)])
-            response_text = ""
-
-            async for event in runner.run_async(
-                user_id=USER_ID, session_id=SESSION_ID, new_message=user_content
-            ):
-                if event.is_final_response() and event.content:
-                    response_text = event.content.parts[0].text
-
-            print(f"DEBUG: Final response text: {response_text}")
-
+            response_text, cache_hit = await answer_query(
+                request,
+                user_id,
+                session_id,
+                query,
+                has_history,
+                "legacy",
+                started,
+                parsed,
+            )
             return Response(
                 content=json.dumps({"response": response_text}),
                 media_type="application/json",
+                background=None if cache_hit else compaction_task(user_id, session_id),
+                headers={
+                    **CORS_HEADERS,
+                    "X-Conversation-Id": session_id,
+                    "X-Cache": "HIT" if cache_hit else "MISS",
+                },
+            )
+        except Overloaded as e:
+            return overloaded_response(e)
+        except ClientDisconnected:
+            telemetry.info("Client disconnected, run cancelled", session_id=session_id)
+            # Nobody is listening; 499 is the conventional "client closed" code.
+            return Response(status_code=499)
+        except RunTimeout:
+            telemetry.warning("Agent run timed out", session_id=session_id)
+            return Response(
+                content=json.dumps(
+                    {"error": "Agent run timed out", "finishReason": "timeout"}
+                ),
+                media_type="application/json",
+                status_code=504,
                 headers={
-                    "Access-Control-Allow-Origin": "http://localhost:5173",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
+                    **CORS_HEADERS,
+                    "X-Conversation-Id": session_id,
                 },
             )
         except Exception as e:
-            print(f"ERROR: Agent invocation failed: {e}")
+            telemetry.error(
+                "Agent invocation failed", session_id=session_id, error=str(e)
+            )
             return Response(
                 content=json.dumps({"error": f"Agent invocation failed: {str(e)}"}),
                 media_type="application/json",
                 status_code=500,
-                headers={
-                    "Access-Control-Allow-Origin": "http://localhost:5173",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
-                },
+                headers=CORS_HEADERS,
+            )
+
+
+def batch_error(message: str) -> Response:
+    """Return a 400 response rejecting a batch."""
+    return Response(
+        content=json.dumps({"error": message}),
+        media_type="application/json",
+        status_code=400,
+        headers=CORS_HEADERS,
+    )
+
+
+@app.post("/invoke/batch")
+async def invoke_batch(request: Request) -> Response:
+    """Answer a list of queries, streaming one NDJSON line per item as it completes.
+
+    Body example:
+        {"items": [{"query": "roll a dice", "conversation_id": "c1", "id": "a"}],
+         "concurrency": 4}
+    Plain strings are accepted as items too. Each result line holds the item's
+    `index`, its `id` if given, `conversation_id`, `elapsed_ms` and either
+    `response` and `cache`, or `error` and `status`. A final line with
+    `"done": true` summarizes the batch.
+
+    Args:
+        request: The request object, containing the batch in the body.
+
+    Returns:
+        A streaming NDJSON response, or a 400 error for an invalid batch.
+    """
+    started = time.perf_counter()
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return batch_error("The body must be a JSON object")
+    items = body.get("items", body.get("queries"))
+    if not isinstance(items, list) or not items or len(items) > BATCH_MAX_ITEMS:
+        return batch_error(f"Provide 1 to {BATCH_MAX_ITEMS} items in 'items'")
+    concurrency = body.get("concurrency", BATCH_MAX_CONCURRENCY)
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool):
+        return batch_error("'concurrency' must be an integer")
+    items = [item if isinstance(item, dict) else {"query": item} for item in items]
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    telemetry.debug("Batch request", items=len(items), concurrency=concurrency)
+
+    async def run_item(
+        index: int, item: dict[str, Any]
+    ) -> tuple[dict[str, Any], tuple[str, str] | None]:
+        """Return the item's result line and the (user, session) to compact."""
+        item_started = time.perf_counter()
+        user_id, session_id = conversation_ids(request, item)
+        result: dict[str, Any] = {"index": index, "conversation_id": session_id}
+        if "id" in item:
+            result["id"] = item["id"]
+        query = item.get("query")
+        compact = None
+        try:
+            if not query:
+                result.update(error="No query provided", status=400)
+            else:
+                text, cache_hit = await answer_query(
+                    request,
+                    user_id,
+                    session_id,
+                    str(query),
+                    "conversation_id" in item,
+                    "batch",
+                    item_started,
+                    item_started,
+                )
+                result.update(response=text, cache="HIT" if cache_hit else "MISS")
+                if not cache_hit and COMPACTION_ENABLED:
+                    compact = (user_id, session_id)
+        except Overloaded as e:
+            result.update(
+                error=f"Server overloaded: {e.reason}",
+                status=503,
+                retry_after=retry_after_header(e.retry_after),
             )
+        except RunTimeout:
+            result.update(error="Agent run timed out", status=504)
+        except ClientDisconnected:
+            result.update(error="Client disconnected", status=499)
+        except Exception as e:
+            telemetry.error("Batch item failed", session_id=session_id, error=str(e))
+            result.update(error=f"Agent invocation failed: {str(e)}", status=500)
+        result["elapsed_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+        return result, compact
+
+    # Sessions answered by the model, compacted once the response is sent.
+    compactions: list[tuple[str, str]] = []
+
+    async def compact_sessions() -> None:
+        for user_id, session_id in dict.fromkeys(compactions):
+            await compactor.compact(APP_NAME, user_id, session_id)
+
+    async def generate_results() -> AsyncGenerator[str, None]:
+        pending = iter(enumerate(items))
+        done: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+        async def worker() -> None:
+            for index, item in pending:
+                result, compact = await run_item(index, item)
+                if compact is not None:
+                    compactions.append(compact)
+                await done.put(result)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        errors = 0
+        try:
+            for _ in range(len(items)):
+                result = await done.get()
+                errors += "error" in result
+                yield json.dumps(result) + "\n"
+        finally:
+            for task in workers:
+                task.cancel()
+        summary = {
+            "done": True,
+            "items": len(items),
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        yield json.dumps(summary) + "\n"
+
+    return StreamingResponse(
+        generate_results(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            **CORS_HEADERS,
+        },
+        background=BackgroundTask(compact_sessions) if COMPACTION_ENABLED else None,
+    )
+
+
+@app.websocket("/ws")
+async def invoke_websocket(websocket: WebSocket) -> None:
+    """Run turns of any number of conversations over one WebSocket.
+
+    Client messages:
+        {"type": "invoke", "request_id": "r1", "conversation_id": "c1",
+         "query": "roll a dice"}
+        {"type": "cancel", "request_id": "r1"}
+    Every server message carries the `request_id` of its turn, see
+    `stream_turn()`. Turns are cancelled when the socket closes. Browsers
+    may only connect from ALLOWED_ORIGINS or the server's own origin.
+    """
+    origin = websocket.headers.get("origin")
+    if not origin_allowed(origin, websocket.headers.get("host"), ALLOWED_ORIGINS):
+        telemetry.warning("WebSocket from a foreign origin rejected", origin=origin)
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    channel = open_channel()
+
+    async def write() -> None:
+        async for message in channel.messages():
+            await websocket.send_json(message)
+
+    writer = asyncio.create_task(write())
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                message = None
+            await channel.receive(message, websocket)
+    except WebSocketDisconnect:
+        telemetry.debug("WebSocket closed", turns=len(channel.turns))
+    finally:
+        channel.close()
+        writer.cancel()
+
+
+@app.get("/channels/{channel_id}/events")
+async def channel_events(
+    request: Request, channel_id: str, token: str | None = None
+) -> Response:
+    """Server-sent events fallback for clients that cannot use the WebSocket.
+
+    Opens the channel `channel_id` and streams its messages as SSE `data:`
+    lines, starting with {"type": "open", "token": ...}. Messages are sent
+    to it with POST /channels/{channel_id} and an `X-Channel-Token` header
+    holding that token. Opening an open channel ID again, e.g. to reconnect,
+    replaces the previous stream only when `token` is the channel's token.
+    """
+    channel = open_channel()
+    channel_token = channels.open(channel_id, channel, token)
+    if channel_token is None:
+        return Response(
+            content=json.dumps(
+                {"error": f"Channel is open by another client: {channel_id}"}
+            ),
+            media_type="application/json",
+            status_code=403,
+        )
+
+    async def generate_events() -> AsyncGenerator[str, None]:
+        try:
+            yield ": connected\n\n"
+            opened = {"type": "open", "channel_id": channel_id, "token": channel_token}
+            yield f"data: {json.dumps(opened)}\n\n"
+            async for message in channel.messages():
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            channels.close(channel_id, channel)
+
+    return StreamingResponse(
+        generate_events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            **CORS_HEADERS,
+        },
+    )
+
+
+@app.post("/channels/{channel_id}")
+async def channel_message(request: Request, channel_id: str) -> Response:
+    """Send an invoke or cancel message to an open SSE channel.
+
+    The `X-Channel-Token` header must hold the token the channel's stream
+    started with.
+    """
+    channel = channels.get(channel_id, request.headers.get("x-channel-token"))
+    if channel is None:
+        status = 403 if channel_id in channels else 404
+        error = (
+            "Invalid channel token"
+            if status == 403
+            else f"No open channel: {channel_id}"
+        )
+        return Response(
+            content=json.dumps({"error": error}),
+            media_type="application/json",
+            status_code=status,
+        )
+    await channel.receive(await request.json(), request)
+    return Response(status_code=202)
+
+
+@app.get("/health")
+async def health() -> dict[str, Any]:
+    """Return whether this server is up, and which worker it is."""
+    return {
+        "status": "ok",
+        "worker": WORKER_INDEX,
+        "workers": WORKER_COUNT,
+        "pid": os.getpid(),
+    }
+
+
+@app.get("/ready")
+async def ready() -> dict[str, Any]:
+    """Answer 200 once startup and warm-up are done, i.e. whenever this app serves."""
+    return {"status": "ok", "ready": True, "pid": os.getpid()}
+
+
+@app.get("/compaction/stats")
+async def compaction_stats(conversation_id: str | None = None) -> dict[str, Any]:
+    """Return compaction counters and per-session token counts before and after."""
+    return compactor.stats(conversation_id)
+
+
+@app.get("/cache/stats")
+async def cache_stats() -> dict[str, Any]:
+    """Return response cache hit/miss counters."""
+    return response_cache.stats()
+
+
+@app.get("/admission/stats")
+async def admission_stats() -> dict[str, Any]:
+    """Return admission control and model retry counters."""
+    return {**admission.stats(), **model_limiter.stats()}
+
+
+@app.get("/local-index/stats")
+async def local_index_stats() -> dict[str, Any]:
+    """Return local index sizes and how many searches were answered locally."""
+    if local_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **local_index.stats(), **root_agent.local_search_stats()}
+
+
+@app.get("/cascade/stats")
+async def cascade_stats() -> dict[str, Any]:
+    """Return which cascade tier answered, why answers escalated and latency saved."""
+    return root_agent.cascade_stats()
+
+
+@app.get("/prompt-cache/stats")
+async def prompt_cache_stats_endpoint() -> dict[str, Any]:
+    """Return model calls that read a cached prompt prefix and the tokens saved."""
+    return {"enabled": prompt_cache_config is not None, **prompt_cache_stats.stats()}
+
+
+@app.get("/hedging/stats")
+async def hedging_stats() -> dict[str, Any]:
+    """Return how many agent runs were hedged, how many hedges won, and the budget."""
+    return root_agent.hedge_stats()
+
+
+@app.get("/tools/stats")
+async def tool_stats() -> dict[str, Any]:
+    """Return per-tool calls, errors, timeouts, cache hits and latency."""
+    return tool_runtime.stats()
+
+
+@app.get("/model-pool/stats")
+async def model_pool_stats() -> dict[str, Any]:
+    """Return the shared model connection pool's connections and counters."""
+    return model_pool.stats()
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """Return request, stage and tool metrics in the Prometheus text format."""
+    return Response(
+        content=metrics.registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@app.get("/logging")
+async def logging_settings() -> dict[str, Any]:
+    """Return the log level, sample rate and written/dropped record counts."""
+    return telemetry.stats()
+
+
+def logging_error(message: str, status_code: int = 400) -> Response:
+    """Return a response rejecting a change of the log settings."""
+    return Response(
+        content=json.dumps({"error": message}),
+        media_type="application/json",
+        status_code=status_code,
+    )
+
+
+@app.post("/logging", response_model=None)
+async def configure_logging(request: Request) -> Response | dict[str, Any]:
+    """Change the log level and/or trace sample rate at runtime.
+
+    Body example: {"level": "DEBUG", "sample_rate": 0.05}
+    The request must carry `Authorization: Bearer <LOG_ADMIN_TOKEN>`; the
+    endpoint answers 403 while LOG_ADMIN_TOKEN is unset.
+    """
+    if not LOG_ADMIN_TOKEN:
+        return logging_error("Set LOG_ADMIN_TOKEN to change log settings", 403)
+    authorization = request.headers.get("authorization", "")
+    if not secrets.compare_digest(
+        authorization.encode(), f"Bearer {LOG_ADMIN_TOKEN}".encode()
+    ):
+        return logging_error("Missing or wrong admin token", 401)
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return logging_error("The body must be a JSON object")
+    level = body.get("level")
+    if level is not None and str(level).upper() not in LEVELS:
+        return logging_error(f"Unknown level: {level}")
+    sample_rate = body.get("sample_rate")
+    if sample_rate is not None and (
+        isinstance(sample_rate, bool)
+        or not isinstance(sample_rate, (int, float))
+        or not 0 <= sample_rate <= 1
+    ):
+        return logging_error("'sample_rate' must be a number from 0 to 1")
+    telemetry.configure(
+        level=level, sample_rate=float(sample_rate) if sample_rate is not None else None
+    )
+    return telemetry.stats()
+
+
+@app.get("/runs/stats")
+async def run_stats() -> dict[str, Any]:
+    """Return how many agent runs completed, failed, were cancelled or timed out."""
+    return supervisor.stats()
+
+
+@app.get("/single-flight/stats")
+async def single_flight_stats() -> dict[str, Any]:
+    """Return how many requests joined another request's in-flight agent run."""
+    return single_flight.stats()
+
+
+@app.get("/routing/stats")
+async def routing_stats() -> dict[str, Any]:
+    """Return the queries sent to each route and those answered on the fast path."""
+    return {"routes": root_agent.route_stats(), **root_agent.fast_path_stats()}
 
 
 @app.options("/invoke")
-async def invoke_options():
+async def invoke_options() -> Response:
     """Handle preflight CORS requests for /invoke endpoint."""
     return Response(
         content="",
-        headers={
-            "Access-Control-Allow-Origin": "http://localhost:5173",
-            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-        },
+        headers=CORS_HEADERS,
     )
 
 
-def create_frontend_router(build_dir="../frontend/dist"):
-    """Creates a router to serve the React frontend.
+def create_frontend_router(build_dir: str = "../frontend/dist") -> ASGIApp:
+    """Create a router to serve the React frontend.
 
     Args:
         build_dir: Path to the React build directory relative to this file.
@@ -220,13 +1340,14 @@ def create_frontend_router(build_dir="../frontend/dist"):
     build_path = pathlib.Path(__file__).parent.parent.parent / build_dir
 
     if not build_path.is_dir() or not (build_path / "index.html").is_file():
-        print(
-            f"WARN: Frontend build directory not found or incomplete at {build_path}. Serving frontend will likely fail."
+        telemetry.warning(
+            "Frontend build directory not found or incomplete, serving frontend will likely fail",
+            path=str(build_path),
         )
         # Return a dummy router if build isn't ready
         from starlette.routing import Route
 
-        async def dummy_frontend(request):
+        async def dummy_frontend(request: Request) -> Response:
             return Response(
                 "Frontend not built. Run 'npm run build' in the frontend directory.",
                 media_type="text/plain",
@@ -0,0 +1,130 @@
+"""Fast-starting entry point: `uvicorn src.asgi:app`.
+
+Importing the agent server (`src.app`) loads google-adk and google-genai,
+which takes well over a second. This module only uses the standard library, so
+the server binds right away and answers health checks while the real app is
+imported in a background thread and warmed up by its own lifespan.
+"""
+
+import asyncio
+import importlib
+import json
+import os
+import time
+from contextlib import AbstractAsyncContextManager
+from typing import Any, Awaitable, Callable, MutableMapping
+
+# The ASGI types of starlette.types, spelled out to keep this module free of
+# third-party imports.
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class LazyApp:
+    """ASGI app that serves at once and loads the real app in the background.
+
+    Lifespan startup completes immediately and starts the warm-up: the module
+    of `target` ("module:attribute") is imported in a worker thread, then the
+    app's own lifespan is entered. `GET /health` always answers at once, with
+    whether the app is ready; `GET /ready` answers 503 until it is. Other
+    requests wait for the warm-up and are then handed to the real app.
+    """
+
+    def __init__(self, target: str) -> None:
+        """Create an app that loads `target`, e.g. "src.app:app", once started."""
+        self.target = target
+        self.app: ASGIApp | None = None
+        self.error: BaseException | None = None
+        self.ready_after: float | None = None
+        self._started = time.perf_counter()
+        self._ready: asyncio.Event | None = None
+        self._warming: asyncio.Task[None] | None = None
+        self._lifespan: AbstractAsyncContextManager[Any] | None = None
+
+    def _start_warm_up(self) -> asyncio.Event:
+        if self._ready is None:
+            self._ready = asyncio.Event()
+            self._warming = asyncio.get_running_loop().create_task(
+                self._warm_up(self._ready)
+            )
+        return self._ready
+
+    async def _warm_up(self, ready: asyncio.Event) -> None:
+        try:
+            module_name, attribute = self.target.split(":")
+            module = await asyncio.to_thread(importlib.import_module, module_name)
+            app = getattr(module, attribute)
+            lifespan = app.router.lifespan_context(app)
+            await lifespan.__aenter__()
+            self._lifespan = lifespan
+            self.app = app
+            self.ready_after = time.perf_counter() - self._started
+        except Exception as e:
+            self.error = e
+        finally:
+            ready.set()
+
+    async def _run_lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start_warm_up()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._warming is not None:
+                    # An import in progress cannot be interrupted.
+                    await self._warming
+                if self._lifespan is not None:
+                    await self._lifespan.__aexit__(None, None, None)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def status(self) -> dict[str, Any]:
+        """Return whether the app is ready and how long the warm-up took."""
+        status: dict[str, Any] = {
+            "status": "ok" if self.error is None else "failed",
+            "ready": self.app is not None,
+            "pid": os.getpid(),
+        }
+        if self.ready_after is not None:
+            status["ready_after_ms"] = round(self.ready_after * 1000, 1)
+        if self.error is not None:
+            status["error"] = repr(self.error)
+        return status
+
+    @staticmethod
+    async def _respond(send: Send, status_code: int, body: dict[str, Any]) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Answer health checks at once and hand other requests to the app."""
+        if scope["type"] == "lifespan":
+            await self._run_lifespan(receive, send)
+            return
+        if scope["type"] == "http" and scope["path"] in ("/health", "/ready"):
+            status = self.status()
+            ok = self.error is None and (scope["path"] == "/health" or status["ready"])
+            await self._respond(send, 200 if ok else 503, status)
+            return
+        # Servers started without lifespan events warm up on first request.
+        await self._start_warm_up().wait()
+        if self.app is None:
+            if scope["type"] == "http":
+                await self._respond(send, 503, self.status())
+            else:
+                await send({"type": "websocket.close", "code": 1011})
+            return
+        await self.app(scope, receive, send)
+
+
+app = LazyApp(os.getenv("LAZY_APP_TARGET", "src.app:app"))
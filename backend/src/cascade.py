@@ -0,0 +1,244 @@
+"""Model cascades: try cheaper models first and escalate unconvincing answers."""
+
+import os
+import re
+import time
+from typing import Any, AsyncGenerator, Callable, Iterable, Sequence
+
+from google.adk.agents import LlmAgent
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.models import BaseLlm
+
+from src.metrics import registry
+from src.models import agent_model
+from src.telemetry import telemetry
+
+CASCADE_ATTEMPTS = registry.counter(
+    "model_cascade_attempts_total",
+    "Answers of cheaper cascade tiers, by whether they were served or escalated "
+    "and why.",
+    ("route", "model", "outcome"),
+)
+
+# Runs an agent on a context in place of its `run_async`, e.g. `Hedger.run`.
+AgentRunner = Callable[[BaseAgent, InvocationContext], AsyncGenerator[Event, None]]
+
+# Answers that decline instead of answering. They are escalated, since a
+# stronger model often can answer them.
+REFUSAL = re.compile(
+    r"\b(i(?:'m| am) sorry|i can(?:no|')t (?:help|answer|assist)"
+    r"|i(?:'m| am) (?:unable|not able) to|i do(?:n't| not) (?:know|have access)"
+    r"|as an ai)\b"
+)
+
+
+def parse_cascades(spec: str) -> dict[str, tuple[str, ...]]:
+    """Parse per-route cascades written as "route=model>model,route=model".
+
+    The models of a route are tried in order before the route's own agent.
+    """
+    cascades: dict[str, tuple[str, ...]] = {}
+    for item in spec.split(","):
+        if "=" in item:
+            route, names = item.split("=", 1)
+            models = tuple(model.strip() for model in names.split(">") if model.strip())
+            if models:
+                cascades[route.strip()] = models
+    return cascades
+
+
+def cascades_from_env() -> dict[str, tuple[str, ...]]:
+    """Return the cascades in MODEL_CASCADES, e.g. "search=gemini-2.0-flash-lite"."""
+    return parse_cascades(os.getenv("MODEL_CASCADES", ""))
+
+
+def build_tiers(agent: LlmAgent, models: Iterable[str | BaseLlm]) -> list[LlmAgent]:
+    """Return copies of `agent` using each of `models`, followed by `agent` itself.
+
+    `models` are model names (resolved with `agent_model`) or model objects.
+    The copies keep the agent's name, so clients cannot tell which tier answered.
+    """
+    tiers = [
+        agent.clone(
+            update={
+                "model": model if isinstance(model, BaseLlm) else agent_model(model)
+            }
+        )
+        for model in models
+    ]
+    return tiers + [agent]
+
+
+def final_text(events: Iterable[Event]) -> str:
+    """Return the text of the final responses among `events`."""
+    return "".join(
+        part.text
+        for event in events
+        if not event.partial and event.is_final_response() and event.content
+        for part in event.content.parts or []
+        if part.text and not part.thought
+    )
+
+
+def escalation_reason(events: Sequence[Event], grounded: bool = False) -> str | None:
+    """Return why a tier's answer should be escalated, or None if it can be served.
+
+    An answer is escalated when a model call or tool failed, when its final
+    text is empty or a refusal, or, for `grounded` agents (web search), when
+    no response carried grounding metadata.
+    """
+    if any(event.error_code for event in events):
+        return "model_error"
+    for event in events:
+        for response in event.get_function_responses():
+            if isinstance(response.response, dict) and "error" in response.response:
+                return "tool_error"
+    text = final_text(events).strip()
+    if not text:
+        return "empty"
+    if REFUSAL.search(text.lower()):
+        return "refusal"
+    if grounded and not any(event.grounding_metadata for event in events):
+        return "no_grounding"
+    return None
+
+
+async def run_on_copy(
+    agent: BaseAgent, context: InvocationContext
+) -> AsyncGenerator[Event, None]:
+    """Run `agent` on a copy of the session and yield its events.
+
+    The events are appended to the copy, as the runner would append them to
+    the session, so multi-step tool flows see their own history, while the
+    real session only gets the events the caller passes on to the runner.
+    """
+    session = context.session.model_copy(deep=True)
+    detached = context.model_copy(update={"session": session})
+    async for event in agent.run_async(detached):
+        if not event.partial:
+            session.events.append(event)
+            session.state.update(
+                (key, value)
+                for key, value in event.actions.state_delta.items()
+                if not key.startswith("temp:")
+            )
+        yield event
+
+
+class Cascade:
+    """Runs a route's agent cheapest tier first, escalating unconvincing answers.
+
+    Each tier but the last runs with `run_on_copy`, its events held back. If
+    `escalation_reason` finds nothing wrong, the held-back events are
+    yielded, and the runner appends them to the real session. Otherwise they
+    are dropped and the next tier runs. The last tier is the route's own
+    agent, whose events are streamed as usual.
+
+    Served cheap answers reach the client in one burst after they complete
+    rather than streamed, which suits the short answers cascades are meant for.
+    Only the last tier can be hedged, see `run`.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        tiers: list[LlmAgent],
+        grounded: bool = False,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Create a cascade of `tiers`, cheapest first.
+
+        Args:
+            route: Name of the route, used in metrics and logs.
+            tiers: Agents to try in order, the route's own agent last.
+            grounded: Escalate answers carrying no grounding metadata.
+            clock: Returns the current time in seconds.
+        """
+        self.route = route
+        self.tiers = tiers
+        self.grounded = grounded
+        self._clock = clock
+        self._queries = 0
+        self._answered_by = [0] * len(tiers)
+        self._escalations: dict[str, int] = {}
+        # Seconds spent in served cheap tiers, in cheap tiers whose answer was
+        # escalated, and in the last tier (with how many runs of it).
+        self._served_seconds = 0.0
+        self._wasted_seconds = 0.0
+        self._last_tier_seconds = 0.0
+        self._last_tier_runs = 0
+
+    async def run(
+        self, context: InvocationContext, run_last: AgentRunner | None = None
+    ) -> AsyncGenerator[Event, None]:
+        """Yield the events of the first tier whose answer can be served.
+
+        `run_last`, e.g. `Hedger.run`, runs the last tier instead of its
+        `run_async`. Cheaper tiers are not hedged: their answers are held back
+        until complete, and a slow one is better escalated than duplicated.
+        """
+        self._queries += 1
+        for number, tier in enumerate(self.tiers[:-1]):
+            started = self._clock()
+            try:
+                events = [event async for event in run_on_copy(tier, context)]
+                reason = escalation_reason(events, self.grounded)
+            except Exception as error:
+                telemetry.warning(
+                    "Cascade tier failed",
+                    route=self.route,
+                    tier=number,
+                    error=str(error),
+                )
+                events, reason = [], "error"
+            seconds = self._clock() - started
+            model = getattr(tier.model, "model", str(tier.model))
+            if reason is None:
+                CASCADE_ATTEMPTS.inc(labels=(self.route, model, "served"))
+                self._answered_by[number] += 1
+                self._served_seconds += seconds
+                for event in events:
+                    yield event
+                return
+            CASCADE_ATTEMPTS.inc(labels=(self.route, model, reason))
+            self._escalations[reason] = self._escalations.get(reason, 0) + 1
+            self._wasted_seconds += seconds
+            telemetry.debug(
+                "Cascade escalated", route=self.route, tier=number, reason=reason
+            )
+
+        started = self._clock()
+        last = self.tiers[-1]
+        run = run_last(last, context) if run_last else last.run_async(context)
+        async for event in run:
+            yield event
+        self._last_tier_runs += 1
+        self._last_tier_seconds += self._clock() - started
+        self._answered_by[-1] += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Return answers per tier, escalations by reason and estimated latency saved.
+
+        The saving assumes every query served by a cheap tier would have taken
+        the last tier's mean latency, less the time cheap tiers spent on
+        answers that were escalated. It is None until the last tier has run.
+        """
+        served = sum(self._answered_by[:-1])
+        saved = None
+        if self._last_tier_runs:
+            mean = self._last_tier_seconds / self._last_tier_runs
+            saved = (served * mean - self._served_seconds - self._wasted_seconds) * 1000
+        return {
+            "models": [
+                getattr(tier.model, "model", str(tier.model)) for tier in self.tiers
+            ],
+            "queries": self._queries,
+            "answered_by_tier": list(self._answered_by),
+            "escalations": dict(self._escalations),
+            "escalation_rate": (
+                1 - self._answered_by[0] / self._queries if self._queries else 0.0
+            ),
+            "latency_saved_ms": saved,
+        }
@@ -0,0 +1,190 @@
+"""Record model responses to cassettes and replay them without network access."""
+
+import difflib
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Any, AsyncGenerator
+
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from typing_extensions import override
+
+from src.admission import AdmittedGemini
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no cassette matches a model request."""
+
+
+def _text(value: str) -> str:
+    return _WHITESPACE.sub(" ", value).strip()
+
+
+def _instruction(config: types.GenerateContentConfig | None) -> str:
+    instruction = getattr(config, "system_instruction", None) if config else None
+    if instruction is None:
+        return ""
+    if isinstance(instruction, str):
+        return _text(instruction)
+    parts = getattr(instruction, "parts", None) or []
+    return _text(" ".join(part.text or "" for part in parts))
+
+
+def _tools(config: types.GenerateContentConfig | None) -> list[str]:
+    names = []
+    for tool in (getattr(config, "tools", None) if config else None) or []:
+        for declaration in getattr(tool, "function_declarations", None) or []:
+            names.append(declaration.name)
+        if getattr(tool, "google_search", None) is not None:
+            names.append("google_search")
+    return sorted(names)
+
+
+def _part(part: types.Part) -> dict[str, Any] | None:
+    if part.thought:
+        return None
+    if part.function_call:
+        # Call IDs are generated per run, so they are left out.
+        return {"call": part.function_call.name, "args": part.function_call.args or {}}
+    if part.function_response:
+        return {
+            "result": part.function_response.name,
+            "response": part.function_response.response,
+        }
+    if part.text:
+        return {"text": _text(part.text)}
+    return None
+
+
+def normalize_request(
+    model: str, llm_request: LlmRequest, stream: bool
+) -> dict[str, Any]:
+    """Return the parts of a model request that decide its response.
+
+    Whitespace is collapsed and per-run values such as function call IDs are
+    dropped, so only meaningful changes to prompts, history or tools change
+    the result. Tool outputs are kept, so a run whose tools return different
+    values (e.g. a dice roll) needs its own cassette.
+    """
+    contents = []
+    for content in llm_request.contents:
+        parts = [
+            normalized
+            for part in content.parts or []
+            if (normalized := _part(part)) is not None
+        ]
+        if parts:
+            contents.append({"role": content.role, "parts": parts})
+    return {
+        "model": model,
+        "stream": stream,
+        "instruction": _instruction(llm_request.config),
+        "tools": _tools(llm_request.config),
+        "contents": contents,
+    }
+
+
+def request_key(normalized: dict[str, Any]) -> str:
+    """Return a stable hash of a normalized request."""
+    encoded = json.dumps(normalized, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:24]
+
+
+class CassetteGemini(AdmittedGemini):
+    """Gemini model that records responses to cassettes or replays them.
+
+    In "record" mode every call goes to the model and its responses, tool
+    calls and grounding metadata included, are written to one JSON file per
+    request in `cassette_dir`, named after the hash of the normalized request.
+    In "replay" mode responses are read back without any network access; as
+    cassettes are plain files looked up by content, replay is deterministic
+    and safe to run in parallel. A request without a cassette raises
+    `CassetteMiss`, showing how it differs from the closest recorded request.
+
+    Hand-written cassettes carry `"synthetic": true`; their responses are not
+    model output, so they check the app's wiring rather than the answers.
+    """
+
+    cassette_dir: str = "cassettes"
+    mode: str = "replay"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    def _load_all(self) -> list[dict[str, Any]]:
+        cassettes = []
+        if os.path.isdir(self.cassette_dir):
+            for name in sorted(os.listdir(self.cassette_dir)):
+                if name.endswith(".json"):
+                    with open(os.path.join(self.cassette_dir, name)) as file:
+                        cassettes.append(json.load(file))
+        return cassettes
+
+    def _find(self, normalized: dict[str, Any]) -> dict[str, Any] | None:
+        path = self._path(request_key(normalized))
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            cassette: dict[str, Any] = json.load(file)
+        return cassette
+
+    def _miss(self, normalized: dict[str, Any], key: str) -> CassetteMiss:
+        wanted = json.dumps(normalized, indent=1, sort_keys=True, default=str)
+        closest, best = None, 0.0
+        for cassette in self._load_all():
+            recorded = json.dumps(cassette["request"], indent=1, sort_keys=True)
+            ratio = difflib.SequenceMatcher(None, recorded, wanted).quick_ratio()
+            if ratio > best:
+                closest, best = recorded, ratio
+        message = f"No cassette for model request {key} in {self.cassette_dir}."
+        if closest is not None:
+            diff = difflib.unified_diff(
+                closest.splitlines(),
+                wanted.splitlines(),
+                "recorded",
+                "requested",
+                lineterm="",
+            )
+            message += " Closest recorded request differs:\n" + "\n".join(diff)
+        return CassetteMiss(message)
+
+    def _save(self, normalized: dict[str, Any], responses: list[LlmResponse]) -> None:
+        key = request_key(normalized)
+        cassette = {
+            "key": key,
+            "request": normalized,
+            "responses": [
+                response.model_dump(mode="json", exclude_none=True)
+                for response in responses
+            ],
+        }
+        os.makedirs(self.cassette_dir, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=self.cassette_dir, suffix=".tmp")
+        with os.fdopen(handle, "w") as file:
+            json.dump(cassette, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self._path(key))
+
+    @override
+    async def _call_model(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        normalized = normalize_request(self.model, llm_request, stream)
+        if self.mode == "replay":
+            cassette = self._find(normalized)
+            if cassette is None:
+                raise self._miss(normalized, request_key(normalized))
+            for data in cassette["responses"]:
+                yield LlmResponse.model_validate(data)
+            return
+
+        responses = []
+        async for response in super()._call_model(llm_request, stream):
+            responses.append(response)
+            yield response
+        self._save(normalized, responses)
@@ -0,0 +1,196 @@
+"""Multiplexed WebSocket and SSE channels carrying many conversation turns."""
+
+import asyncio
+import os
+import secrets
+import uuid
+from typing import Any, AsyncGenerator, Awaitable, Callable, Collection, Coroutine
+from urllib.parse import urlsplit
+
+# Runs one conversation turn for (connection, invoke message, send), streaming
+# its messages with `send` and returning when the turn is over.
+TurnHandler = Callable[
+    [Any, dict[str, Any], Callable[[dict[str, Any]], Awaitable[None]]],
+    Coroutine[Any, Any, None],
+]
+
+
+class Channel:
+    """One client connection carrying any number of concurrent conversation turns.
+
+    Clients send {"type": "invoke", "request_id": ..., ...} to start a turn and
+    {"type": "cancel", "request_id": ...} to cancel one. Every message sent
+    back carries the `request_id` of its turn. Outgoing messages go through a
+    bounded queue drained by the transport, so when the client reads slowly
+    the turns wait on `send` and stop pulling agent events (backpressure).
+    """
+
+    def __init__(
+        self, handler: TurnHandler, max_turns: int = 16, max_buffered: int = 64
+    ) -> None:
+        """Create a channel whose turns are run by `handler`.
+
+        Args:
+            handler: Runs one turn, see `TurnHandler`.
+            max_turns: How many turns may run at once.
+            max_buffered: How many outgoing messages are buffered before
+                turns wait on `send`.
+        """
+        self.handler = handler
+        self.max_turns = max_turns
+        self.outgoing: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue(
+            maxsize=max_buffered
+        )
+        self.turns: dict[str, asyncio.Task[None]] = {}
+        self.closed = False
+
+    async def send(self, message: dict[str, Any]) -> None:
+        """Queue a message for the client, waiting while the queue is full."""
+        await self.outgoing.put(message)
+
+    async def receive(self, message: object, connection: Any) -> None:
+        """Handle a message from the client.
+
+        Args:
+            message: The decoded message.
+            connection: The WebSocket or HTTP request the message came with,
+                passed on to the turn handler.
+        """
+        if not isinstance(message, dict):
+            await self.send({"type": "error", "error": "Messages must be JSON objects"})
+            return
+        kind = message.get("type")
+        request_id = str(message.get("request_id") or uuid.uuid4().hex)
+        if kind == "invoke":
+            await self._start(request_id, message, connection)
+        elif kind == "cancel":
+            turn = self.turns.get(request_id)
+            if turn is not None and turn.cancel():
+                # The turn stops at its next await, so this is its last message.
+                await self.send(
+                    {
+                        "type": "done",
+                        "finishReason": "cancelled",
+                        "request_id": request_id,
+                    }
+                )
+        else:
+            await self.send(
+                {
+                    "type": "error",
+                    "request_id": request_id,
+                    "error": f"Unknown message type: {kind}",
+                }
+            )
+
+    async def _start(
+        self, request_id: str, message: dict[str, Any], connection: Any
+    ) -> None:
+        if request_id in self.turns or len(self.turns) >= self.max_turns:
+            error = (
+                "Duplicate request_id"
+                if request_id in self.turns
+                else f"At most {self.max_turns} turns may run at once"
+            )
+            await self.send({"type": "error", "request_id": request_id, "error": error})
+            return
+
+        async def send(update: dict[str, Any]) -> None:
+            await self.send({**update, "request_id": request_id})
+
+        turn = asyncio.get_running_loop().create_task(
+            self.handler(connection, message, send)
+        )
+        self.turns[request_id] = turn
+        turn.add_done_callback(lambda _: self.turns.pop(request_id, None))
+
+    async def messages(self) -> AsyncGenerator[dict[str, Any], None]:
+        """Yield outgoing messages for the transport to write, until closed."""
+        while not (self.closed and self.outgoing.empty()):
+            message = await self.outgoing.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self) -> None:
+        """Cancel all running turns, e.g. because the client disconnected."""
+        self.closed = True
+        for turn in list(self.turns.values()):
+            turn.cancel()
+        if not self.outgoing.full():
+            self.outgoing.put_nowait(None)
+
+
+def allowed_origins_from_env() -> list[str]:
+    """Return the browser origins in ALLOWED_ORIGINS, e.g. "http://localhost:5173"."""
+    origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173")
+    return [origin.strip() for origin in origins.split(",") if origin.strip()]
+
+
+def origin_allowed(
+    origin: str | None, host: str | None, allowed: Collection[str]
+) -> bool:
+    """Return whether a browser on `origin` may open a channel on `host`.
+
+    Requests without an Origin header come from non-browser clients and are
+    allowed, as are same-origin pages and the origins in `allowed`.
+    """
+    if origin is None or origin in allowed:
+        return True
+    return host is not None and urlsplit(origin).netloc == host
+
+
+class ChannelRegistry:
+    """Open SSE channels by ID, each bound to the client that opened it.
+
+    Opening a channel returns a token that only its client knows. Messages
+    for the channel, and streams replacing it, must present the token, so
+    clients that merely know a channel ID cannot use or take over it.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._channels: dict[str, tuple[Channel, str]] = {}
+
+    def open(
+        self, channel_id: str, channel: Channel, token: str | None = None
+    ) -> str | None:
+        """Register a channel and return its token.
+
+        An open channel with the same ID is replaced and closed if `token` is
+        its token; otherwise nothing is registered and None is returned.
+        """
+        previous = self._channels.get(channel_id)
+        if previous is not None:
+            if not self._matches(previous, token):
+                return None
+            previous[0].close()
+            token = previous[1]
+        else:
+            token = secrets.token_urlsafe(16)
+        self._channels[channel_id] = (channel, token)
+        return token
+
+    def get(self, channel_id: str, token: str | None) -> Channel | None:
+        """Return the open channel `channel_id` if `token` is its token."""
+        entry = self._channels.get(channel_id)
+        return entry[0] if entry is not None and self._matches(entry, token) else None
+
+    def __contains__(self, channel_id: str) -> bool:
+        """Return whether a channel `channel_id` is open."""
+        return channel_id in self._channels
+
+    @staticmethod
+    def _matches(entry: tuple[Channel, str], token: str | None) -> bool:
+        return token is not None and secrets.compare_digest(entry[1], token)
+
+    def close(self, channel_id: str, channel: Channel) -> None:
+        """Close a channel and forget it if it is still the registered one."""
+        channel.close()
+        entry = self._channels.get(channel_id)
+        if entry is not None and entry[0] is channel:
+            del self._channels[channel_id]
+
+    def __len__(self) -> int:
+        """Return the number of open channels."""
+        return len(self._channels)
@@ -0,0 +1,239 @@
+"""Summarize the older turns of long sessions to keep prompts short."""
+
+import functools
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from google.adk.events import Event
+from google.adk.models import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from src.models import agent_model
+from src.session_store import BoundedSessionService
+from src.sqlite_session_service import SqliteSessionService
+from src.telemetry import telemetry
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and an assistant. "
+    "Keep every fact, answer, number and open question needed to continue it. "
+    "Reply with the summary only.\n\n"
+)
+
+
+def event_tokens(event: Event) -> int:
+    """Estimate the prompt tokens an event contributes (about 4 chars per token)."""
+    if not event.content or not event.content.parts:
+        return 0
+    chars = 0
+    for part in event.content.parts:
+        if part.text:
+            chars += len(part.text)
+        if part.function_call:
+            chars += len(part.function_call.name or "")
+            chars += len(json.dumps(part.function_call.args or {}, default=str))
+        if part.function_response:
+            chars += len(part.function_response.name or "")
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // 4 + 1
+
+
+def transcript(events: list[Event]) -> str:
+    """Render events as a plain text transcript for the summarizer."""
+    lines = []
+    for event in events:
+        if not event.content or not event.content.parts:
+            continue
+        for part in event.content.parts:
+            if part.text:
+                lines.append(f"{event.author}: {part.text}")
+            elif part.function_call:
+                lines.append(
+                    f"{event.author} called {part.function_call.name}"
+                    f"({json.dumps(part.function_call.args or {}, default=str)})"
+                )
+            elif part.function_response:
+                lines.append(
+                    f"{part.function_response.name} returned "
+                    f"{json.dumps(part.function_response.response or {}, default=str)}"
+                )
+    return "\n".join(lines)
+
+
+@functools.cache
+def summary_model() -> BaseLlm:
+    """Return the model that writes summaries, built like the agents' models.
+
+    Going through `agent_model` applies the same backend switches (fake,
+    cassettes), admission control, retries and connection pool.
+    """
+    return agent_model("gemini-2.0-flash")
+
+
+async def model_summarizer(text: str) -> str:
+    """Summarize a transcript with `summary_model()`."""
+    request = LlmRequest(
+        model=summary_model().model,
+        contents=[
+            types.Content(role="user", parts=[types.Part(text=SUMMARY_PROMPT + text)])
+        ],
+        config=types.GenerateContentConfig(temperature=0.0),
+    )
+    summary = ""
+    async for response in summary_model().generate_content_async(request):
+        if response.partial or not response.content:
+            continue
+        summary = "".join(part.text or "" for part in response.content.parts or [])
+    return summary
+
+
+class HistoryCompactor:
+    """Folds older turns of long sessions into a single summary event.
+
+    A session is compacted once its estimated prompt tokens exceed
+    `max_tokens` or it holds more than `max_events` events. Everything before
+    the most recent `keep_events` events (rounded back to a user turn) is
+    replaced by one user-authored summary event; the recent window is kept
+    verbatim. Compaction is meant to run after a response has been sent, e.g.
+    as a Starlette background task.
+
+    The session service must provide `compact_history()`, as
+    `BoundedSessionService` and `SqliteSessionService` do.
+    """
+
+    def __init__(
+        self,
+        session_service: BoundedSessionService | SqliteSessionService,
+        summarize: Callable[[str], Awaitable[str]] = model_summarizer,
+        max_tokens: int = 8000,
+        max_events: int = 40,
+        keep_events: int = 10,
+        max_tracked_sessions: int = 1000,
+    ) -> None:
+        """Create a compactor for the sessions of `session_service`.
+
+        Args:
+            session_service: Service holding the sessions to compact.
+            summarize: Coroutine summarizing a plain text transcript.
+            max_tokens: Estimated prompt tokens that trigger compaction.
+            max_events: Events that trigger compaction.
+            keep_events: Most recent events kept verbatim.
+            max_tracked_sessions: Sessions whose token counts `stats` reports.
+        """
+        self.session_service = session_service
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.max_events = max_events
+        self.keep_events = keep_events
+        self.max_tracked_sessions = max_tracked_sessions
+        self.session_stats: OrderedDict[tuple[str, str, str], dict[str, int]] = (
+            OrderedDict()
+        )
+        self.compactions = 0
+        self.failures = 0
+        self._running: set[tuple[str, str, str]] = set()
+
+    def over_budget(self, events: list[Event]) -> bool:
+        """Return whether a history exceeds the event or token budget."""
+        if len(events) > self.max_events:
+            return True
+        return sum(event_tokens(e) for e in events) > self.max_tokens
+
+    def split_point(self, events: list[Event]) -> int:
+        """Return the index of the first event of the verbatim window.
+
+        The window starts at a user turn so tool calls stay with their
+        responses. Returns 0 when there is nothing old enough to fold.
+        """
+        index = max(len(events) - self.keep_events, 0)
+        while index > 0 and events[index].author != "user":
+            index -= 1
+        return index
+
+    async def compact(self, app_name: str, user_id: str, session_id: str) -> bool:
+        """Compact a session if it is over budget.
+
+        Returns:
+            True if the session history was replaced by a summary.
+        """
+        key = (app_name, user_id, session_id)
+        if key in self._running:
+            return False
+        self._running.add(key)
+        try:
+            session = await self.session_service.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+            if session is None or not self.over_budget(session.events):
+                return False
+            split = self.split_point(session.events)
+            if split == 0:
+                return False
+
+            old, recent = session.events[:split], session.events[split:]
+            summary = await self.summarize(transcript(old))
+            summary_event = Event(
+                author="user",
+                invocation_id=old[-1].invocation_id,
+                timestamp=old[-1].timestamp,
+                content=types.Content(
+                    role="user", parts=[types.Part(text=SUMMARY_PREFIX + summary)]
+                ),
+            )
+            replaced = await self.session_service.compact_history(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                upto_event_id=old[-1].id,
+                summary_event=summary_event,
+            )
+            if not replaced:
+                return False
+
+            tokens_before = sum(event_tokens(e) for e in session.events)
+            tokens_after = event_tokens(summary_event) + sum(
+                event_tokens(e) for e in recent
+            )
+            stats = self.session_stats.pop(key, {"compactions": 0})
+            stats.update(
+                compactions=stats["compactions"] + 1,
+                events_before=len(session.events),
+                events_after=len(recent) + 1,
+                tokens_before=tokens_before,
+                tokens_after=tokens_after,
+            )
+            self.session_stats[key] = stats
+            while len(self.session_stats) > self.max_tracked_sessions:
+                self.session_stats.popitem(last=False)
+            self.compactions += 1
+            telemetry.info(
+                "Compacted session",
+                session_id=session_id,
+                tokens_before=tokens_before,
+                tokens_after=tokens_after,
+                events_before=len(session.events),
+                events_after=len(recent) + 1,
+            )
+            return True
+        except Exception as e:
+            self.failures += 1
+            telemetry.error("Compaction failed", session_id=session_id, error=str(e))
+            return False
+        finally:
+            self._running.discard(key)
+
+    def stats(self, session_id: str | None = None) -> dict[str, Any]:
+        """Return global counters and per-session token counts."""
+        sessions = {
+            f"{user_id}/{sid}": stats
+            for (_, user_id, sid), stats in self.session_stats.items()
+            if session_id is None or sid == session_id
+        }
+        return {
+            "compactions": self.compactions,
+            "failures": self.failures,
+            "sessions": sessions,
+        }
@@ -0,0 +1,14 @@
+"""Test setup shared by the tests in src/.
+
+Agents are built when their modules are imported, so the model cassette
+settings are set here, before any test module imports them: unless
+MODEL_CASSETTE_MODE is set (e.g. to "record" with a GOOGLE_API_KEY, or to
+"off" for live calls), tests replay the Gemini responses in cassettes/.
+"""
+
+import os
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cassettes")
+
+os.environ.setdefault("MODEL_CASSETTE_MODE", "replay")
+os.environ.setdefault("MODEL_CASSETTE_DIR", CASSETTE_DIR)
@@ -0,0 +1,132 @@
+"""Encode agent updates in the AI SDK data stream protocol."""
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, AsyncIterable
+
+# Compact separators keep parts byte-identical to what the AI SDK emits.
+_SEPARATORS = (",", ":")
+
+_END = object()
+_ERROR = object()
+_FLUSH = object()
+
+
+def text_part(text: str) -> str:
+    """Return a `0:` text part."""
+    return f"0:{json.dumps(text)}\n"
+
+
+def data_part(values: list[Any]) -> str:
+    """Return a `2:` data part."""
+    return f"2:{json.dumps(values, separators=_SEPARATORS)}\n"
+
+
+def error_part(message: str) -> str:
+    """Return a `3:` error part."""
+    return f"3:{json.dumps(message)}\n"
+
+
+def finish_part(reason: str, usage: dict[str, int] | None = None) -> str:
+    """Return a `d:` finish part, with token usage when it is known.
+
+    Args:
+        reason: The finish reason, e.g. "stop" or "error".
+        usage: A dict with "promptTokens" and "completionTokens", if known.
+    """
+    finish: dict[str, Any] = {"finishReason": reason}
+    if usage:
+        finish["usage"] = usage
+    return f"d:{json.dumps(finish, separators=_SEPARATORS)}\n"
+
+
+async def encode_updates(
+    updates: AsyncIterable[tuple[str, Any]],
+    max_chars: int = 512,
+    max_delay: float = 0.03,
+) -> AsyncGenerator[str, None]:
+    """Encode agent updates as AI SDK data stream chunks, coalescing text.
+
+    Text deltas are buffered into one `0:` part, which is flushed once it holds
+    `max_chars` characters or its first delta is `max_delay` seconds old,
+    whichever comes first, and before any data part so order is kept. The
+    first delta of a stream is flushed right away so time to first token is
+    unchanged. With `max_delay=0` every delta is flushed as it arrives.
+
+    Updates are pulled by a separate task into a small queue, so a flush timer
+    can interrupt the wait for the next update without a task per update.
+
+    Args:
+        updates: ("progress", entries) and ("text", delta) updates, see
+            `app.agent_updates()`.
+        max_chars: Buffered characters that trigger a flush.
+        max_delay: Seconds after which buffered text is flushed.
+
+    Yields:
+        Strings of one or more complete data stream parts.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=64)
+
+    async def pump() -> None:
+        try:
+            async for update in updates:
+                await queue.put(update)
+        except Exception as error:
+            await queue.put((_ERROR, error))
+        else:
+            await queue.put(_END)
+
+    def flush_due() -> None:
+        if not queue.full():
+            queue.put_nowait(_FLUSH)
+        # Otherwise the next text delta finds its deadline passed.
+
+    puller = loop.create_task(pump())
+    buffer: list[str] = []
+    size = 0
+    timer: asyncio.TimerHandle | None = None
+    flushed_text = False
+    try:
+        while True:
+            update = await queue.get()
+            if update is _END:
+                break
+            if update is _FLUSH:
+                if buffer:
+                    yield text_part("".join(buffer))
+                    buffer, size, timer = [], 0, None
+                continue
+            kind, value = update
+            if kind is _ERROR:
+                raise value
+            if kind == "text":
+                buffer.append(value)
+                size += len(value)
+                if (
+                    not flushed_text
+                    or size >= max_chars
+                    or max_delay <= 0
+                    or (timer is not None and loop.time() >= timer.when())
+                ):
+                    flushed_text = True
+                    if timer is not None:
+                        timer.cancel()
+                    yield text_part("".join(buffer))
+                    buffer, size, timer = [], 0, None
+                elif timer is None:
+                    timer = loop.call_later(max_delay, flush_due)
+            else:
+                chunk = data_part(value)
+                if buffer:
+                    chunk = text_part("".join(buffer)) + chunk
+                    if timer is not None:
+                        timer.cancel()
+                    buffer, size, timer = [], 0, None
+                yield chunk
+        if buffer:
+            yield text_part("".join(buffer))
+    finally:
+        if timer is not None:
+            timer.cancel()
+        puller.cancel()
@@ -0,0 +1,649 @@
+"""Multi-worker server: a front dispatcher routing conversations to workers.
+
+Sessions, caches and in-flight runs live in the memory of one process, so
+`uvicorn --workers N` would send turns of a conversation to workers that
+never saw it. Instead, the dispatcher starts N uvicorn workers on Unix
+sockets and proxies every request to the worker owning its conversation ID on
+a consistent hash ring. Conversations started without an ID get one from the
+worker that answers them, chosen so it hashes back to that worker.
+
+Usage: python -m src.dispatcher --workers 4 --port 8000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Mapping
+
+import httpx
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from websockets.asyncio.client import ClientConnection, unix_connect
+from websockets.exceptions import ConnectionClosed
+
+from src.channels import allowed_origins_from_env, origin_allowed
+from src.telemetry import telemetry
+from src.workers import HashRing
+
+# Headers that only apply to one connection and must not be forwarded.
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+
+class NoHealthyWorker(Exception):
+    """Raised when no worker is available to take a request."""
+
+
+@dataclass
+class Worker:
+    """One worker process and the client used to reach it."""
+
+    index: int
+    socket_path: str
+    client: httpx.AsyncClient
+    process: subprocess.Popen[bytes] | None = None
+    healthy: bool = False
+    restarts: int = 0
+    requests: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class WorkerPool:
+    """Starts worker processes, checks their health and routes keys to them.
+
+    Workers join the hash ring once `/ready` answers and leave it when a
+    check fails or their process exits; exited workers are restarted. While a
+    worker is out of the ring its conversations go to the next worker on the
+    ring, and they return to it once it is healthy again.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        app: str = "src.app:app",
+        socket_dir: str | None = None,
+        health_interval: float = 2.0,
+        startup_timeout: float = 60.0,
+        workers: list[Worker] | None = None,
+    ) -> None:
+        """Create a pool of `count` workers; `start()` starts them.
+
+        Args:
+            count: How many worker processes to run.
+            app: The ASGI app each worker serves, as passed to uvicorn.
+            socket_dir: Directory for the workers' Unix sockets, by default a
+                fresh temporary one.
+            health_interval: Seconds between health checks of the workers.
+            startup_timeout: Seconds `start()` waits for every worker to
+                become healthy.
+            workers: Workers to use instead of new ones, e.g. in tests.
+        """
+        self.app = app
+        self.health_interval = health_interval
+        self.startup_timeout = startup_timeout
+        self.socket_dir = socket_dir or tempfile.mkdtemp(prefix="gemini-agent-workers-")
+        self.workers = workers or [
+            self._worker(index, os.path.join(self.socket_dir, f"worker-{index}.sock"))
+            for index in range(count)
+        ]
+        self.ring = HashRing()
+        self._round_robin = itertools.count()
+        self._monitor: asyncio.Task[None] | None = None
+
+    @staticmethod
+    def _worker(index: int, socket_path: str) -> Worker:
+        transport = httpx.AsyncHTTPTransport(uds=socket_path)
+        client = httpx.AsyncClient(
+            transport=transport, base_url="http://worker", timeout=None
+        )
+        return Worker(index=index, socket_path=socket_path, client=client)
+
+    def _spawn(self, worker: Worker) -> None:
+        if os.path.exists(worker.socket_path):
+            os.unlink(worker.socket_path)
+        env = {
+            **os.environ,
+            "WORKER_INDEX": str(worker.index),
+            "WORKER_COUNT": str(len(self.workers)),
+        }
+        worker.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", self.app, "--uds", worker.socket_path],
+            env=env,
+        )
+        worker.started_at = time.monotonic()
+
+    async def check(self, worker: Worker) -> bool:
+        """Check a worker, updating the ring and restarting it if it exited."""
+        if worker.process is not None and worker.process.poll() is not None:
+            telemetry.error(
+                "Worker exited, restarting",
+                worker=worker.index,
+                returncode=worker.process.returncode,
+            )
+            worker.restarts += 1
+            self._set_health(worker, False)
+            self._spawn(worker)
+            return False
+        try:
+            response = await worker.client.get("/ready", timeout=2.0)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        self._set_health(worker, healthy)
+        return healthy
+
+    def _set_health(self, worker: Worker, healthy: bool) -> None:
+        if healthy and not worker.healthy:
+            self.ring.add(worker.index)
+            telemetry.info("Worker healthy", worker=worker.index)
+        elif worker.healthy and not healthy:
+            self.ring.remove(worker.index)
+            telemetry.warning("Worker unhealthy", worker=worker.index)
+        worker.healthy = healthy
+
+    async def start(self) -> None:
+        """Start all workers and wait until every one of them is healthy.
+
+        Raises:
+            RuntimeError: If a worker is not healthy within `startup_timeout`.
+        """
+        for worker in self.workers:
+            if worker.process is None:
+                self._spawn(worker)
+        deadline = time.monotonic() + self.startup_timeout
+        while not all(worker.healthy for worker in self.workers):
+            if time.monotonic() > deadline:
+                await self.stop()
+                raise RuntimeError("Workers did not become healthy in time")
+            await asyncio.gather(
+                *(self.check(worker) for worker in self.workers if not worker.healthy)
+            )
+            await asyncio.sleep(0.1)
+        self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def _monitor_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self.check(worker) for worker in self.workers))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop the health checks and shut the workers down gracefully."""
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for worker in self.workers:
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    await asyncio.to_thread(worker.process.wait, timeout)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+            await worker.client.aclose()
+        shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+    def worker_for(self, key: str | None = None) -> Worker:
+        """Return the worker owning conversation `key`, or any healthy worker.
+
+        Raises:
+            NoHealthyWorker: If no worker is healthy.
+        """
+        if key:
+            index = self.ring.node_for(key)
+            if index is not None:
+                return self.workers[index]
+        healthy = [worker for worker in self.workers if worker.healthy]
+        if not healthy:
+            raise NoHealthyWorker("No healthy worker")
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    def stats(self) -> dict[str, Any]:
+        """Return the health, restarts and routed requests of each worker."""
+        return {
+            "workers": [
+                {
+                    "index": worker.index,
+                    "healthy": worker.healthy,
+                    "pid": worker.process.pid if worker.process else None,
+                    "restarts": worker.restarts,
+                    "requests": worker.requests,
+                    "uptime_s": round(time.monotonic() - worker.started_at, 1),
+                }
+                for worker in self.workers
+            ],
+            "healthy": len(self.ring),
+        }
+
+
+def forwarded_headers(headers: Mapping[str, str]) -> dict[str, str]:
+    """Return the end-to-end headers of a request or response."""
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP}
+
+
+def conversation_key(headers: Mapping[str, str], body: object) -> str | None:
+    """Return the conversation ID of a request, like `app.conversation_ids()`."""
+    if isinstance(body, dict):
+        key = body.get("conversation_id") or body.get("id")
+        if key:
+            return str(key)
+    return headers.get("x-conversation-id")
+
+
+async def forward(worker: Worker, request: Request, body: bytes) -> Response:
+    """Proxy a request to a worker, streaming the response back."""
+    worker.requests += 1
+    upstream = await worker.client.send(
+        worker.client.build_request(
+            request.method,
+            request.url.path,
+            params=request.query_params,
+            headers=forwarded_headers(request.headers),
+            content=body,
+        ),
+        stream=True,
+    )
+
+    async def relay() -> AsyncGenerator[bytes, None]:
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            # Closing the upstream connection lets the worker cancel the run.
+            await upstream.aclose()
+
+    return StreamingResponse(
+        relay(),
+        status_code=upstream.status_code,
+        headers={**forwarded_headers(upstream.headers), "X-Worker": str(worker.index)},
+    )
+
+
+async def stream_lines(
+    worker: Worker, request: Request, payload: dict[str, Any]
+) -> AsyncGenerator[dict[str, Any], None]:
+    """Post a JSON body to a worker and yield its NDJSON response lines."""
+    worker.requests += 1
+    async with worker.client.stream(
+        "POST",
+        request.url.path,
+        headers=forwarded_headers(request.headers),
+        json=payload,
+    ) as response:
+        async for line in response.aiter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def dispatch_batch(
+    pool: WorkerPool, request: Request, body: dict[str, Any]
+) -> StreamingResponse | None:
+    """Split a batch by conversation owner and merge the workers' results.
+
+    Returns None when every item goes to the same worker, in which case the
+    batch is forwarded as is.
+    """
+    items = body.get("items", body.get("queries"))
+    if not isinstance(items, list) or not items:
+        return None
+    groups: dict[int, list[tuple[int, object]]] = {}
+    for index, item in enumerate(items):
+        key = conversation_key({}, item)
+        worker = pool.worker_for(key) if key else pool.worker_for(f"batch-item-{index}")
+        groups.setdefault(worker.index, []).append((index, item))
+    if len(groups) == 1:
+        return None
+    started = time.perf_counter()
+
+    async def generate_results() -> AsyncGenerator[str, None]:
+        results: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+        async def run_group(worker: Worker, group: list[tuple[int, object]]) -> None:
+            payload: dict[str, Any] = {"items": [item for _, item in group]}
+            if "concurrency" in body:
+                payload["concurrency"] = body["concurrency"]
+            reported: set[int] = set()
+            failure = "No result from worker"
+            try:
+                async for line in stream_lines(worker, request, payload):
+                    if "index" in line:
+                        line["index"] = group[line["index"]][0]
+                        reported.add(line["index"])
+                        await results.put(line)
+                    elif "error" in line:
+                        failure = line["error"]
+            except httpx.HTTPError as e:
+                failure = f"Worker failed: {e}"
+            for index, _ in group:
+                if index not in reported:
+                    await results.put({"index": index, "error": failure, "status": 502})
+
+        tasks = [
+            asyncio.create_task(run_group(pool.workers[index], group))
+            for index, group in groups.items()
+        ]
+        errors = 0
+        try:
+            for _ in range(len(items)):
+                result = await results.get()
+                errors += "error" in result
+                yield json.dumps(result) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        summary = {
+            "done": True,
+            "items": len(items),
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        yield json.dumps(summary) + "\n"
+
+    return StreamingResponse(
+        generate_results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+class ChannelProxy:
+    """Relay between one client channel and the workers owning its conversations.
+
+    Invoke messages go to the worker owning their `conversation_id` over one
+    WebSocket per worker, opened on first use; cancel messages follow their
+    turn. Messages from the workers are passed to `send`, which applies the
+    client's backpressure all the way back to the workers.
+    """
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        send: Callable[[dict[str, Any]], Awaitable[None]],
+        headers: Mapping[str, str] | None = None,
+    ) -> None:
+        """Create a proxy passing worker messages to `send`.
+
+        Only the `X-User-Id` and `Cache-Control` request `headers` are passed
+        on to the workers.
+        """
+        self.pool = pool
+        self.send = send
+        self.headers = {
+            k: v
+            for k, v in (headers or {}).items()
+            if k.lower() in ("x-user-id", "cache-control")
+        }
+        self._upstreams: dict[int, ClientConnection] = {}
+        self._relays: dict[int, asyncio.Task[None]] = {}
+        self._turns: dict[str, int] = {}
+
+    async def receive(self, message: object) -> None:
+        """Forward a client message to the worker it belongs to."""
+        if isinstance(message, dict) and message.get("type") == "invoke":
+            message.setdefault("request_id", uuid.uuid4().hex)
+            worker = self.pool.worker_for(conversation_key({}, message))
+            self._turns[str(message["request_id"])] = worker.index
+        elif isinstance(message, dict) and message.get("type") == "cancel":
+            index = self._turns.get(str(message.get("request_id")))
+            if index is None:
+                return
+            worker = self.pool.workers[index]
+        else:
+            # Let a worker answer malformed messages.
+            worker = self.pool.worker_for()
+        upstream = await self._upstream(worker)
+        await upstream.send(json.dumps(message))
+
+    async def _upstream(self, worker: Worker) -> ClientConnection:
+        upstream = self._upstreams.get(worker.index)
+        if upstream is None:
+            upstream = await unix_connect(
+                worker.socket_path, "ws://worker/ws", additional_headers=self.headers
+            )
+            worker.requests += 1
+            self._upstreams[worker.index] = upstream
+            self._relays[worker.index] = asyncio.create_task(
+                self._relay(worker.index, upstream)
+            )
+        return upstream
+
+    async def _relay(self, index: int, upstream: ClientConnection) -> None:
+        try:
+            async for raw in upstream:
+                message = json.loads(raw)
+                if message.get("type") in ("done", "error"):
+                    self._turns.pop(str(message.get("request_id")), None)
+                await self.send(message)
+        except ConnectionClosed:
+            pass
+        self._upstreams.pop(index, None)
+        # Turns still running on a worker that went away end with an error.
+        for request_id, owner in list(self._turns.items()):
+            if owner == index:
+                del self._turns[request_id]
+                await self.send(
+                    {
+                        "type": "error",
+                        "request_id": request_id,
+                        "error": "Worker stopped",
+                        "status": 502,
+                    }
+                )
+
+    async def close(self) -> None:
+        """Close the worker connections, cancelling their turns."""
+        for relay in self._relays.values():
+            relay.cancel()
+        for upstream in list(self._upstreams.values()):
+            await upstream.close()
+        self._upstreams.clear()
+
+
+def create_app(pool: WorkerPool) -> FastAPI:
+    """Return the dispatcher app for a worker pool."""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        await pool.start()
+        telemetry.info("Dispatcher ready", workers=len(pool.workers))
+        yield
+        await pool.stop()
+        telemetry.flush()
+
+    app = FastAPI(lifespan=lifespan)
+    allowed_origins = allowed_origins_from_env()
+    # Open SSE channels by ID, with the token their client must present.
+    channels: dict[str, tuple[ChannelProxy, asyncio.Queue[dict[str, Any]], str]] = {}
+
+    def channel_token_matches(channel_id: str, token: str | None) -> bool:
+        return token is not None and secrets.compare_digest(
+            channels[channel_id][2], token
+        )
+
+    @app.get("/health")
+    async def health() -> Response:
+        """Answer 200 while at least one worker is healthy."""
+        stats = pool.stats()
+        stats["status"] = "ok" if stats["healthy"] else "unavailable"
+        return Response(
+            content=json.dumps(stats),
+            media_type="application/json",
+            status_code=200 if stats["healthy"] else 503,
+        )
+
+    @app.get("/workers/stats")
+    async def worker_stats() -> dict[str, Any]:
+        """Return the health, restarts and routed requests of each worker."""
+        return pool.stats()
+
+    @app.websocket("/ws")
+    async def proxy_websocket(websocket: WebSocket) -> None:
+        """Relay a multiplexed WebSocket to the workers, see `ChannelProxy`."""
+        origin = websocket.headers.get("origin")
+        if not origin_allowed(origin, websocket.headers.get("host"), allowed_origins):
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        proxy = ChannelProxy(pool, websocket.send_json, websocket.headers)
+        try:
+            while True:
+                try:
+                    message = await websocket.receive_json()
+                except ValueError:
+                    message = None
+                await proxy.receive(message)
+        except (WebSocketDisconnect, NoHealthyWorker):
+            pass
+        finally:
+            await proxy.close()
+
+    @app.get("/channels/{channel_id}/events")
+    async def channel_events(
+        request: Request, channel_id: str, token: str | None = None
+    ) -> Response:
+        """Server-sent events fallback, relayed like the WebSocket.
+
+        Channels are bound to the client that opened them, as on the workers.
+        """
+        if channel_id in channels:
+            if token is None or not channel_token_matches(channel_id, token):
+                return Response(
+                    content=json.dumps(
+                        {"error": f"Channel is open by another client: {channel_id}"}
+                    ),
+                    media_type="application/json",
+                    status_code=403,
+                )
+            await channels[channel_id][0].close()
+        else:
+            token = secrets.token_urlsafe(16)
+        outgoing: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=64)
+        proxy = ChannelProxy(pool, outgoing.put, request.headers)
+        channels[channel_id] = (proxy, outgoing, token)
+
+        async def generate_events() -> AsyncGenerator[str, None]:
+            try:
+                yield ": connected\n\n"
+                opened = {"type": "open", "channel_id": channel_id, "token": token}
+                yield f"data: {json.dumps(opened)}\n\n"
+                while True:
+                    yield f"data: {json.dumps(await outgoing.get())}\n\n"
+            finally:
+                if channels.get(channel_id, (None,))[0] is proxy:
+                    del channels[channel_id]
+                await proxy.close()
+
+        return StreamingResponse(
+            generate_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/channels/{channel_id}")
+    async def channel_message(request: Request, channel_id: str) -> Response:
+        """Send an invoke or cancel message to an open SSE channel."""
+        if channel_id not in channels:
+            return Response(
+                content=json.dumps({"error": f"No open channel: {channel_id}"}),
+                media_type="application/json",
+                status_code=404,
+            )
+        if not channel_token_matches(
+            channel_id, request.headers.get("x-channel-token")
+        ):
+            return Response(
+                content=json.dumps({"error": "Invalid channel token"}),
+                media_type="application/json",
+                status_code=403,
+            )
+        await channels[channel_id][0].receive(await request.json())
+        return Response(status_code=202)
+
+    @app.api_route(
+        "/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+    )
+    async def proxy_request(request: Request, path: str) -> Response:
+        """Forward any other request to the worker owning its conversation.
+
+        An `X-Worker` request header pins a request to one worker, e.g. to
+        read its /metrics.
+        """
+        body = await request.body()
+        try:
+            pinned = request.headers.get("x-worker")
+            if (
+                pinned is not None
+                and pinned.isdigit()
+                and int(pinned) < len(pool.workers)
+            ):
+                worker = pool.workers[int(pinned)]
+            else:
+                parsed = None
+                if body and "json" in request.headers.get("content-type", ""):
+                    try:
+                        parsed = json.loads(body)
+                    except ValueError:
+                        parsed = None
+                if path == "invoke/batch" and isinstance(parsed, dict):
+                    split = dispatch_batch(pool, request, parsed)
+                    if split is not None:
+                        return split
+                worker = pool.worker_for(conversation_key(request.headers, parsed))
+            return await forward(worker, request, body)
+        except (NoHealthyWorker, httpx.HTTPError) as e:
+            telemetry.error("Dispatch failed", path=path, error=str(e))
+            return Response(
+                content=json.dumps({"error": f"No worker available: {e}"}),
+                media_type="application/json",
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+
+    return app
+
+
+def main() -> None:
+    """Run the dispatcher and its workers until interrupted."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WORKERS", str(os.cpu_count() or 1))),
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--app", default="src.app:app")
+    parser.add_argument(
+        "--health-interval",
+        type=float,
+        default=float(os.getenv("WORKER_HEALTH_INTERVAL", "2")),
+    )
+    args = parser.parse_args()
+    pool = WorkerPool(args.workers, app=args.app, health_interval=args.health_interval)
+    uvicorn.run(create_app(pool), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
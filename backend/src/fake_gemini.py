@@ -0,0 +1,223 @@
+"""Local stand-in for Gemini, for load tests and tests without an API key."""
+
+import asyncio
+import math
+import random
+from typing import AsyncGenerator
+
+import httpx
+from google.adk.models.cache_metadata import CacheMetadata
+from google.adk.models.gemini_context_cache_manager import GeminiContextCacheManager
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from google.genai.errors import ClientError
+from pydantic import PrivateAttr
+from typing_extensions import override
+
+from src.admission import AdmittedGemini
+from src.prompt_cache import LocalCaches, estimate_tokens
+
+# Stand-in for the Gemini cached contents API, shared by all fake models.
+local_caches = LocalCaches()
+
+_WORDS = (
+    "horses gallop across open fields while riders keep a steady pace and the "
+    "weather stays calm enough for a long ride through the hills"
+).split()
+
+
+def _function_names(llm_request: LlmRequest) -> list[str]:
+    names = []
+    for tool in (llm_request.config.tools if llm_request.config else None) or []:
+        for declaration in getattr(tool, "function_declarations", None) or []:
+            names.append(declaration.name)
+    return names
+
+
+def _has_google_search(llm_request: LlmRequest) -> bool:
+    tools = (llm_request.config.tools if llm_request.config else None) or []
+    return any(getattr(tool, "google_search", None) is not None for tool in tools)
+
+
+def _last_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents):
+        for part in content.parts or []:
+            if part.text:
+                return part.text
+    return ""
+
+
+class FakeGemini(AdmittedGemini):
+    """Local stand-in for Gemini with configurable latency, speed and failures.
+
+    It makes no network calls but goes through the same rate limiting and
+    retry path as `AdmittedGemini`, so load tests exercise the real server.
+
+    Each call waits a log-normally distributed time to first token (median
+    `latency_ms`, spread `latency_sigma`), then streams `answer_tokens` words at
+    `tokens_per_second`. When the request declares function tools and the
+    last turn is not a tool result, it calls one of them with probability
+    `tool_call_rate` (preferring a tool named after a word in the query);
+    requests with google_search get grounding metadata. A share of calls fail
+    with an injected 429 (`error_rate`) or hang for `timeout_seconds` and then
+    time out (`timeout_rate`).
+    """
+
+    model: str = "fake-gemini"
+    latency_ms: float = 300.0
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 40
+    tool_call_rate: float = 1.0
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 30.0
+    retry_delay_seconds: float = 1.0
+    seed: int | None = None
+
+    _random: random.Random | None = PrivateAttr(default=None)
+
+    @property
+    def _rng(self) -> random.Random:
+        if self._random is None:
+            self._random = random.Random(self.seed)
+        return self._random
+
+    def _latency(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        median = self.latency_ms / 1000
+        return median * math.exp(self._rng.gauss(0, self.latency_sigma))
+
+    async def _fail_if_injected(self) -> None:
+        roll = self._rng.random()
+        if roll < self.error_rate:
+            raise ClientError(
+                429,
+                {
+                    "error": {
+                        "code": 429,
+                        "message": "Resource exhausted (injected by FakeGemini)",
+                        "status": "RESOURCE_EXHAUSTED",
+                        "details": [
+                            {
+                                "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                "retryDelay": f"{self.retry_delay_seconds}s",
+                            }
+                        ],
+                    }
+                },
+            )
+        if roll < self.error_rate + self.timeout_rate:
+            await asyncio.sleep(self.timeout_seconds)
+            raise httpx.ReadTimeout("Model call timed out (injected by FakeGemini)")
+
+    def _tool_call(self, llm_request: LlmRequest) -> types.FunctionCall | None:
+        last = llm_request.contents[-1] if llm_request.contents else None
+        if last is not None and any(p.function_response for p in last.parts or []):
+            return None
+        names = _function_names(llm_request)
+        if not names or self._rng.random() >= self.tool_call_rate:
+            return None
+        words = _last_text(llm_request).lower()
+        name = next(
+            (
+                n
+                for n in names
+                if any(len(piece) > 3 and piece in words for piece in n.split("_"))
+            ),
+            names[0],
+        )
+        return types.FunctionCall(name=name, args={})
+
+    def _usage(
+        self, llm_request: LlmRequest, output_tokens: int, cached_tokens: int = 0
+    ) -> types.GenerateContentResponseUsageMetadata:
+        config = llm_request.config
+        prompt_tokens = cached_tokens + estimate_tokens(
+            config.system_instruction if config else None,
+            config.tools if config else None,
+            llm_request.contents,
+        )
+        return types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            cached_content_token_count=cached_tokens or None,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+    async def _use_prompt_cache(
+        self, llm_request: LlmRequest
+    ) -> tuple[CacheMetadata | None, int]:
+        """Apply ADK context caching with `local_caches`, as `Gemini` does.
+
+        Returns:
+            The cache metadata for the response and the cached tokens.
+        """
+        if not llm_request.cache_config:
+            return None, 0
+        manager = GeminiContextCacheManager(local_caches.client)
+        metadata = await manager.handle_context_caching(llm_request)
+        name = llm_request.config.cached_content if llm_request.config else None
+        if not name:
+            return metadata, 0
+        cached, _ = local_caches.contents(name)
+        usage = cached.usage_metadata
+        return metadata, (usage.total_token_count or 0) if usage else 0
+
+    @override
+    async def _call_model(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self._latency())
+        await self._fail_if_injected()
+
+        # Decided before caching moves the tools into the cached prefix.
+        call = self._tool_call(llm_request)
+        grounded = _has_google_search(llm_request)
+        cache_metadata, cached_tokens = await self._use_prompt_cache(llm_request)
+        if call is not None:
+            yield LlmResponse(
+                content=types.Content(
+                    role="model", parts=[types.Part(function_call=call)]
+                ),
+                usage_metadata=self._usage(llm_request, 5, cached_tokens),
+                cache_metadata=cache_metadata,
+            )
+            return
+
+        words = [self._rng.choice(_WORDS) for _ in range(max(1, self.answer_tokens))]
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        if stream:
+            for word in words:
+                await asyncio.sleep(delay)
+                yield LlmResponse(
+                    content=types.Content(
+                        role="model", parts=[types.Part(text=word + " ")]
+                    ),
+                    partial=True,
+                )
+        else:
+            await asyncio.sleep(delay * len(words))
+        grounding = None
+        if grounded:
+            grounding = types.GroundingMetadata(
+                web_search_queries=[_last_text(llm_request)[:100]],
+                grounding_chunks=[
+                    types.GroundingChunk(
+                        web=types.GroundingChunkWeb(
+                            uri="https://example.com/fake", title="Fake result"
+                        )
+                    )
+                ],
+            )
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text=" ".join(words) + " ")]
+            ),
+            grounding_metadata=grounding,
+            usage_metadata=self._usage(llm_request, len(words), cached_tokens),
+            cache_metadata=cache_metadata,
+            turn_complete=True,
+        )
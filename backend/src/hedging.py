@@ -0,0 +1,213 @@
+"""Hedged agent runs: start a second run when the first is slow to respond."""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Callable
+
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+
+from src.cascade import run_on_copy
+from src.metrics import registry
+from src.telemetry import telemetry
+
+HEDGES = registry.counter(
+    "agent_hedges_total",
+    "Hedged agent runs, by whether the hedge answered first, lost, or was not "
+    "started because the hedge budget was spent.",
+    ("route", "outcome"),
+)
+
+_DONE = object()
+
+
+def hedge_routes_from_env() -> set[str]:
+    """Return the routes named in HEDGE_ROUTES, e.g. "search"."""
+    names = os.getenv("HEDGE_ROUTES", "")
+    return {name.strip() for name in names.split(",") if name.strip()}
+
+
+class HedgeBudget:
+    """Caps hedges at a share of all hedgeable runs, shared by every route.
+
+    Each run adds `share` of a token, up to `burst` tokens, and each hedge
+    takes a whole token, so hedges stay below `share` of runs over time while
+    a few can start back to back after a quiet period.
+    """
+
+    def __init__(self, share: float = 0.05, burst: float = 10.0) -> None:
+        """Create a full budget of `burst` tokens, refilled by `share` per run."""
+        self.share = share
+        self.burst = burst
+        self._tokens = burst
+        self.runs = 0
+        self.hedges = 0
+        self.denied = 0
+
+    def add_run(self) -> None:
+        """Count a hedgeable run and add `share` of a token, up to `burst`."""
+        self.runs += 1
+        self._tokens = min(self.burst, self._tokens + self.share)
+
+    def try_hedge(self) -> bool:
+        """Take a token for a hedge, returning False when none is left."""
+        if self._tokens < 1:
+            self.denied += 1
+            return False
+        self._tokens -= 1
+        self.hedges += 1
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        """Return the share, runs, hedges started and denied, and the hedge rate."""
+        return {
+            "share": self.share,
+            "runs": self.runs,
+            "hedges": self.hedges,
+            "denied": self.denied,
+            "hedge_rate": self.hedges / self.runs if self.runs else 0.0,
+        }
+
+
+class Hedger:
+    """Starts a second, identical agent run when the first is slow to respond.
+
+    The hedge starts once the first run has produced no event for the
+    `percentile` of recent times to first event (or `initial_delay` until
+    `min_samples` are known), if `budget` allows. Both runs use
+    `run_on_copy`, so neither touches the real session. The first run to
+    produce an event is streamed to the caller and the other is cancelled.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        budget: HedgeBudget,
+        percentile: float = 0.95,
+        initial_delay: float = 1.0,
+        min_delay: float = 0.05,
+        min_samples: int = 20,
+        window: int = 512,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Create a hedger for the runs of one route.
+
+        Args:
+            route: Name of the route, used in metrics and logs.
+            budget: Budget shared by all routes that hedges are taken from.
+            percentile: Percentile of recent times to first event to wait for.
+            initial_delay: Seconds to wait until `min_samples` times are known.
+            min_delay: Fewest seconds to wait before hedging.
+            min_samples: Times to first event needed to use `percentile`.
+            window: Recent times to first event kept.
+            clock: Returns the current time in seconds.
+        """
+        self.route = route
+        self.budget = budget
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._clock = clock
+        self._first_event_times: deque[float] = deque(maxlen=window)
+        self.runs = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> float:
+        """Return how long the first run may go without an event before hedging."""
+        if len(self._first_event_times) < self.min_samples:
+            return self.initial_delay
+        times = sorted(self._first_event_times)
+        index = min(len(times) - 1, int(self.percentile * len(times)))
+        return max(self.min_delay, times[index])
+
+    async def _pump(
+        self,
+        number: int,
+        agent: BaseAgent,
+        context: InvocationContext,
+        queue: asyncio.Queue[tuple[int, Any]],
+    ) -> None:
+        try:
+            async for event in run_on_copy(agent, context):
+                await queue.put((number, event))
+            await queue.put((number, _DONE))
+        except Exception as error:
+            await queue.put((number, error))
+
+    async def run(
+        self, agent: BaseAgent, context: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Yield the events of whichever run of `agent` responds first."""
+        self.runs += 1
+        self.budget.add_run()
+        started = self._clock()
+        queue: asyncio.Queue[tuple[int, Any]] = asyncio.Queue()
+        runs = [asyncio.create_task(self._pump(0, agent, context, queue))]
+        failed: set[int] = set()
+        winner: int | None = None
+        try:
+            try:
+                first = await asyncio.wait_for(queue.get(), self.delay())
+            except TimeoutError:
+                first = None
+                if self.budget.try_hedge():
+                    self.hedges += 1
+                    telemetry.debug("Hedging agent run", route=self.route)
+                    runs.append(
+                        asyncio.create_task(self._pump(1, agent, context, queue))
+                    )
+                else:
+                    HEDGES.inc(labels=(self.route, "denied"))
+            while True:
+                number, item = first if first is not None else await queue.get()
+                first = None
+                if isinstance(item, Exception):
+                    # Wait for the other run unless this was the last one.
+                    failed.add(number)
+                    if len(failed) < len(runs):
+                        continue
+                    raise item
+                winner = number
+                break
+
+            self._first_event_times.append(self._clock() - started)
+            if len(runs) > 1:
+                HEDGES.inc(labels=(self.route, "won" if winner == 1 else "lost"))
+                if winner == 1:
+                    self.hedge_wins += 1
+            for number, task in enumerate(runs):
+                if number != winner:
+                    task.cancel()
+            while item is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                number, item = await queue.get()
+                while number != winner:
+                    number, item = await queue.get()
+        finally:
+            for task in runs:
+                task.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        """Return runs, hedges, hedges that answered first and the current delay."""
+        return {
+            "runs": self.runs,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "delay_ms": round(self.delay() * 1000, 3),
+        }
+
+
+hedge_budget = HedgeBudget(
+    share=float(os.getenv("HEDGE_BUDGET", "0.05")),
+    burst=float(os.getenv("HEDGE_BUDGET_BURST", "10")),
+)
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("HEDGE_INITIAL_DELAY_SECONDS", "1.0"))
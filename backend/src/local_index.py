@@ -0,0 +1,520 @@
+"""BM25 index of local documents, searched before falling back to web search."""
+
+import asyncio
+import bisect
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from src.telemetry import telemetry
+
+Postings = dict[str, tuple[list[int], list[int]]]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i in is it "
+    "me my of on or so than that the their then there these they this to was "
+    "we what when where which who why will with you your".split()
+)
+MANIFEST = "manifest.json"
+# Terms in more documents than this get a champion list, see LocalIndex.search.
+CHAMPIONS = 512
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase alphanumeric terms, without stopwords."""
+    return [term for term in _TOKEN.findall(text.lower()) if term not in STOPWORDS]
+
+
+@dataclass(frozen=True)
+class Hit:
+    """A document matching a query.
+
+    Attributes:
+        path: Path of the document, relative to the documents directory.
+        score: BM25 score.
+        match: `score` relative to that of an average-length document
+            containing each query term once, capped at 1; compared with
+            LOCAL_SEARCH_MIN_MATCH to decide whether to fall back to web search.
+        snippet: Text around the first query term in the document.
+    """
+
+    path: str
+    score: float
+    match: float
+    snippet: str
+
+
+class Segment:
+    """An immutable part of the index, stored in its own directory.
+
+    `segment.json` lists the documents (path and length in terms) and maps each
+    term to [offset, df, champions] of its postings in `postings.bin`: `df`
+    document numbers followed by their `df` term frequencies, then, for terms
+    in more than `CHAMPIONS` documents, the `champions` document numbers with
+    the highest BM25 impact for the term, all uint32. The postings are
+    memory-mapped, so only the pages of queried terms are read.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the segment stored in directory `path`."""
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "segment.json")) as f:
+            meta = json.load(f)
+        self.docs: list[str] = [doc for doc, _ in meta["docs"]]
+        self.lengths = array("I", (length for _, length in meta["docs"]))
+        self.terms: dict[str, list[int]] = meta["terms"]
+        self._postings = memoryview(b"").cast("I")
+        postings_path = os.path.join(path, "postings.bin")
+        if os.path.getsize(postings_path):
+            with open(postings_path, "rb") as f:
+                # The mapping stays valid after the file is closed or deleted.
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._postings = memoryview(mapped).cast("I")
+
+    def postings(self, term: str) -> tuple[memoryview, memoryview] | None:
+        """Return the document numbers and term frequencies of a term."""
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        offset, df, _ = entry
+        postings = self._postings
+        return postings[offset : offset + df], postings[offset + df : offset + 2 * df]
+
+    def champions(self, term: str) -> memoryview | None:
+        """Return the term's champion document numbers, if it has a list."""
+        entry = self.terms.get(term)
+        if entry is None or not entry[2]:
+            return None
+        offset, df, count = entry
+        return self._postings[offset + 2 * df : offset + 2 * df + count]
+
+    @staticmethod
+    def write(path: str, docs: list[tuple[str, int]], postings: Postings) -> "Segment":
+        """Write a segment and return it.
+
+        Args:
+            path: Directory to create; it is written under a temporary name
+                and renamed, so a crash never leaves a partial segment.
+            docs: (path, length) of each document, by document number.
+            postings: Maps each term to its (document numbers, frequencies)
+                lists, with document numbers in increasing order.
+        """
+        partial = path + ".partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        lengths = [length for _, length in docs]
+        average = sum(lengths) / len(lengths) if lengths else 1.0
+        terms: dict[str, list[int]] = {}
+        offset = 0
+        with open(os.path.join(partial, "postings.bin"), "wb") as f:
+            for term, (numbers, frequencies) in postings.items():
+                champions: list[int] = []
+                if len(numbers) > CHAMPIONS:
+                    # Ranked by the BM25 term weight with k1=1.2, b=0.75.
+                    impacts = (
+                        (
+                            frequency
+                            / (frequency + 1.2 * (0.25 + 0.75 * lengths[n] / average)),
+                            n,
+                        )
+                        for n, frequency in zip(numbers, frequencies)
+                    )
+                    champions = sorted(n for _, n in heapq.nlargest(CHAMPIONS, impacts))
+                terms[term] = [offset, len(numbers), len(champions)]
+                f.write(array("I", numbers).tobytes())
+                f.write(array("I", frequencies).tobytes())
+                f.write(array("I", champions).tobytes())
+                offset += 2 * len(numbers) + len(champions)
+        with open(os.path.join(partial, "segment.json"), "w") as f:
+            # json.dumps uses the C encoder, json.dump does not.
+            f.write(json.dumps({"docs": docs, "terms": terms}, separators=(",", ":")))
+        os.replace(partial, path)
+        return Segment(path)
+
+
+class _View:
+    """The segments, deletions and BM25 statistics one search works on."""
+
+    def __init__(
+        self,
+        segments: list[Segment],
+        deleted: dict[str, set[int]],
+        k1: float,
+        b: float,
+    ) -> None:
+        """Create a view of `segments` without the `deleted` document numbers."""
+        self.segments = segments
+        self.deleted = {name: frozenset(numbers) for name, numbers in deleted.items()}
+        self.count = 0
+        total_length = 0
+        for segment in segments:
+            gone = self.deleted.get(segment.name, frozenset())
+            self.count += len(segment.docs) - len(gone)
+            total_length += sum(segment.lengths) - sum(segment.lengths[n] for n in gone)
+        average = total_length / self.count if self.count else 1.0
+        # Per-document BM25 length normalization, k1 * (1 - b + b * dl / avgdl).
+        self.norms = [
+            array(
+                "d", (k1 * (1 - b + b * length / average) for length in segment.lengths)
+            )
+            for segment in segments
+        ]
+
+
+class LocalIndex:
+    """BM25 index of the text documents in a directory, kept on disk.
+
+    `refresh()` brings the index up to date with the directory: documents
+    that changed or disappeared are marked deleted in their segment, and new
+    or changed ones are written to a new segment, so a refresh only reads the
+    files that changed. Once there are more than `max_segments` segments they
+    are merged into one, dropping deleted documents. The manifest tying
+    segments, deletions and file versions together is replaced atomically.
+
+    Searches run against an immutable view of the segments, so they can run
+    while another thread refreshes the index.
+    """
+
+    def __init__(
+        self,
+        docs_dir: str,
+        index_dir: str,
+        extensions: tuple[str, ...] = (".txt", ".md"),
+        max_segments: int = 8,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        """Create an index of `docs_dir` stored in `index_dir`; nothing is read yet.
+
+        Args:
+            docs_dir: Directory of the documents to index.
+            index_dir: Directory the segments and manifest are written to.
+            extensions: Suffixes of the files indexed.
+            max_segments: Segments kept before they are merged into one.
+            k1: BM25 term frequency saturation.
+            b: BM25 length normalization.
+        """
+        self.docs_dir = os.path.abspath(docs_dir)
+        self.index_dir = os.path.abspath(index_dir)
+        self.extensions = extensions
+        self.max_segments = max_segments
+        self.k1 = k1
+        self.b = b
+        self.refreshed_at: float | None = None
+        self.searches = 0
+        self._refresh_lock = threading.Lock()
+        self._manifest: dict[str, Any] | None = None
+        self._view: _View | None = None
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.index_dir, "segments", name)
+
+    def load(self) -> None:
+        """Open the index saved on disk, if there is one."""
+        path = os.path.join(self.index_dir, MANIFEST)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            manifest = json.load(f)
+        segments = [Segment(self._segment_path(name)) for name in manifest["segments"]]
+        self._swap(manifest, segments)
+
+    def _swap(self, manifest: dict[str, Any], segments: list[Segment]) -> None:
+        deleted = {name: set(numbers) for name, numbers in manifest["deleted"].items()}
+        self._view = _View(segments, deleted, self.k1, self.b)
+        self._manifest = manifest
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        """Return the (mtime_ns, size) of every document under docs_dir."""
+        found: dict[str, tuple[int, int]] = {}
+        prefix = len(self.docs_dir) + 1
+        pending = [self.docs_dir]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path != self.index_dir:
+                            pending.append(entry.path)
+                    elif entry.name.endswith(self.extensions):
+                        stat = entry.stat()
+                        found[entry.path[prefix:]] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def _read(self, path: str) -> str:
+        with open(
+            os.path.join(self.docs_dir, path), encoding="utf-8", errors="replace"
+        ) as f:
+            return f.read()
+
+    def refresh(self) -> dict[str, Any]:
+        """Index new and changed documents and drop removed ones.
+
+        Blocking; run it in a thread from async code.
+
+        Returns:
+            Counts of added, updated and removed documents, the number of
+            segments and the seconds taken.
+        """
+        with self._refresh_lock:
+            started = time.perf_counter()
+            if self._manifest is None:
+                self.load()
+            manifest = self._manifest or {
+                "segments": [],
+                "deleted": {},
+                "files": {},
+                "next": 0,
+            }
+            manifest = json.loads(json.dumps(manifest))  # edited copy
+            segments = list(self._view.segments) if self._view else []
+            files = manifest["files"]
+            found = self._scan()
+
+            changed = [
+                path
+                for path, version in found.items()
+                if path not in files or files[path][:2] != list(version)
+            ]
+            removed = [path for path in files if path not in found]
+            added = sum(1 for path in changed if path not in files)
+            for path in changed + removed:
+                if path in files:
+                    _, _, segment, number = files.pop(path)
+                    manifest["deleted"].setdefault(segment, []).append(number)
+
+            if changed:
+                name = f"seg-{manifest['next']:06d}"
+                manifest["next"] += 1
+                docs: list[tuple[str, int]] = []
+                postings: Postings = defaultdict(lambda: ([], []))
+                for number, path in enumerate(sorted(changed)):
+                    terms = tokenize(self._read(path))
+                    docs.append((path, len(terms)))
+                    for term, frequency in Counter(terms).items():
+                        numbers, frequencies = postings[term]
+                        numbers.append(number)
+                        frequencies.append(frequency)
+                    files[path] = [*found[path], name, number]
+                segments.append(Segment.write(self._segment_path(name), docs, postings))
+                manifest["segments"].append(name)
+
+            merged = False
+            if len(segments) > self.max_segments:
+                segments = [self._merge(manifest, segments)]
+                merged = True
+
+            if changed or removed:
+                os.makedirs(self.index_dir, exist_ok=True)
+                partial = os.path.join(self.index_dir, MANIFEST + ".partial")
+                with open(partial, "w") as f:
+                    f.write(json.dumps(manifest, separators=(",", ":")))
+                os.replace(partial, os.path.join(self.index_dir, MANIFEST))
+                self._swap(manifest, segments)
+            elif self._view is None:
+                self._swap(manifest, segments)
+            if merged:
+                self._remove_unused(manifest)
+            self.refreshed_at = time.time()
+            return {
+                "added": added,
+                "updated": len(changed) - added,
+                "removed": len(removed),
+                "segments": len(segments),
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+
+    def _merge(self, manifest: dict[str, Any], segments: list[Segment]) -> Segment:
+        """Merge all segments into a new one without the deleted documents."""
+        name = f"seg-{manifest['next']:06d}"
+        manifest["next"] += 1
+        docs: list[tuple[str, int]] = []
+        renumber: dict[tuple[str, int], int] = {}
+        for segment in segments:
+            gone = set(manifest["deleted"].get(segment.name, ()))
+            for number, path in enumerate(segment.docs):
+                if number not in gone:
+                    renumber[segment.name, number] = len(docs)
+                    docs.append((path, segment.lengths[number]))
+        postings: Postings = defaultdict(lambda: ([], []))
+        for segment in segments:
+            for term in segment.terms:
+                numbers, frequencies = postings[term]
+                found = segment.postings(term)
+                assert found is not None
+                for number, frequency in zip(*found):
+                    new_number = renumber.get((segment.name, number))
+                    if new_number is not None:
+                        numbers.append(new_number)
+                        frequencies.append(frequency)
+        kept = {term: lists for term, lists in postings.items() if lists[0]}
+        merged = Segment.write(self._segment_path(name), docs, kept)
+        for number, (path, _) in enumerate(docs):
+            manifest["files"][path][2:] = [name, number]
+        manifest["segments"] = [name]
+        manifest["deleted"] = {}
+        return merged
+
+    def _remove_unused(self, manifest: dict[str, Any]) -> None:
+        # Open views keep their mappings of removed segments until dropped.
+        segments_dir = os.path.join(self.index_dir, "segments")
+        for name in os.listdir(segments_dir):
+            if name not in manifest["segments"]:
+                shutil.rmtree(os.path.join(segments_dir, name), ignore_errors=True)
+
+    def search(self, query: str, k: int = 5) -> list[Hit]:
+        """Return the `k` best matching documents for a query, best first.
+
+        Postings of rare terms are scanned in full. Terms in more than
+        `CHAMPIONS` documents of a segment only contribute the documents on
+        their champion list as candidates, and are then scored for every
+        candidate by looking it up in their sorted postings. Scores are exact
+        BM25; a document only matching frequent terms is missed if it is on
+        none of their champion lists, which bounds the work per query.
+        """
+        view = self._view
+        terms = set(tokenize(query))
+        if view is None or not view.count or not terms:
+            return []
+        self.searches += 1
+        weights: list[tuple[float, str]] = []
+        reference = 0.0
+        for term in terms:
+            df = sum(
+                segment.terms[term][1]
+                for segment in view.segments
+                if term in segment.terms
+            )
+            idf = math.log(1 + (view.count - df + 0.5) / (df + 0.5))
+            # With tf = 1 in an average-length document, a term contributes its
+            # idf. Terms no document contains count towards that reference
+            # score too, so queries about unknown things match poorly.
+            reference += idf
+            if df:
+                weights.append((idf * (self.k1 + 1), term))
+
+        scores: list[dict[int, float]] = [{} for _ in view.segments]
+        for index, segment in enumerate(view.segments):
+            norms, found = view.norms[index], scores[index]
+            frequent: list[tuple[float, tuple[memoryview, memoryview]]] = []
+            for weight, term in weights:
+                postings = segment.postings(term)
+                if postings is None:
+                    continue
+                champions = segment.champions(term)
+                if champions is not None:
+                    frequent.append((weight, postings))
+                    for number in champions:
+                        found.setdefault(number, 0.0)
+                    continue
+                for number, frequency in zip(*postings):
+                    found[number] = found.get(number, 0.0) + weight * frequency / (
+                        frequency + norms[number]
+                    )
+            for weight, (numbers, frequencies) in frequent:
+                for number, score in found.items():
+                    position = bisect.bisect_left(numbers, number)
+                    if position < len(numbers) and numbers[position] == number:
+                        frequency = frequencies[position]
+                        found[number] = score + weight * frequency / (
+                            frequency + norms[number]
+                        )
+
+        deleted = [
+            view.deleted.get(segment.name, frozenset()) for segment in view.segments
+        ]
+        hits: list[Hit] = []
+        for score, index, number in heapq.nlargest(k, self._live(scores, deleted)):
+            path = view.segments[index].docs[number]
+            match = min(1.0, score / reference)
+            hits.append(
+                Hit(path, round(score, 4), round(match, 4), self._snippet(path, terms))
+            )
+        return hits
+
+    @staticmethod
+    def _live(
+        scores: list[dict[int, float]], deleted: list[frozenset[int]]
+    ) -> Iterator[tuple[float, int, int]]:
+        """Yield (score, segment index, document number) of undeleted documents."""
+        for index, found in enumerate(scores):
+            gone = deleted[index]
+            for number, score in found.items():
+                if number not in gone:
+                    yield score, index, number
+
+    def _snippet(self, path: str, terms: set[str], chars: int = 300) -> str:
+        try:
+            text = self._read(path)
+        except OSError:
+            return ""
+        lowered = text.lower()
+        positions = [
+            position for term in terms if (position := lowered.find(term)) >= 0
+        ]
+        start = max(0, min(positions, default=0) - chars // 3)
+        return " ".join(text[start : start + chars].split())
+
+    def stats(self) -> dict[str, Any]:
+        """Return document, term and segment counts and the last refresh time."""
+        view = self._view
+        return {
+            "documents": view.count if view else 0,
+            "segments": len(view.segments) if view else 0,
+            "deleted": sum(len(numbers) for numbers in view.deleted.values())
+            if view
+            else 0,
+            "terms": sum(len(segment.terms) for segment in view.segments)
+            if view
+            else 0,
+            "searches": self.searches,
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+async def keep_fresh(index: LocalIndex, interval: float) -> None:
+    """Refresh `index` in a thread every `interval` seconds, until cancelled."""
+    while True:
+        try:
+            result = await asyncio.to_thread(index.refresh)
+            if result["added"] or result["updated"] or result["removed"]:
+                telemetry.info("Local index refreshed", **result)
+        except Exception as e:
+            telemetry.error("Local index refresh failed", error=repr(e))
+        await asyncio.sleep(interval)
+
+
+def local_index_from_env() -> LocalIndex | None:
+    """Return the index of LOCAL_INDEX_DOCS, or None if it is unset."""
+    docs_dir = os.getenv("LOCAL_INDEX_DOCS")
+    if not docs_dir:
+        return None
+    # Opened by the first refresh, which keeps it out of import time.
+    return LocalIndex(docs_dir, os.getenv("LOCAL_INDEX_DIR", "local-index"))
+
+
+local_index = local_index_from_env()
+LOCAL_INDEX_REFRESH_SECONDS = float(os.getenv("LOCAL_INDEX_REFRESH_SECONDS", "30"))
+LOCAL_SEARCH_MIN_MATCH = float(os.getenv("LOCAL_SEARCH_MIN_MATCH", "0.3"))
+LOCAL_SEARCH_RESULTS = int(os.getenv("LOCAL_SEARCH_RESULTS", "3"))
+
+
+def local_search(query: str) -> list[dict[str, Any]]:
+    """Search internal documents for passages relevant to a query."""
+    if local_index is None:
+        return []
+    return [
+        {"path": hit.path, "score": hit.match, "snippet": hit.snippet}
+        for hit in local_index.search(query, k=LOCAL_SEARCH_RESULTS)
+    ]
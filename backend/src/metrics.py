@@ -0,0 +1,317 @@
+"""Request, stage and tool metrics rendered in the Prometheus text format."""
+
+import bisect
+import contextvars
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+# Upper bounds in seconds, from in-process steps up to slow model calls.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)  # fmt: skip
+
+# Label values of one series, in the order of the metric's label names.
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with one series per combination of label values."""
+
+    def __init__(
+        self, registry: "Registry", name: str, help: str, label_names: tuple[str, ...]
+    ) -> None:
+        """Create a counter; use `Registry.counter` to have it rendered."""
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        """Add `amount` to the series with the given label values."""
+        if self._registry.enabled:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        """Return the current value of a series."""
+        return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        """Return the lines of the counter's series in the text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Latency histogram with fixed buckets and one series per label values.
+
+    A series is a flat list of per-bucket counts followed by the sum, so an
+    observation is one bisect and two list updates, without locks. Recording
+    happens on the event loop thread; the rare update from a worker thread
+    may race, which only ever loses a sample.
+    """
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        help: str,
+        label_names: tuple[str, ...],
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        """Create a histogram; use `Registry.histogram` to have it rendered."""
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """Record one observation in the series with the given label values."""
+        if not self._registry.enabled:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        """Return the number of observations in a series."""
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> list[str]:
+        """Return the lines of the histogram's series in the text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in list(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += series[-2]
+            le = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            names = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{names} {series[-1]}")
+            lines.append(f"{self.name}_count{names} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose series are read from a callback when metrics are rendered."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: tuple[str, ...],
+        read: Callable[[], dict[Labels, float]],
+    ) -> None:
+        """Create a gauge; use `Registry.gauge` to have it rendered."""
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.read = read
+
+    def render(self) -> list[str]:
+        """Return the lines of the gauge's current series in the text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.read().items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        """Create an empty registry; counters and histograms record if `enabled`."""
+        self.enabled = enabled
+        self._metrics: list[Counter | Histogram | Gauge] = []
+
+    def counter(
+        self, name: str, help: str, label_names: tuple[str, ...] = ()
+    ) -> Counter:
+        """Create and register a counter."""
+        metric = Counter(self, name, help, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self, name: str, help: str, label_names: tuple[str, ...] = ()
+    ) -> Histogram:
+        """Create and register a histogram."""
+        metric = Histogram(self, name, help, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        label_names: tuple[str, ...],
+        read: Callable[[], dict[Labels, float]],
+    ) -> Gauge:
+        """Create and register a gauge; `read()` returns {label values: value}."""
+        metric = Gauge(name, help, label_names, read)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true")
+
+REQUESTS = registry.counter(
+    "invoke_requests_total",
+    "Requests to /invoke.",
+    ("route", "agent", "format"),
+)
+STAGE_SECONDS = registry.histogram(
+    "invoke_stage_seconds",
+    "Latency of /invoke stages. parse and routing are durations; "
+    "first_model_event and final_response are measured from request arrival; "
+    "stream_flush is time spent handing AI SDK parts to the client.",
+    ("stage", "route", "agent", "format"),
+)
+TOOL_SECONDS = registry.histogram(
+    "agent_tool_seconds",
+    "Tool execution latency. google_search runs inside Gemini and is timed "
+    "as the grounded model call.",
+    ("tool", "agent", "route", "format"),
+)
+
+# (route, agent, format) of the request being served, inherited by the tasks
+# that drive its agent run so tool timings can be labeled.
+request_labels: contextvars.ContextVar[tuple[str, str, str]] = contextvars.ContextVar(
+    "request_labels", default=("", "", "")
+)
+
+
+class InFlight(OrderedDict[tuple[str, Any], Any]):
+    """Values of calls whose end callback has not run yet, oldest first.
+
+    Holds at most `max_calls` entries, dropping the oldest, so calls whose
+    end callback never runs (a cancelled agent run) cannot pile up.
+    """
+
+    def __init__(self, max_calls: int = 10_000) -> None:
+        """Create an empty map holding at most `max_calls` entries."""
+        super().__init__()
+        self.max_calls = max_calls
+
+    def __setitem__(self, key: tuple[str, Any], value: Any) -> None:
+        """Store `value`, dropping the oldest entry if the map is full."""
+        super().__setitem__(key, value)
+        if len(self) > self.max_calls:
+            self.popitem(last=False)
+
+
+def tool_call_key(tool_context: ToolContext) -> tuple[str, str | int]:
+    """Return a key for a tool call that is unique across concurrent runs.
+
+    Function call ids are only unique within an invocation and may be
+    missing, in which case the tool context, shared by a call's callbacks,
+    stands in for it.
+    """
+    return (
+        tool_context.invocation_id,
+        tool_context.function_call_id or id(tool_context),
+    )
+
+
+_tool_starts: InFlight = InFlight()
+_search_starts: InFlight = InFlight()
+
+
+def observe_stage(stage: str, seconds: float, labels: tuple[str, str, str]) -> None:
+    """Record the latency of an /invoke stage for (route, agent, format)."""
+    STAGE_SECONDS.observe(seconds, (stage, *labels))
+
+
+def _observe_tool(tool: str, agent: str, seconds: float) -> None:
+    route, _, response_format = request_labels.get()
+    TOOL_SECONDS.observe(seconds, (tool, agent, route, response_format))
+
+
+def before_tool(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext
+) -> None:
+    """ADK before_tool_callback that starts timing a tool call."""
+    if registry.enabled:
+        _tool_starts[tool_call_key(tool_context)] = time.perf_counter()
+
+
+def after_tool(
+    tool: BaseTool,
+    args: dict[str, Any],
+    tool_context: ToolContext,
+    tool_response: Any,
+) -> None:
+    """ADK after_tool_callback that records the tool call's latency."""
+    started = _tool_starts.pop(tool_call_key(tool_context), None)
+    if started is not None:
+        _observe_tool(tool.name, tool_context.agent_name, time.perf_counter() - started)
+
+
+def on_tool_error(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, error: Exception
+) -> None:
+    """ADK on_tool_error_callback that records failed tool calls too."""
+    after_tool(tool, args, tool_context, None)
+
+
+def search_key(callback_context: CallbackContext) -> tuple[str, str]:
+    """Return a key for the model call of a search agent within an invocation."""
+    return (callback_context.invocation_id, callback_context.agent_name)
+
+
+def before_search_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> None:
+    """ADK before_model_callback that starts timing a google_search call."""
+    if registry.enabled:
+        _search_starts[search_key(callback_context)] = time.perf_counter()
+
+
+def after_search_model(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> None:
+    """ADK after_model_callback recording grounded responses as google_search."""
+    if llm_response.partial:
+        return
+    started = _search_starts.pop(search_key(callback_context), None)
+    if started is not None and llm_response.grounding_metadata is not None:
+        _observe_tool(
+            "google_search", callback_context.agent_name, time.perf_counter() - started
+        )
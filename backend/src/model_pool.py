@@ -0,0 +1,233 @@
+"""One HTTP connection pool shared by every model client."""
+
+import asyncio
+import importlib.util
+import os
+import time
+import weakref
+from collections import deque
+from typing import Any, Callable
+
+import httpx
+from google.genai import types
+from typing_extensions import override
+
+from src.metrics import Labels, registry
+from src.telemetry import telemetry
+
+# httpcore trace events that mean a new connection or TLS session was opened.
+_CONNECT_EVENTS = (
+    "connection.connect_tcp.complete",
+    "connection.connect_unix_socket.complete",
+)
+_TLS_EVENT = "connection.start_tls.complete"
+
+
+class ModelConnectionPool(httpx.AsyncBaseTransport):
+    """HTTP connection pool shared by every model client.
+
+    Each `AdmittedGemini` builds its own google-genai client (one per event
+    loop), and each of those would otherwise open its own connections to the
+    Gemini endpoint. Passing `client` to them instead sends every model call
+    through this transport, which keeps one keep-alive connection pool per
+    event loop, since connections belong to the loop that opened them.
+
+    HTTP/2 is used when `http2` is set and the `h2` package is installed, so
+    concurrent calls multiplex over one connection; otherwise connections use
+    HTTP/1.1 with up to `max_connections` open and `max_keepalive` of them
+    kept idle for `keepalive_expiry` seconds. New connections and TLS
+    handshakes are counted from httpcore's trace events.
+    """
+
+    def __init__(
+        self,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 120.0,
+        rate_window: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a pool; connections are opened per event loop on first use.
+
+        Args:
+            http2: Whether to use HTTP/2 when the `h2` package is installed.
+            max_connections: Connections open at most per event loop.
+            max_keepalive: Idle connections kept open per event loop.
+            keepalive_expiry: Seconds an idle connection is kept open.
+            rate_window: Seconds over which `opened_per_second()` is measured.
+            clock: Returns the current time in seconds.
+        """
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            telemetry.warning("HTTP/2 requires the h2 package, using HTTP/1.1")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.rate_window = rate_window
+        self._clock = clock
+        self._transports: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport
+        ] = weakref.WeakKeyDictionary()
+        self._recent_opens: deque[float] = deque()
+        self.requests = 0
+        self.in_flight = 0
+        self.opened = 0
+        self.tls_handshakes = 0
+        self.warmed = 0
+        # The transport gives no default timeout: genai sets one per request.
+        self.client = httpx.AsyncClient(transport=self, timeout=None)
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+            self._transports[loop] = transport
+        return transport
+
+    async def _trace(self, event_name: str, info: dict[str, Any]) -> None:
+        if event_name in _CONNECT_EVENTS:
+            self.opened += 1
+            self._recent_opens.append(self._clock())
+            CONNECTIONS_OPENED.inc()
+        elif event_name == _TLS_EVENT:
+            self.tls_handshakes += 1
+
+    @override
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        outer_trace = request.extensions.get("trace")
+        if outer_trace is None:
+            request.extensions["trace"] = self._trace
+        else:
+
+            async def trace(event_name: str, info: dict[str, Any]) -> None:
+                await self._trace(event_name, info)
+                await outer_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            return await self._transport().handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+
+    async def warm_up(self, url: str, connections: int, timeout: float = 5.0) -> int:
+        """Open up to `connections` connections to `url` ahead of traffic.
+
+        Sends that many concurrent HEAD requests, so HTTP/1.1 opens one
+        connection per request while HTTP/2 opens one and multiplexes. Any
+        response counts, since only the connection matters; failures are
+        logged and ignored.
+
+        Returns:
+            The number of connections opened.
+        """
+        opened = self.opened
+
+        async def touch() -> None:
+            await self.client.head(url, timeout=timeout)
+
+        results = await asyncio.gather(
+            *(touch() for _ in range(connections)), return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            telemetry.warning(
+                "Could not pre-warm model connections", url=url, error=repr(errors[0])
+            )
+        self.warmed += self.opened - opened
+        return self.opened - opened
+
+    def connections(self) -> tuple[int, int] | None:
+        """Return the (idle, active) connection counts of the running loop's pool.
+
+        httpx does not expose its httpcore pool publicly, so the counts are
+        None when a version of httpx or httpcore no longer has it.
+        """
+        try:
+            transport = self._transports.get(asyncio.get_running_loop())
+        except RuntimeError:
+            transport = None
+        if transport is None:
+            return 0, 0
+        connections = getattr(getattr(transport, "_pool", None), "connections", None)
+        if connections is None:
+            return None
+        try:
+            open_connections = [
+                connection for connection in connections if not connection.is_closed()
+            ]
+            idle = sum(1 for connection in open_connections if connection.is_idle())
+        except AttributeError:
+            return None
+        return idle, len(open_connections) - idle
+
+    def opened_per_second(self) -> float:
+        """Return the rate of new connections over the last `rate_window` seconds."""
+        horizon = self._clock() - self.rate_window
+        while self._recent_opens and self._recent_opens[0] < horizon:
+            self._recent_opens.popleft()
+        return len(self._recent_opens) / self.rate_window
+
+    def stats(self) -> dict[str, Any]:
+        """Return connection counts, request counters and the new connection rate."""
+        idle, active = self.connections() or (None, None)
+        return {
+            "http2": self.http2,
+            "idle": idle,
+            "active": active,
+            "in_flight_requests": self.in_flight,
+            "requests": self.requests,
+            "connections_opened": self.opened,
+            "tls_handshakes": self.tls_handshakes,
+            "connections_warmed": self.warmed,
+            "new_connections_per_second": round(self.opened_per_second(), 3),
+        }
+
+    async def aclose(self) -> None:
+        """Close the running loop's connections."""
+        try:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            transport = None
+        if transport is not None:
+            await transport.aclose()
+
+
+def _connection_counts() -> dict[Labels, float]:
+    counts = model_pool.connections()
+    if counts is None:
+        return {}
+    return {("idle",): counts[0], ("active",): counts[1]}
+
+
+CONNECTIONS_OPENED = registry.counter(
+    "model_http_connections_opened_total",
+    "Connections opened to the model endpoint.",
+)
+registry.gauge(
+    "model_http_connections",
+    "Open connections to the model endpoint in this event loop, by state.",
+    ("state",),
+    _connection_counts,
+)
+
+model_pool = ModelConnectionPool(
+    http2=os.getenv("MODEL_HTTP2", "true").lower() == "true",
+    max_connections=int(os.getenv("MODEL_POOL_MAX_CONNECTIONS", "100")),
+    max_keepalive=int(os.getenv("MODEL_POOL_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("MODEL_POOL_KEEPALIVE_EXPIRY", "120")),
+)
+MODEL_POOL_WARM = int(os.getenv("MODEL_POOL_WARM", "4"))
+MODEL_POOL_WARM_URL = os.getenv(
+    "MODEL_POOL_WARM_URL", "https://generativelanguage.googleapis.com/"
+)
+
+
+def model_client_kwargs() -> dict[str, Any]:
+    """Return Gemini `client_kwargs` that send its calls through `model_pool`."""
+    return {"http_options": types.HttpOptions(httpx_async_client=model_pool.client)}
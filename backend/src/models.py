@@ -0,0 +1,53 @@
+"""Choose the model behind each agent: Gemini, a cassette or a fake."""
+
+import os
+
+from src.admission import AdmittedGemini
+from src.model_pool import model_client_kwargs
+
+
+def uses_gemini() -> bool:
+    """Return whether `agent_model()` returns models that call Gemini."""
+    if os.getenv("MODEL_CASSETTE_MODE", "off").lower() == "replay":
+        return False
+    return os.getenv("MODEL_BACKEND", "gemini").lower() != "fake"
+
+
+def agent_model(model: str) -> AdmittedGemini:
+    """Return the model an agent should use.
+
+    Normally this is `model` behind admission control (`AdmittedGemini`). With
+    MODEL_BACKEND=fake, agents get a local `FakeGemini` configured from the
+    FAKE_GEMINI_* variables instead, so the server runs without an API key,
+    e.g. for load tests. MODEL_CASSETTE_MODE=record|replay records Gemini
+    responses to, or replays them from, cassettes in MODEL_CASSETTE_DIR.
+    Models that call Gemini share the connections of `model_pool`.
+    """
+    cassette_mode = os.getenv("MODEL_CASSETTE_MODE", "off").lower()
+    if cassette_mode in ("record", "replay"):
+        from src.cassette import CassetteGemini
+
+        return CassetteGemini(
+            model=model,
+            mode=cassette_mode,
+            cassette_dir=os.getenv("MODEL_CASSETTE_DIR", "cassettes"),
+            client_kwargs=model_client_kwargs(),
+        )
+    if os.getenv("MODEL_BACKEND", "gemini").lower() != "fake":
+        return AdmittedGemini(model=model, client_kwargs=model_client_kwargs())
+
+    from src.fake_gemini import FakeGemini
+
+    seed = os.getenv("FAKE_GEMINI_SEED")
+    return FakeGemini(
+        model=model,
+        latency_ms=float(os.getenv("FAKE_GEMINI_LATENCY_MS", "300")),
+        latency_sigma=float(os.getenv("FAKE_GEMINI_LATENCY_SIGMA", "0.5")),
+        tokens_per_second=float(os.getenv("FAKE_GEMINI_TOKENS_PER_SECOND", "50")),
+        answer_tokens=int(os.getenv("FAKE_GEMINI_ANSWER_TOKENS", "40")),
+        tool_call_rate=float(os.getenv("FAKE_GEMINI_TOOL_CALL_RATE", "1.0")),
+        error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+        timeout_rate=float(os.getenv("FAKE_GEMINI_TIMEOUT_RATE", "0")),
+        timeout_seconds=float(os.getenv("FAKE_GEMINI_TIMEOUT_SECONDS", "30")),
+        seed=int(seed) if seed else None,
+    )
@@ -1,33 +1,274 @@
-from google.adk.agents import BaseAgent
-from src.agent_search import agent_search
+"""The root agent, routing each query to a fast path or a sub-agent."""
+
+import os
+import re
+from typing import Any, AsyncGenerator, Callable, Iterable, Mapping, Sequence
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.run_config import RunConfig
+from google.adk.events import Event
+from google.adk.models import BaseLlm
+from google.genai import types
+from typing_extensions import override
+
 from src.agent import custom_tools_agent
+from src.agent_search import agent_local_search, agent_search
+from src.cascade import Cascade, build_tiers, cascades_from_env
+from src.hedging import (
+    HEDGE_INITIAL_DELAY_SECONDS,
+    HEDGE_PERCENTILE,
+    Hedger,
+    hedge_budget,
+    hedge_routes_from_env,
+)
+from src.local_index import LOCAL_SEARCH_MIN_MATCH, LocalIndex, local_index
+from src.routing import Route, RouteTable, load_routes, user_text
+from src.telemetry import telemetry
+from src.utils import create_horse_fact, roll_a_dice
+
+# Routes are checked in order; queries matching none go to SEARCH_ROUTE. Set
+# ROUTES_FILE to a JSON list of routes to replace DEFAULT_ROUTES.
+DEFAULT_ROUTES = [
+    Route(name="horse", agent="custom", keywords=("horse",)),
+    Route(name="dice", agent="custom", keywords=("dice",)),
+]
+SEARCH_ROUTE = Route(name="search", agent="search")
+# Run config custom metadata key of the route the app already matched.
+ROUTE_METADATA_KEY = "route"
+
+
+def _horse_answer(query: str) -> str:
+    return create_horse_fact()
+
+
+def _dice_answer(query: str) -> str:
+    return f"You rolled a {roll_a_dice()}."
+
+
+# Local-tool routes that can be answered without a model call. Each entry has
+# the tool-backed answer and a pattern for queries that need more than the
+# tool output (those always go to the LLM).
+FAST_PATH_ROUTES: dict[str, tuple[Callable[[str], str], re.Pattern[str] | None]] = {
+    "horse": (_horse_answer, None),
+    "dice": (
+        _dice_answer,
+        re.compile(r"\d*d\d+|\d+\s+dic?e|\b(two|three|twice|times|sum|add)\b"),
+    ),
+}
+
+
+def routed_run_config(run_config: RunConfig | None, route: str) -> RunConfig:
+    """Return `run_config` carrying the route the app matched the query to.
+
+    The app routes each query before running the agent, to label metrics and
+    key caches, and passes the route on so the orchestrator does not match the
+    query again. ADK also copies it into each event's custom metadata.
+    """
+    config = run_config or RunConfig()
+    metadata = {**(config.custom_metadata or {}), ROUTE_METADATA_KEY: route}
+    return config.model_copy(update={"custom_metadata": metadata})
+
+
+def fast_path_routes_from_env() -> set[str]:
+    """Return the routes named in FAST_PATH_ROUTES, e.g. "horse,dice"."""
+    names = os.getenv("FAST_PATH_ROUTES", "")
+    return {name.strip() for name in names.split(",") if name.strip()}
+
+
+def routes_from_env() -> list[Route]:
+    """Return the routes from ROUTES_FILE, or DEFAULT_ROUTES if it is unset."""
+    path = os.getenv("ROUTES_FILE")
+    return load_routes(path) if path else DEFAULT_ROUTES
 
 
 class SmartOrchestrator(BaseAgent):
-    def __init__(self):
+    """Routes each query to a fast-path answer, the custom tools or search.
+
+    A route's agent runs through its cascade if it has one, and is hedged if
+    the route is in `hedge_routes`. A route with both runs its cheaper tiers
+    unhedged and hedges only the last tier, the route's own agent.
+    """
+
+    def __init__(
+        self,
+        fast_path_routes: Iterable[str] | None = None,
+        routes: list[Route] | None = None,
+        index: LocalIndex | None = None,
+        cascades: Mapping[str, Sequence[str | BaseLlm]] | None = None,
+        hedge_routes: Iterable[str] | None = None,
+    ) -> None:
+        """Create the orchestrator; settings left as None are read from the env.
+
+        Args:
+            fast_path_routes: Routes answered by their tool without a model call.
+            routes: The route table, checked in order before SEARCH_ROUTE.
+            index: Local index tried before web search.
+            cascades: Cheaper models tried before each route's own agent.
+            hedge_routes: Routes whose agent runs are hedged.
+        """
         super().__init__(
             name="SmartOrchestrator",
             description="Routes queries to search-agent or custom-tools agent.",
         )
         self._search = agent_search
         self._custom = custom_tools_agent
+        self._local = agent_local_search
+        # Search-route queries the local index matches well are answered from
+        # it; the rest fall back to web search.
+        self._index = local_index if index is None else index
+        self._local_answers = 0
+        self._web_fallbacks = 0
+        if fast_path_routes is None:
+            fast_path_routes = fast_path_routes_from_env()
+        self._fast_path_routes = set(fast_path_routes) & FAST_PATH_ROUTES.keys()
+        self._fast_path_hits = 0
+        self._routes = RouteTable(
+            routes if routes is not None else routes_from_env(), default=SEARCH_ROUTE
+        )
+        # Routes with a cascade try cheaper models before their own agent.
+        self._cascade_models = cascades_from_env() if cascades is None else cascades
+        self._cascades: dict[tuple[str, str], Cascade] = {}
+        # Runs on hedged routes get a second run if the first is slow to respond.
+        self._hedge_routes = (
+            hedge_routes_from_env() if hedge_routes is None else set(hedge_routes)
+        )
+        self._hedgers: dict[tuple[str, str], Hedger] = {}
 
-    async def _run_async_impl(self, context):
-        if hasattr(context, "parts"):
-            user_text = context.parts[0].text
-        elif hasattr(context, "content"):
-            user_text = context.content
-        else:
-            user_text = str(context)
-        user_text = user_text.lower()
+    def _fast_path_answer(self, route: Route, text: str) -> str | None:
+        """Return a tool-backed answer if the route has an enabled fast path."""
+        if route.name not in self._fast_path_routes:
+            return None
+        answer, needs_llm = FAST_PATH_ROUTES[route.name]
+        if needs_llm is not None and needs_llm.search(text):
+            return None
+        return answer(text)
 
-        if "horse" in user_text or "dice" in user_text:
-            target = self._custom
-        else:
-            target = self._search
+    def route(self, text: str, name: str | None = None) -> tuple[Route, LlmAgent]:
+        """Return the route and sub-agent for a query, counting the hit.
+
+        `name` is the route the caller already matched the query to, see
+        `routed_run_config`; the query is then not matched a second time.
+        """
+        route = (self._routes.named(name) if name else None) or self._routes.match(text)
+        target = self._custom if route.agent == "custom" else self._search
+        return route, target
+
+    def peek_route(self, text: str) -> Route:
+        """Return the route a query would take, without counting it."""
+        return self._routes.match(text, count=False)
+
+    def route_stats(self) -> dict[str, int]:
+        """Return per-route hit counters."""
+        return self._routes.stats()
+
+    def fast_path_stats(self) -> dict[str, int]:
+        """Return how many queries were answered on the fast path."""
+        return {"fast_path_answers": self._fast_path_hits}
 
-        async for event in target.run_async(context):
-            yield event
+    def _search_target(self, text: str) -> LlmAgent:
+        """Return the local-documents agent if the index matches `text` well enough."""
+        if self._index is None:
+            return self._search
+        hits = self._index.search(text, k=1)
+        if hits and hits[0].match >= LOCAL_SEARCH_MIN_MATCH:
+            self._local_answers += 1
+            return self._local
+        self._web_fallbacks += 1
+        return self._search
+
+    def local_search_stats(self) -> dict[str, int]:
+        """Return how many search-route queries were answered locally or from the web."""
+        return {
+            "local_answers": self._local_answers,
+            "web_fallbacks": self._web_fallbacks,
+        }
+
+    def _cascade(self, route: Route, target: LlmAgent) -> Cascade | None:
+        """Return the cascade running `target` for `route`, or None if it has none."""
+        models = self._cascade_models.get(route.name)
+        if not models:
+            return None
+        key = (route.name, target.name)
+        if key not in self._cascades:
+            self._cascades[key] = Cascade(
+                route.name, build_tiers(target, models), grounded=target is self._search
+            )
+        return self._cascades[key]
+
+    def cascade_stats(self) -> dict[str, dict[str, Any]]:
+        """Return per-route, per-agent cascade answers, escalations and savings."""
+        stats: dict[str, dict[str, Any]] = {}
+        for (route, agent), cascade in self._cascades.items():
+            stats.setdefault(route, {})[agent] = cascade.stats()
+        return stats
+
+    def _hedger(self, route: Route, target: LlmAgent) -> Hedger | None:
+        """Return the hedger running `target` for `route`, or None if it is not hedged."""
+        if route.name not in self._hedge_routes:
+            return None
+        key = (route.name, target.name)
+        if key not in self._hedgers:
+            self._hedgers[key] = Hedger(
+                route.name,
+                hedge_budget,
+                percentile=HEDGE_PERCENTILE,
+                initial_delay=HEDGE_INITIAL_DELAY_SECONDS,
+            )
+        return self._hedgers[key]
+
+    def hedge_stats(self) -> dict[str, Any]:
+        """Return the shared hedge budget and per-route, per-agent hedge counters."""
+        routes: dict[str, dict[str, Any]] = {}
+        for (route, agent), hedger in self._hedgers.items():
+            routes.setdefault(route, {})[agent] = hedger.stats()
+        return {"budget": hedge_budget.stats(), "routes": routes}
+
+    @override
+    async def _run_async_impl(
+        self, context: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        text = user_text(context).lower()
+        metadata = context.run_config.custom_metadata if context.run_config else None
+        with telemetry.span("route") as span:
+            route, target = self.route(text, (metadata or {}).get(ROUTE_METADATA_KEY))
+            span.attributes.update(route=route.name, agent=route.agent)
+
+        answer = self._fast_path_answer(route, text)
+        if answer is not None:
+            self._fast_path_hits += 1
+            telemetry.debug("Fast path answer", route=route.name)
+            yield Event(
+                invocation_id=context.invocation_id,
+                author=self._custom.name,
+                branch=context.branch,
+                content=types.Content(
+                    role="model", parts=[types.Part(text=str(answer))]
+                ),
+            )
+            return
+
+        if target is self._search:
+            target = self._search_target(text)
+        cascade = self._cascade(route, target)
+        hedger = self._hedger(route, target)
+        if cascade is not None:
+            events = cascade.run(context, run_last=hedger.run if hedger else None)
+        elif hedger is not None:
+            events = hedger.run(target, context)
+        else:
+            events = target.run_async(context)
+        with telemetry.span("agent", agent=route.agent, route=route.name):
+            async for event in events:
+                if telemetry.enabled("DEBUG"):
+                    telemetry.debug(
+                        "Model event",
+                        author=event.author,
+                        partial=bool(event.partial),
+                        tool_calls=len(event.get_function_calls()),
+                        final=event.is_final_response(),
+                    )
+                yield event
 
 
 root_agent = SmartOrchestrator()
@@ -0,0 +1,200 @@
+"""Explicit prompt caching: its config, hit statistics and a local cache store."""
+
+import datetime
+import os
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, cast
+
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.models.llm_response import LlmResponse
+from google.genai import Client, types
+from google.genai.errors import ClientError
+
+from src.metrics import registry
+
+PROMPT_TOKENS = registry.counter(
+    "model_prompt_tokens_total",
+    "Prompt tokens sent to models, split into tokens read from an explicit "
+    "prompt cache and tokens sent in full.",
+    ("model", "kind"),
+)
+
+
+def prompt_cache_config_from_env() -> ContextCacheConfig | None:
+    """Return the context cache config for the app, or None if PROMPT_CACHE is off.
+
+    With a config, ADK registers each agent's stable prompt prefix (system
+    instruction, tool declarations and the history before the latest user
+    turn) as cached content and sends later calls with a handle to it.
+    """
+    if os.getenv("PROMPT_CACHE", "off").lower() not in ("on", "true", "1"):
+        return None
+    return ContextCacheConfig(
+        ttl_seconds=int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "1800")),
+        cache_intervals=int(os.getenv("PROMPT_CACHE_INTERVALS", "10")),
+        min_tokens=int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "4096")),
+    )
+
+
+def estimate_tokens(
+    system_instruction: object,
+    tools: Iterable[object] | None,
+    contents: Iterable[Any] | None,
+) -> int:
+    """Return a rough prompt token count, at 4 characters per token."""
+    chars = len(str(system_instruction or ""))
+    chars += sum(
+        len(tool.model_dump_json(exclude_none=True))
+        for tool in tools or []
+        if isinstance(tool, types.Tool)
+    )
+    for content in contents or []:
+        chars += sum(len(part.text or "") for part in content.parts or [])
+    return chars // 4 + 1
+
+
+class PromptCacheStats:
+    """Counts model calls served from a cached prompt prefix and the tokens saved.
+
+    Fed with each complete model response: a call is a hit when its usage
+    reports cached content tokens, and a cache name not seen before means a
+    cache was created, replacing the previous one when the prefix changed.
+    """
+
+    def __init__(self, max_names: int = 10_000) -> None:
+        """Create zeroed counters remembering up to `max_names` cache names."""
+        self._max_names = max_names
+        self._names: OrderedDict[str, None] = OrderedDict()
+        self.calls = 0
+        self.hits = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.caches_created = 0
+
+    def observe(self, model: str, response: LlmResponse) -> None:
+        """Record one complete (non-partial) model response."""
+        usage = response.usage_metadata
+        if response.partial or usage is None:
+            return
+        prompt = usage.prompt_token_count or 0
+        cached = min(usage.cached_content_token_count or 0, prompt)
+        self.calls += 1
+        self.prompt_tokens += prompt
+        if cached:
+            self.hits += 1
+            self.cached_tokens += cached
+        PROMPT_TOKENS.inc(labels=(model, "cached"), amount=cached)
+        PROMPT_TOKENS.inc(labels=(model, "uncached"), amount=prompt - cached)
+
+        name = response.cache_metadata.cache_name if response.cache_metadata else None
+        if name is not None and name not in self._names:
+            self.caches_created += 1
+            self._names[name] = None
+            if len(self._names) > self._max_names:
+                self._names.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        """Return calls, hits, hit rate, prompt tokens and tokens read from caches."""
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.calls if self.calls else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "tokens_saved": self.cached_tokens,
+            "saved_share": self.cached_tokens / self.prompt_tokens
+            if self.prompt_tokens
+            else 0.0,
+            "caches_created": self.caches_created,
+        }
+
+
+class LocalCaches:
+    """In-memory stand-in for the Gemini cached contents API (`client.aio.caches`).
+
+    Stores each cached prefix with an estimated token count so a stand-in
+    model can expand `cached_content` handles and report cached tokens.
+    `client` can be passed wherever ADK expects a genai client for caching.
+    """
+
+    def __init__(self, clock: Callable[[], datetime.datetime] | None = None) -> None:
+        """Create an empty store; `clock` returns the current UTC time."""
+        self._clock = clock or (lambda: datetime.datetime.now(datetime.UTC))
+        self._entries: dict[
+            str, tuple[types.CachedContent, types.CreateCachedContentConfig]
+        ] = {}
+        self._next = 0
+        self.created = 0
+        self.deleted = 0
+        self.client = cast(
+            Client, SimpleNamespace(aio=SimpleNamespace(caches=self), vertexai=False)
+        )
+
+    @staticmethod
+    def estimate_tokens(config: types.CreateCachedContentConfig) -> int:
+        """Return a rough token count of a cached prefix."""
+        return estimate_tokens(config.system_instruction, config.tools, config.contents)
+
+    async def create(
+        self, *, model: str, config: types.CreateCachedContentConfig
+    ) -> types.CachedContent:
+        """Store the prefix in `config` and return its cache entry."""
+        self._next += 1
+        self.created += 1
+        name = f"cachedContents/local-{self._next}"
+        seconds = float(str(config.ttl or "3600s").rstrip("s"))
+        now = self._clock()
+        cached = types.CachedContent(
+            name=name,
+            model=model,
+            create_time=now,
+            expire_time=now + datetime.timedelta(seconds=seconds),
+            usage_metadata=types.CachedContentUsageMetadata(
+                total_token_count=self.estimate_tokens(config)
+            ),
+        )
+        self._entries[name] = (cached, config)
+        return cached
+
+    async def get(self, *, name: str) -> types.CachedContent:
+        """Return the cache entry `name`, raising a 404 if absent or expired."""
+        return self._lookup(name)[0]
+
+    async def delete(self, *, name: str) -> None:
+        """Delete the cache entry `name`, raising a 404 if absent or expired."""
+        self._lookup(name)
+        del self._entries[name]
+        self.deleted += 1
+
+    def contents(
+        self, name: str
+    ) -> tuple[types.CachedContent, types.CreateCachedContentConfig]:
+        """Return the cache entry and the prefix it holds, as a model would read it."""
+        return self._lookup(name)
+
+    def _lookup(
+        self, name: str
+    ) -> tuple[types.CachedContent, types.CreateCachedContentConfig]:
+        entry = self._entries.get(name)
+        expires = entry[0].expire_time if entry else None
+        if entry is None or expires is None or expires <= self._clock():
+            self._entries.pop(name, None)
+            raise ClientError(
+                404,
+                {
+                    "error": {
+                        "code": 404,
+                        "message": f"{name} not found",
+                        "status": "NOT_FOUND",
+                    }
+                },
+            )
+        return entry
+
+    def __len__(self) -> int:
+        """Return the number of stored entries, expired ones included."""
+        return len(self._entries)
+
+
+prompt_cache_config = prompt_cache_config_from_env()
+prompt_cache_stats = PromptCacheStats()
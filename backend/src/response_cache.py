@@ -0,0 +1,116 @@
+"""LRU cache of final agent responses with per-route TTLs."""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Callable
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Normalized query, route and time bucket.
+CacheKey = tuple[str, str, int]
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a query for cache lookups: case, whitespace, end punctuation."""
+    return _WHITESPACE.sub(" ", text.lower()).strip().rstrip("?!. ")
+
+
+def parse_ttls(spec: str) -> dict[str, float]:
+    """Parse per-route TTLs written as "route=seconds,route=seconds"."""
+    ttls = {}
+    for item in spec.split(","):
+        if "=" in item:
+            route, seconds = item.split("=", 1)
+            ttls[route.strip()] = float(seconds)
+    return ttls
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of final agent responses with per-route TTLs.
+
+    Keys combine the normalized query, the route chosen by the orchestrator and
+    a wall-clock time bucket of `bucket_seconds` (aligned to UTC), so answers
+    never outlive the bucket they were produced in, e.g. "what day is it?"
+    is not served across midnight. Routes with a TTL of 0 are never cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttls: dict[str, float] | None = None,
+        default_ttl: float = 300.0,
+        bucket_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Create an empty cache.
+
+        Args:
+            max_entries: Most responses kept before the least recent is evicted.
+            ttls: TTL in seconds per route; 0 disables caching for the route.
+            default_ttl: TTL of routes missing from `ttls`.
+            bucket_seconds: Length of the wall-clock buckets keys include.
+            clock: Returns the current time in seconds.
+        """
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.bucket_seconds = bucket_seconds
+        self._clock = clock
+        self._entries: OrderedDict[CacheKey, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    def ttl(self, route: str) -> float:
+        """Return the TTL of a route in seconds."""
+        return self.ttls.get(route, self.default_ttl)
+
+    def key(self, query: str, route: str) -> CacheKey | None:
+        """Return the cache key of a query, or None if its route is not cached."""
+        if self.ttl(route) <= 0:
+            return None
+        bucket = int(self._clock() // self.bucket_seconds)
+        return (normalize_query(query), route, bucket)
+
+    def get(self, key: CacheKey) -> str | None:
+        """Return a fresh cached response, counting the hit or miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, response = entry
+            if expires > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: CacheKey, response: str) -> None:
+        """Store a response, evicting least recently used entries."""
+        self._entries[key] = (self._clock() + self.ttl(key[1]), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def bypass(self) -> None:
+        """Count a request that opted out of the cache."""
+        self.bypasses += 1
+
+    def stats(self) -> dict[str, float]:
+        """Return hit/miss counters and the current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,214 @@
+"""Route queries to sub-agents with a compiled keyword and pattern table."""
+
+import json
+import re
+import re._parser as sre_parse  # type: ignore[import-not-found]
+from collections import Counter, deque
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Route:
+    """A routing rule sending matching queries to a sub-agent.
+
+    Attributes:
+        name: Route name, used for hit counters and per-route settings.
+        agent: Key of the sub-agent that handles the route (e.g. "custom").
+        keywords: Case-insensitive substrings that select the route.
+        patterns: Case-insensitive regular expressions that select the route.
+    """
+
+    name: str
+    agent: str
+    keywords: tuple[str, ...] = ()
+    patterns: tuple[str, ...] = ()
+
+
+def user_text(context: object) -> str:
+    """Extract the user's message text from an ADK invocation context."""
+    user_content = getattr(context, "user_content", None)
+    if user_content is not None and user_content.parts:
+        return "".join(part.text or "" for part in user_content.parts)
+    # Plain message-like objects, as used by tests and older callers.
+    if hasattr(context, "parts"):
+        return context.parts[0].text or ""
+    if hasattr(context, "content"):
+        return str(context.content)
+    return str(context)
+
+
+def required_literal(pattern: str) -> str | None:
+    """Return the longest literal every match of `pattern` must contain.
+
+    Only literals at the top level of the pattern are considered. Returns None
+    if the pattern has no such literal (e.g. it is an alternation).
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    best, run = "", ""
+    for opcode, value in parsed:
+        if opcode == sre_parse.LITERAL:
+            run += chr(value)
+        else:
+            best = max(best, run, key=len)
+            run = ""
+    best = max(best, run, key=len)
+    return best.lower() or None
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting which keyword groups occur in a text.
+
+    Matching is a single pass over the text, so its cost does not depend on
+    the number of keywords.
+    """
+
+    def __init__(self, keywords: list[tuple[str, int]]) -> None:
+        """Build the automaton for `keywords`, given as (keyword, group) pairs."""
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[frozenset[int]] = [frozenset()]
+        for keyword, group in keywords:
+            self._add(keyword, group)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, group: int) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(frozenset())
+            state = next_state
+        self._out[state] = self._out[state] | {group}
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._out[next_state] = (
+                    self._out[next_state] | self._out[self._fail[next_state]]
+                )
+
+    def groups(self, text: str) -> set[int]:
+        """Return the groups of all keywords occurring in `text`."""
+        found: set[int] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class RouteTable:
+    """Declarative route table compiled into a single multi-pattern matcher.
+
+    Keywords of all routes, plus a literal required by each regular expression,
+    are compiled into one Aho-Corasick automaton. Routing a query is one pass
+    over its text; only regular expressions whose literal occurred (or that
+    have none) are then evaluated, so the cost stays flat as routes are added.
+    When several routes match, the one listed first wins; queries matching
+    nothing go to `default`. Hits are counted per route.
+    """
+
+    def __init__(self, routes: list[Route], default: Route) -> None:
+        """Compile `routes`, sending queries that match none to `default`."""
+        self.routes = list(routes)
+        self.default = default
+        self.hits: Counter[str] = Counter()
+        # By name; the first route listed wins, as in `match`.
+        self._named = {route.name: route for route in reversed([*routes, default])}
+        self._patterns: dict[int, re.Pattern[str]] = {}
+        self._unfiltered: list[int] = []
+        keywords: list[tuple[str, int]] = []
+        for index, route in enumerate(self.routes):
+            keywords.extend((keyword.lower(), index) for keyword in route.keywords)
+            if not route.patterns:
+                continue
+            self._patterns[index] = re.compile(
+                "|".join(f"(?:{p})" for p in route.patterns), re.IGNORECASE
+            )
+            literals = [required_literal(p) for p in route.patterns]
+            if None in literals:
+                self._unfiltered.append(index)
+            else:
+                # Pattern groups are offset so they never clash with route indexes.
+                offset = len(self.routes) + index
+                keywords.extend((literal, offset) for literal in literals if literal)
+        self._automaton = KeywordAutomaton(keywords)
+
+    def match(self, text: str, count: bool = True) -> Route:
+        """Return the route for a query, counting the hit unless `count` is False."""
+        route = self._match(text.lower())
+        if count:
+            self.hits[route.name] += 1
+        return route
+
+    def named(self, name: str, count: bool = True) -> Route | None:
+        """Return the route called `name`, or None if there is none.
+
+        The hit is counted unless `count` is False, as in `match`.
+        """
+        route = self._named.get(name)
+        if route is not None and count:
+            self.hits[route.name] += 1
+        return route
+
+    def _match(self, text: str) -> Route:
+        count = len(self.routes)
+        best = count
+        candidates = list(self._unfiltered)
+        for group in self._automaton.groups(text):
+            if group < count:
+                best = min(best, group)
+            else:
+                candidates.append(group - count)
+        for index in sorted(candidates):
+            if index >= best:
+                break
+            if self._patterns[index].search(text):
+                best = index
+                break
+        if best < count:
+            return self.routes[best]
+        return self.default
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit count of every route."""
+        names = [route.name for route in self.routes] + [self.default.name]
+        return {name: self.hits[name] for name in names}
+
+
+def load_routes(path: str) -> list[Route]:
+    """Load routes from a JSON file holding a list of route objects.
+
+    Example entry: {"name": "dice", "agent": "custom", "keywords": ["dice"]}
+    """
+    with open(path) as file:
+        entries = json.load(file)
+    return [
+        Route(
+            name=entry["name"],
+            agent=entry["agent"],
+            keywords=tuple(entry.get("keywords", ())),
+            patterns=tuple(entry.get("patterns", ())),
+        )
+        for entry in entries
+    ]
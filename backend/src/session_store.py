@@ -0,0 +1,204 @@
+"""In-memory session service bounded in sessions, idle time and events."""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from typing_extensions import override
+
+
+class BoundedSessionService(InMemorySessionService):
+    """In-memory session service with LRU eviction, idle TTL and an event cap.
+
+    Sessions are tracked in least-recently-used order. Creating a session past
+    `max_sessions` evicts the least recently used one, sessions idle for longer
+    than `idle_ttl_seconds` are dropped on the next access to the store, and
+    each session keeps at most `max_events` events. Trimming always starts the
+    retained history at a user turn so tool calls are never separated from
+    their responses. If the last `max_events` events hold no user turn, the
+    most recent user turn and everything after it are kept.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 1800.0,
+        max_events: int = 50,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create an empty store.
+
+        Args:
+            max_sessions: Sessions held before the least recently used is evicted.
+            idle_ttl_seconds: Idle time after which a session is dropped.
+            max_events: Events kept per session.
+            clock: Returns the current time in seconds.
+        """
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_events = max_events
+        self._clock = clock
+        self._last_access: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+        self.evicted_sessions = 0
+        self.expired_sessions = 0
+        self.trimmed_events = 0
+
+    def __len__(self) -> int:
+        """Return the number of sessions held."""
+        return len(self._last_access)
+
+    def _touch(self, key: tuple[str, str, str]) -> None:
+        self._last_access[key] = self._clock()
+        self._last_access.move_to_end(key)
+
+    def _drop(self, key: tuple[str, str, str]) -> None:
+        self._last_access.pop(key, None)
+        app_name, user_id, session_id = key
+        user_sessions = self.sessions.get(app_name, {}).get(user_id)
+        if user_sessions is not None:
+            user_sessions.pop(session_id, None)
+            if not user_sessions:
+                self.sessions[app_name].pop(user_id, None)
+
+    def _expire_idle(self) -> None:
+        # Entries are kept in access order, so only the expired prefix is visited.
+        deadline = self._clock() - self.idle_ttl_seconds
+        while self._last_access:
+            key, last_access = next(iter(self._last_access.items()))
+            if last_access > deadline:
+                break
+            self._drop(key)
+            self.expired_sessions += 1
+
+    def _evict_overflow(self) -> None:
+        while len(self._last_access) > self.max_sessions:
+            key = next(iter(self._last_access))
+            self._drop(key)
+            self.evicted_sessions += 1
+
+    def _trim_events(self, session: Session) -> None:
+        events = session.events
+        if len(events) <= self.max_events:
+            return
+        start = len(events) - self.max_events
+        while start < len(events) and events[start].author != "user":
+            start += 1
+        if start == len(events):
+            # No user turn in the window: keep the last one and what followed.
+            start = next(
+                (
+                    i
+                    for i in range(len(events) - 1, -1, -1)
+                    if events[i].author == "user"
+                ),
+                len(events) - self.max_events,
+            )
+        self.trimmed_events += start
+        del events[:start]
+
+    @override
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: dict[str, Any] | None = None,
+        session_id: str | None = None,
+    ) -> Session:
+        self._expire_idle()
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._touch((app_name, user_id, session.id))
+        self._evict_overflow()
+        return session
+
+    @override
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: GetSessionConfig | None = None,
+    ) -> Session | None:
+        self._expire_idle()
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            self._touch((app_name, user_id, session_id))
+        return session
+
+    @override
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        self._last_access.pop((app_name, user_id, session_id), None)
+        await super().delete_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    @override
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        if key in self._last_access:
+            self._touch(key)
+            self._trim_events(
+                self.sessions[session.app_name][session.user_id][session.id]
+            )
+        return event
+
+    async def ensure_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        """Create the session unless it is already held by the store."""
+        self._expire_idle()
+        key = (app_name, user_id, session_id)
+        if key in self._last_access:
+            self._touch(key)
+            return
+        await self.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    async def compact_history(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        upto_event_id: str,
+        summary_event: Event,
+    ) -> bool:
+        """Replace all events up to and including `upto_event_id` with a summary.
+
+        Events appended after `upto_event_id` are kept.
+
+        Returns:
+            False if the session or event no longer exists.
+        """
+        session = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if session is None:
+            return False
+        for index, event in enumerate(session.events):
+            if event.id == upto_event_id:
+                session.events[: index + 1] = [summary_event]
+                return True
+        return False
+
+    def stats(self) -> dict[str, int]:
+        """Return the current size and eviction counters of the store."""
+        return {
+            "sessions": len(self._last_access),
+            "evicted_sessions": self.evicted_sessions,
+            "expired_sessions": self.expired_sessions,
+            "trimmed_events": self.trimmed_events,
+        }
@@ -0,0 +1,127 @@
+"""Coalesce concurrent identical agent runs into one shared run."""
+
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Hashable
+
+
+class SharedRun:
+    """One async event stream fanned out to any number of subscribers.
+
+    The source is driven by its own task, so it keeps running while at least
+    one subscriber is attached, whichever one came first. Every event is
+    buffered; a subscriber that attaches partway through first receives the
+    events it missed and then follows the live stream. When the last
+    subscriber detaches before the stream ends, the run is cancelled.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[Any],
+        on_done: Callable[["SharedRun"], None] | None = None,
+    ) -> None:
+        """Start driving `source`, calling `on_done` with the run once it ends."""
+        self.events: list[Any] = []
+        self.finished = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._source = source
+        self._on_done = on_done
+        self._changed = asyncio.Condition()
+        self._task = asyncio.get_running_loop().create_task(self._drive())
+
+    async def _drive(self) -> None:
+        try:
+            async for event in self._source:
+                async with self._changed:
+                    self.events.append(event)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            async with self._changed:
+                self.finished = True
+                self._changed.notify_all()
+            if self._on_done is not None:
+                self._on_done(self)
+
+    async def subscribe(self) -> AsyncGenerator[Any, None]:
+        """Yield all events of the run, from the first one on."""
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.finished:
+                    if isinstance(self.error, asyncio.CancelledError):
+                        raise RuntimeError("Shared agent run was cancelled")
+                    if self.error is not None:
+                        raise self.error
+                    return
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: index < len(self.events) or self.finished
+                    )
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Coalesces concurrent runs with the same key into one shared run.
+
+    The first caller for a key starts the run; callers arriving while it is in
+    flight join it instead of starting their own. The key is released as soon
+    as the run finishes, so later calls start a fresh run.
+    """
+
+    def __init__(self) -> None:
+        """Create a registry with no runs in flight."""
+        self._runs: dict[Hashable, SharedRun] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        """Return the number of registered runs."""
+        return len(self._runs)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return whether a run for `key` is in flight."""
+        run = self._runs.get(key)
+        return run is not None and not run.finished
+
+    def join(
+        self, key: Hashable, start: Callable[[], AsyncIterator[Any]] | None
+    ) -> tuple[SharedRun, bool]:
+        """Return the in-flight run for `key`, starting one with `start()` if needed.
+
+        `start` may be None when the caller knows the run is in flight.
+
+        Returns:
+            The shared run and whether this caller started it.
+        """
+        if key in self:
+            self.coalesced += 1
+            return self._runs[key], False
+
+        def release(finished_run: SharedRun) -> None:
+            if self._runs.get(key) is finished_run:
+                del self._runs[key]
+
+        assert start is not None, f"No run in flight for {key!r}"
+        run = SharedRun(start(), on_done=release)
+        self._runs[key] = run
+        self.leaders += 1
+        return run, True
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of started, coalesced and in-flight runs."""
+        return {
+            "runs": self.leaders,
+            "coalesced_requests": self.coalesced,
+            "in_flight": len(self._runs),
+        }
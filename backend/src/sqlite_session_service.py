@@ -0,0 +1,586 @@
+"""ADK session service persisted to SQLite with write-behind event appends."""
+
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from typing_extensions import override
+
+T = TypeVar("T")
+
+SessionKey = tuple[str, str, str]
+# A loaded session: its (state, update time) row, its events as JSON and the
+# app and user states.
+LoadedSession = tuple[
+    tuple[str, float], list[str], tuple[dict[str, Any], dict[str, Any]]
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session
+    ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def split_state_delta(
+    delta: dict[str, Any],
+) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
+    """Split a state delta into app, user and session scoped deltas.
+
+    Temp-scoped keys are dropped since they are never persisted.
+    """
+    app: dict[str, Any] = {}
+    user: dict[str, Any] = {}
+    session: dict[str, Any] = {}
+    for key, value in delta.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+class SqliteSessionService(BaseSessionService):
+    """ADK session service persisted to a local SQLite database in WAL mode.
+
+    Event appends are buffered in memory and written behind the request path:
+    a background task commits them in batches of up to `batch_size` events, at
+    least every `flush_interval` seconds. Reads see buffered events, so callers
+    always observe their own writes. Histories are loaded from disk only when a
+    session is fetched, and `max_events` bounds how much of it is loaded.
+
+    All database access runs on a single worker thread, which serializes use of
+    the connection without blocking the event loop. Call `close()` on shutdown
+    to commit any buffered events. The keys of up to `known_sessions` recently
+    used sessions are remembered so `ensure_session` can skip the database.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "sessions.db",
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        max_events: int | None = None,
+        known_sessions: int = 10_000,
+    ) -> None:
+        """Open (and if needed create) the database at `db_path`.
+
+        Args:
+            db_path: Path of the SQLite database file.
+            batch_size: Buffered events that trigger an immediate flush.
+            flush_interval: Longest time in seconds an event stays buffered.
+            max_events: Most recent events loaded per session, or None for all.
+            known_sessions: Session keys remembered by `ensure_session`.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-sessions"
+        )
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._pending_events: list[tuple[SessionKey, str, Event]] = []
+        self._pending_sessions: dict[SessionKey, tuple[str, float]] = {}
+        self._pending_app_states: dict[str, dict[str, Any]] = {}
+        self._pending_user_states: dict[tuple[str, str], dict[str, Any]] = {}
+        # Replaced whenever a flusher starts, in the loop that runs it.
+        self._flush_wakeup = asyncio.Event()
+        self._flusher: asyncio.Task[None] | None = None
+        self._known: OrderedDict[SessionKey, None] = OrderedDict()
+        self._max_known = known_sessions
+        self.flushed_batches = 0
+        self.flushed_events = 0
+
+    def _remember(self, key: SessionKey) -> None:
+        self._known[key] = None
+        self._known.move_to_end(key)
+        if len(self._known) > self._max_known:
+            self._known.popitem(last=False)
+
+    async def _db(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # --- reads ---
+
+    def _load_state(
+        self, app_name: str, user_id: str
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT state FROM app_states WHERE app_name = ?", (app_name,)
+        ).fetchone()
+        app_state = json.loads(row[0]) if row else {}
+        row = self._conn.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id),
+        ).fetchone()
+        user_state = json.loads(row[0]) if row else {}
+        return app_state, user_state
+
+    def _load_session(
+        self, app_name: str, user_id: str, session_id: str, limit: int | None
+    ) -> LoadedSession | None:
+        row = self._conn.execute(
+            "SELECT state, update_time FROM sessions"
+            " WHERE app_name = ? AND user_id = ? AND id = ?",
+            (app_name, user_id, session_id),
+        ).fetchone()
+        if row is None:
+            return None
+        if limit is None:
+            rows = self._conn.execute(
+                "SELECT data FROM events"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                " ORDER BY seq",
+                (app_name, user_id, session_id),
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT data FROM events"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                " ORDER BY seq DESC LIMIT ?",
+                (app_name, user_id, session_id, limit),
+            ).fetchall()
+            rows.reverse()
+        return row, [data for (data,) in rows], self._load_state(app_name, user_id)
+
+    def _merged_state(
+        self,
+        app_state: dict[str, Any],
+        user_state: dict[str, Any],
+        session_state: dict[str, Any],
+    ) -> dict[str, Any]:
+        state = dict(session_state)
+        state.update({State.APP_PREFIX + k: v for k, v in app_state.items()})
+        state.update({State.USER_PREFIX + k: v for k, v in user_state.items()})
+        return state
+
+    @override
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: GetSessionConfig | None = None,
+    ) -> Session | None:
+        key = (app_name, user_id, session_id)
+        limit = self.max_events
+        if config and config.num_recent_events is not None:
+            limit = config.num_recent_events
+        if limit == 0:
+            pending = []
+        else:
+            pending = [e for k, _, e in self._pending_events if k == key]
+        db_limit = None if limit is None else max(limit - len(pending), 0)
+        loaded = await self._db(
+            self._load_session, app_name, user_id, session_id, db_limit
+        )
+        if loaded is None and key not in self._pending_sessions:
+            return None
+
+        if loaded is None:
+            session_state, update_time = self._pending_sessions[key]
+            events_data: list[str] = []
+            app_state: dict[str, Any] = {}
+            user_state: dict[str, Any] = {}
+        else:
+            (session_state, update_time), events_data, (app_state, user_state) = loaded
+            if key in self._pending_sessions:
+                session_state, update_time = self._pending_sessions[key]
+        app_state = {**app_state, **self._pending_app_states.get(app_name, {})}
+        user_state = {
+            **user_state,
+            **self._pending_user_states.get((app_name, user_id), {}),
+        }
+
+        events = [Event.model_validate_json(data) for data in events_data]
+        events.extend(pending)
+        if limit is not None and len(events) > limit:
+            events = events[len(events) - limit :]
+        if config and config.after_timestamp is not None:
+            events = [e for e in events if e.timestamp >= config.after_timestamp]
+        # Never start a truncated history in the middle of a tool exchange.
+        if limit is not None:
+            start = 0
+            while start < len(events) and events[start].author != "user":
+                start += 1
+            events = events[start:]
+
+        self._remember(key)
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=self._merged_state(app_state, user_state, json.loads(session_state)),
+            events=events,
+            last_update_time=update_time,
+        )
+
+    def _list_sessions(self, app_name: str, user_id: str | None) -> list[Any]:
+        if user_id is None:
+            return self._conn.execute(
+                "SELECT user_id, id, update_time FROM sessions"
+                " WHERE app_name = ? ORDER BY update_time",
+                (app_name,),
+            ).fetchall()
+        return self._conn.execute(
+            "SELECT user_id, id, update_time FROM sessions"
+            " WHERE app_name = ? AND user_id = ? ORDER BY update_time",
+            (app_name, user_id),
+        ).fetchall()
+
+    @override
+    async def list_sessions(
+        self, *, app_name: str, user_id: str | None = None
+    ) -> ListSessionsResponse:
+        await self.flush()
+        rows = await self._db(self._list_sessions, app_name, user_id)
+        return ListSessionsResponse(
+            sessions=[
+                Session(app_name=app_name, user_id=uid, id=sid, last_update_time=ts)
+                for uid, sid, ts in rows
+            ]
+        )
+
+    # --- writes ---
+
+    @override
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: dict[str, Any] | None = None,
+        session_id: str | None = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or uuid.uuid4().hex
+        app_delta, user_delta, session_state = split_state_delta(state or {})
+        now = time.time()
+        await self._db(
+            self._insert_session,
+            app_name,
+            user_id,
+            session_id,
+            session_state,
+            app_delta,
+            user_delta,
+            now,
+        )
+        self._remember((app_name, user_id, session_id))
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=dict(state or {}),
+            last_update_time=now,
+        )
+
+    def _insert_session(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        session_state: dict[str, Any],
+        app_delta: dict[str, Any],
+        user_delta: dict[str, Any],
+        now: float,
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (app_name, user_id, id, state, create_time,"
+                " update_time) VALUES (?, ?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, json.dumps(session_state), now, now),
+            )
+            self._merge_scoped_states(
+                {app_name: app_delta}, {(app_name, user_id): user_delta}
+            )
+
+    def _merge_scoped_states(
+        self,
+        app_states: dict[str, dict[str, Any]],
+        user_states: dict[tuple[str, str], dict[str, Any]],
+    ) -> None:
+        for app_name, delta in app_states.items():
+            if not delta:
+                continue
+            row = self._conn.execute(
+                "SELECT state FROM app_states WHERE app_name = ?", (app_name,)
+            ).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **delta}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO app_states (app_name, state) VALUES (?, ?)",
+                (app_name, json.dumps(merged)),
+            )
+        for (app_name, user_id), delta in user_states.items():
+            if not delta:
+                continue
+            row = self._conn.execute(
+                "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+                (app_name, user_id),
+            ).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **delta}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_states (app_name, user_id, state)"
+                " VALUES (?, ?, ?)",
+                (app_name, user_id, json.dumps(merged)),
+            )
+
+    async def ensure_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        """Create the session unless it already exists."""
+        key = (app_name, user_id, session_id)
+        if key in self._known:
+            self._known.move_to_end(key)
+            return
+        if key in self._pending_sessions:
+            return
+        exists = await self._db(
+            lambda: self._conn.execute(
+                "SELECT 1 FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                key,
+            ).fetchone()
+        )
+        if exists is None and key not in self._known:
+            try:
+                await self.create_session(
+                    app_name=app_name, user_id=user_id, session_id=session_id
+                )
+            except sqlite3.IntegrityError:
+                pass  # Created concurrently by another request.
+        self._remember(key)
+
+    @override
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        key = (app_name, user_id, session_id)
+        self._pending_events = [p for p in self._pending_events if p[0] != key]
+        self._pending_sessions.pop(key, None)
+        self._known.pop(key, None)
+        await self._db(self._delete_session, key)
+
+    def _delete_session(self, key: SessionKey) -> None:
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                key,
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                key,
+            )
+
+    async def compact_history(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        upto_event_id: str,
+        summary_event: Event,
+    ) -> bool:
+        """Replace all events up to and including `upto_event_id` with a summary.
+
+        Events appended after `upto_event_id` are kept.
+
+        Returns:
+            False if the session or event no longer exists.
+        """
+        await self.flush()
+        return await self._db(
+            self._compact_history,
+            (app_name, user_id, session_id),
+            upto_event_id,
+            summary_event,
+        )
+
+    def _compact_history(
+        self, key: SessionKey, upto_event_id: str, summary_event: Event
+    ) -> bool:
+        row = self._conn.execute(
+            "SELECT seq FROM events"
+            " WHERE app_name = ? AND user_id = ? AND session_id = ? AND id = ?",
+            (*key, upto_event_id),
+        ).fetchone()
+        if row is None:
+            return False
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM events"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq <= ?",
+                (*key, row[0]),
+            )
+            # Reuse the freed sequence number so the summary sorts first.
+            self._conn.execute(
+                "INSERT INTO events (app_name, user_id, session_id, seq, id,"
+                " timestamp, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *key,
+                    row[0],
+                    summary_event.id,
+                    summary_event.timestamp,
+                    summary_event.model_dump_json(exclude_none=True),
+                ),
+            )
+        return True
+
+    @override
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        self._pending_events.append(
+            (key, event.model_dump_json(exclude_none=True), event)
+        )
+        session_state = {
+            k: v
+            for k, v in session.state.items()
+            if not k.startswith(
+                (State.APP_PREFIX, State.USER_PREFIX, State.TEMP_PREFIX)
+            )
+        }
+        self._pending_sessions[key] = (json.dumps(session_state), event.timestamp)
+        if event.actions and event.actions.state_delta:
+            app_delta, user_delta, _ = split_state_delta(event.actions.state_delta)
+            if app_delta:
+                self._pending_app_states.setdefault(session.app_name, {}).update(
+                    app_delta
+                )
+            if user_delta:
+                self._pending_user_states.setdefault(
+                    (session.app_name, session.user_id), {}
+                ).update(user_delta)
+        self._schedule_flush()
+        return event
+
+    def _schedule_flush(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flush_wakeup = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+        if len(self._pending_events) >= self.batch_size:
+            self._flush_wakeup.set()
+
+    async def _flush_loop(self) -> None:
+        while self._pending_events or self._pending_sessions:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self._flush_pending()
+
+    async def _flush_pending(self) -> None:
+        if not (self._pending_events or self._pending_sessions):
+            return
+        events, self._pending_events = self._pending_events, []
+        sessions, self._pending_sessions = self._pending_sessions, {}
+        app_states, self._pending_app_states = self._pending_app_states, {}
+        user_states, self._pending_user_states = self._pending_user_states, {}
+        try:
+            await self._db(self._write_batch, events, sessions, app_states, user_states)
+        except Exception:
+            # Put the batch back so the next flush retries it.
+            self._pending_events[:0] = events
+            for key, value in sessions.items():
+                self._pending_sessions.setdefault(key, value)
+            # Deltas buffered since the batch was taken are newer and win.
+            for app_name, delta in app_states.items():
+                self._pending_app_states[app_name] = {
+                    **delta,
+                    **self._pending_app_states.get(app_name, {}),
+                }
+            for user_key, delta in user_states.items():
+                self._pending_user_states[user_key] = {
+                    **delta,
+                    **self._pending_user_states.get(user_key, {}),
+                }
+            raise
+        self.flushed_batches += 1
+        self.flushed_events += len(events)
+
+    def _write_batch(
+        self,
+        events: list[tuple[SessionKey, str, Event]],
+        sessions: dict[SessionKey, tuple[str, float]],
+        app_states: dict[str, dict[str, Any]],
+        user_states: dict[tuple[str, str], dict[str, Any]],
+    ) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO events (app_name, user_id, session_id, id, timestamp, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (*key, event.id, event.timestamp, data)
+                    for key, data, event in events
+                ],
+            )
+            self._conn.executemany(
+                "UPDATE sessions SET state = ?, update_time = ?"
+                " WHERE app_name = ? AND user_id = ? AND id = ?",
+                [(state, ts, *key) for key, (state, ts) in sessions.items()],
+            )
+            self._merge_scoped_states(app_states, user_states)
+
+    async def flush(self) -> None:
+        """Commit all buffered events now."""
+        await self._flush_pending()
+
+    async def close(self) -> None:
+        """Flush buffered events and close the database."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except (asyncio.CancelledError, Exception):
+                pass
+        await self.flush()
+        await self._db(self._conn.close)
+        self._executor.shutdown(wait=True)
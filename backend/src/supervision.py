@@ -0,0 +1,170 @@
+"""Stop agent runs when their client disconnects or their deadline passes."""
+
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable
+
+from starlette.requests import Request
+
+_END = object()
+
+
+class RunTimeout(Exception):
+    """Raised when an agent run exceeds its request deadline."""
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before the agent run finished."""
+
+
+async def wait_for_disconnect(request: Request, poll_interval: float = 0.1) -> None:
+    """Return once the client of a Starlette request has disconnected."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+
+class SupervisedRun:
+    """An agent run driven by its own task, stopped on disconnect or deadline.
+
+    The events of the run are pumped into a queue by a separate task, so the
+    run can be cancelled wherever it is waiting, including inside a model call
+    or a tool call, without involving the consumer. The run is cancelled when
+    `disconnected()` returns, when the deadline passes, or when the consumer
+    stops iterating early. With `max_buffered`, the run pauses once that many
+    events wait for the consumer, so a slow client holds back the agent
+    instead of letting events pile up in memory.
+    """
+
+    def __init__(
+        self,
+        events: AsyncIterator[Any],
+        disconnected: Callable[[], Awaitable[object]] | None = None,
+        timeout: float | None = None,
+        on_end: Callable[[str], None] | None = None,
+        max_buffered: int = 0,
+    ) -> None:
+        """Start driving `events`.
+
+        Args:
+            events: The events of the agent run.
+            disconnected: Returns once the client has gone away.
+            timeout: Seconds the run may take, or None for no deadline.
+            on_end: Called with the outcome once the run has ended.
+            max_buffered: Events buffered for the consumer, or 0 for no limit.
+        """
+        self.outcome: str | None = None
+        self.error: BaseException | None = None
+        self._on_end = on_end
+        self._ended = False
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_buffered)
+        loop = asyncio.get_running_loop()
+        self._task = loop.create_task(self._pump(events))
+        self._task.add_done_callback(self._finish)
+        self._watcher: asyncio.Task[None] | None = None
+        if disconnected is not None:
+            self._watcher = loop.create_task(self._watch(disconnected))
+        self._timer: asyncio.TimerHandle | None = None
+        if timeout:
+            self._timer = loop.call_later(timeout, self._stop, "timed_out")
+
+    async def _pump(self, events: AsyncIterator[Any]) -> None:
+        async for event in events:
+            await self._queue.put(event)
+
+    async def _watch(self, disconnected: Callable[[], Awaitable[object]]) -> None:
+        await disconnected()
+        self._stop("cancelled")
+
+    def _stop(self, outcome: str) -> None:
+        if not self._task.done():
+            self.outcome = self.outcome or outcome
+            self._task.cancel()
+
+    def _finish(self, task: asyncio.Task[None]) -> None:
+        if task.cancelled():
+            self.outcome = self.outcome or "cancelled"
+        elif task.exception() is not None:
+            self.error = task.exception()
+            self.outcome = "failed"
+        else:
+            self.outcome = "completed"
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._watcher is not None:
+            self._watcher.cancel()
+        self._ended = True
+        if not self._queue.full():
+            self._queue.put_nowait(_END)
+        # Otherwise the consumer sees `_ended` once it has drained the queue.
+        if self._on_end is not None:
+            self._on_end(self.outcome)
+
+    def cancel(self) -> None:
+        """Cancel the run, e.g. because the client went away."""
+        self._stop("cancelled")
+
+    async def events(self) -> AsyncGenerator[Any, None]:
+        """Yield the run's events.
+
+        Raises:
+            RunTimeout: If the deadline passed before the run finished.
+            ClientDisconnected: If the run was cancelled.
+            Exception: Whatever error the run itself failed with.
+        """
+        try:
+            while not (self._ended and self._queue.empty()):
+                event = await self._queue.get()
+                if event is _END:
+                    break
+                yield event
+        finally:
+            # Stopping early, e.g. because the response was cancelled.
+            self.cancel()
+        if self.outcome == "timed_out":
+            raise RunTimeout("Agent run timed out")
+        if self.outcome == "cancelled":
+            raise ClientDisconnected("Client disconnected")
+        if self.error is not None:
+            raise self.error
+
+
+class RunSupervisor:
+    """Starts supervised agent runs and counts how they ended.
+
+    Runs are given a deadline of `timeout` seconds (0 disables it); a request
+    may ask for a shorter one, never a longer one.
+    """
+
+    def __init__(self, timeout: float = 120.0) -> None:
+        """Create a supervisor giving runs `timeout` seconds by default."""
+        self.timeout = timeout
+        self.outcomes = {"completed": 0, "failed": 0, "cancelled": 0, "timed_out": 0}
+
+    def deadline(self, requested: str | None) -> float | None:
+        """Return the deadline of a run, honoring a requested shorter one."""
+        timeout = self.timeout or None
+        try:
+            seconds = float(requested) if requested else None
+        except ValueError:
+            seconds = None
+        if seconds is not None and seconds > 0:
+            timeout = min(timeout, seconds) if timeout else seconds
+        return timeout
+
+    def start(
+        self,
+        events: AsyncIterator[Any],
+        disconnected: Callable[[], Awaitable[object]] | None = None,
+        timeout: float | None = None,
+        max_buffered: int = 0,
+    ) -> SupervisedRun:
+        """Start driving `events` and return the supervised run."""
+        return SupervisedRun(
+            events, disconnected, timeout, on_end=self._count, max_buffered=max_buffered
+        )
+
+    def _count(self, outcome: str) -> None:
+        self.outcomes[outcome] += 1
+
+    def stats(self) -> dict[str, int]:
+        """Return how many runs completed, failed, were cancelled or timed out."""
+        return dict(self.outcomes)
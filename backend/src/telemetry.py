@@ -0,0 +1,359 @@
+"""Structured JSON-lines logging and trace spans written off the event loop."""
+
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from types import TracebackType
+from typing import Any, TextIO, Type
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.metrics import InFlight, tool_call_key
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+@dataclass
+class Span:
+    """A timed operation within a trace (request, route, agent, tool...)."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    sampled: bool
+    attributes: dict[str, Any] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+    start_time: float = field(default_factory=time.time)
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class _SpanScope:
+    """Context manager that makes a span current and records it on exit.
+
+    The previous span is restored with set() rather than a reset token, so a
+    scope may be left from another task (e.g. around a yield in an async
+    generator that is driven elsewhere).
+    """
+
+    def __init__(self, telemetry: "Telemetry", span: Span) -> None:
+        """Create a scope for `span`, recorded with `telemetry`."""
+        self._telemetry = telemetry
+        self.span = span
+        self._previous: Span | None = None
+
+    def __enter__(self) -> Span:
+        """Make the span current and return it."""
+        self._previous = _current_span.get()
+        _current_span.set(self.span)
+        return self.span
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Restore the previous span and record this one with any error."""
+        _current_span.set(self._previous)
+        self._telemetry.end_span(self.span, error=exc)
+
+
+class Telemetry:
+    """Structured JSON-lines logs and trace spans, written off the event loop.
+
+    Logging a record only builds a dict and puts it on a bounded queue; a
+    background thread serializes records and writes them to stdout or a file,
+    so log volume does not add to request latency. When the queue is full,
+    records are dropped and counted instead of blocking.
+
+    Records at INFO and above are always written. Debug records and spans are
+    sampled per trace with `sample_rate`, so a sampled request keeps all of
+    its spans. String fields are truncated to `max_field_chars`, and a file
+    sink is rotated to `<path>.1` once it reaches `max_file_bytes`. The level
+    and sample rate can be changed at runtime with `configure()`.
+    """
+
+    def __init__(
+        self,
+        sink: str = "stdout",
+        level: str = "INFO",
+        sample_rate: float = 1.0,
+        max_queue: int = 10000,
+        max_field_chars: int = 2000,
+        max_file_bytes: int = 50_000_000,
+    ) -> None:
+        """Create a logger; its writer thread starts with the first record.
+
+        Args:
+            sink: "stdout" or the path of a file to append to.
+            level: Lowest level written, e.g. "INFO".
+            sample_rate: Share of traces whose debug records and spans are kept.
+            max_queue: Records waiting for the writer before new ones are dropped.
+            max_field_chars: Length string fields are truncated to.
+            max_file_bytes: Size at which a file sink is rotated.
+        """
+        self.sink = sink
+        self.level = LEVELS[level.upper()]
+        self.sample_rate = sample_rate
+        self.max_field_chars = max_field_chars
+        self.max_file_bytes = max_file_bytes
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=max_queue)
+        self._writer: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def configure(
+        self, level: str | None = None, sample_rate: float | None = None
+    ) -> None:
+        """Change the log level and/or the sample rate at runtime."""
+        if level is not None:
+            self.level = LEVELS[level.upper()]
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, sample_rate))
+
+    def enabled(self, level: str) -> bool:
+        """Return whether records of `level` would currently be written."""
+        if LEVELS[level] < self.level:
+            return False
+        if LEVELS[level] >= LEVELS["INFO"]:
+            return True
+        span = _current_span.get()
+        return span.sampled if span is not None else random.random() < self.sample_rate
+
+    def log(self, level: str, message: str, **fields: Any) -> None:
+        """Queue a log record, attaching the current trace and span IDs."""
+        if not self.enabled(level):
+            return
+        record: dict[str, Any] = {"ts": time.time(), "level": level, "msg": message}
+        span = _current_span.get()
+        if span is not None:
+            record["trace_id"] = span.trace_id
+            record["span_id"] = span.span_id
+        record.update(fields)
+        self._emit(record)
+
+    def debug(self, message: str, **fields: Any) -> None:
+        """Log `message` with `fields` at DEBUG level."""
+        self.log("DEBUG", message, **fields)
+
+    def info(self, message: str, **fields: Any) -> None:
+        """Log `message` with `fields` at INFO level."""
+        self.log("INFO", message, **fields)
+
+    def warning(self, message: str, **fields: Any) -> None:
+        """Log `message` with `fields` at WARNING level."""
+        self.log("WARNING", message, **fields)
+
+    def error(self, message: str, **fields: Any) -> None:
+        """Log `message` with `fields` at ERROR level."""
+        self.log("ERROR", message, **fields)
+
+    def start_span(
+        self, name: str, parent: Span | None = None, **attributes: Any
+    ) -> Span:
+        """Start a span under `parent` or the current span, without entering it."""
+        parent = parent if parent is not None else _current_span.get()
+        if parent is None:
+            trace_id, parent_id = uuid.uuid4().hex, None
+            sampled = random.random() < self.sample_rate
+        else:
+            trace_id, parent_id, sampled = (
+                parent.trace_id,
+                parent.span_id,
+                parent.sampled,
+            )
+        return Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent_id,
+            sampled=sampled,
+            attributes=attributes,
+        )
+
+    def end_span(self, span: Span, error: BaseException | None = None) -> None:
+        """Queue a finished span record."""
+        if not span.sampled:
+            return
+        if error is None and self.level > LEVELS["DEBUG"]:
+            # Spans are debug output; failed spans are kept at any level.
+            return
+        record: dict[str, Any] = {
+            "ts": span.start_time,
+            "level": "ERROR" if error is not None else "DEBUG",
+            "span": span.name,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "duration_ms": round((time.perf_counter() - span.started) * 1000, 3),
+            **span.attributes,
+        }
+        if error is not None:
+            record["error"] = repr(error)
+        self._emit(record)
+
+    def span(self, name: str, **attributes: Any) -> _SpanScope:
+        """Return a context manager timing a child span of the current span."""
+        return _SpanScope(self, self.start_span(name, **attributes))
+
+    def current_span(self) -> Span | None:
+        """Return the span of the current context, if any."""
+        return _current_span.get()
+
+    def _emit(self, record: dict[str, Any]) -> None:
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self) -> None:
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="telemetry-writer", daemon=True
+                )
+                self._writer.start()
+
+    def _truncate(self, record: dict[str, Any]) -> dict[str, Any]:
+        limit = self.max_field_chars
+        for key, value in record.items():
+            if isinstance(value, str) and len(value) > limit:
+                record[key] = value[:limit] + f"...[{len(value) - limit} more]"
+        return record
+
+    def _open(self) -> TextIO:
+        if self.sink == "stdout":
+            return sys.stdout
+        return open(self.sink, "a", encoding="utf-8")
+
+    def _write_loop(self) -> None:
+        out = self._open()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [json.dumps(self._truncate(r), default=str) for r in batch]
+            try:
+                out.write("\n".join(lines) + "\n")
+                out.flush()
+                self.written += len(lines)
+                if out is not sys.stdout and out.tell() >= self.max_file_bytes:
+                    out.close()
+                    os.replace(self.sink, self.sink + ".1")
+                    out = self._open()
+            except (OSError, ValueError) as e:
+                sys.stderr.write(f"telemetry: write failed: {e}\n")
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until every queued record has been written."""
+        if self._writer is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def stats(self) -> dict[str, Any]:
+        """Return the current settings and written/dropped counters."""
+        level = next(name for name, value in LEVELS.items() if value == self.level)
+        return {
+            "level": level,
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+telemetry = Telemetry(
+    sink=os.getenv("LOG_SINK", "stdout"),
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0")),
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    max_field_chars=int(os.getenv("LOG_MAX_FIELD_CHARS", "2000")),
+    max_file_bytes=int(os.getenv("LOG_MAX_FILE_BYTES", "50000000")),
+)
+
+
+class TraceMiddleware:
+    """ASGI middleware that wraps every HTTP request in a "request" span.
+
+    The span stays current while the app handles the request, so spans started
+    by handlers and agent runs become its children, and it ends once the
+    response, including a streamed body, has been sent.
+    """
+
+    def __init__(self, app: ASGIApp, telemetry: Telemetry) -> None:
+        """Wrap `app`, recording its request spans with `telemetry`."""
+        self.app = app
+        self.telemetry = telemetry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle the request within a "request" span."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with self.telemetry.span(
+            "request", method=scope["method"], path=scope["path"]
+        ) as span:
+
+            async def send_traced(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.attributes["status"] = message["status"]
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
+
+
+_tool_spans: InFlight = InFlight()
+
+
+def start_tool_span(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext
+) -> None:
+    """ADK before_tool_callback that opens a span for the tool call."""
+    _tool_spans[tool_call_key(tool_context)] = telemetry.start_span(
+        "tool", tool=tool.name, agent=tool_context.agent_name
+    )
+
+
+def end_tool_span(
+    tool: BaseTool,
+    args: dict[str, Any],
+    tool_context: ToolContext,
+    tool_response: Any,
+) -> None:
+    """ADK after_tool_callback that closes the tool call's span."""
+    span = _tool_spans.pop(tool_call_key(tool_context), None)
+    if span is not None:
+        telemetry.end_span(span)
+
+
+def fail_tool_span(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, error: Exception
+) -> None:
+    """ADK on_tool_error_callback that closes the span of a failed tool call."""
+    span = _tool_spans.pop(tool_call_key(tool_context), None)
+    if span is not None:
+        telemetry.end_span(span, error=error)
@@ -0,0 +1,116 @@
+"""Tests for admission control, rate limits and retries."""
+
+import asyncio
+
+import httpx
+import pytest
+from google.genai.errors import APIError
+
+from src.admission import (
+    AdmissionController,
+    ModelLimiter,
+    Overloaded,
+    TokenBucket,
+    is_retryable,
+    parse_rate_limits,
+    retry_after_header,
+    retry_after_hint,
+)
+
+
+def test_full_queue_is_rejected_with_retry_hint() -> None:
+    """Reject requests that find the queue full, with a Retry-After hint."""
+
+    async def scenario() -> tuple[AdmissionController, Overloaded]:
+        admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=1)
+        first = await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            await admission.acquire()
+        admission.release(first)
+        second = await waiting
+        admission.release(second)
+        return admission, rejected.value
+
+    admission, error = asyncio.run(scenario())
+    assert error.retry_after >= 1
+    assert admission.stats()["in_flight"] == 0
+    assert admission.stats()["admitted"] == 2
+    assert admission.stats()["rejected"] == 1
+
+
+def test_waiters_time_out_and_are_served_in_order() -> None:
+    """Time out waiters after the queue timeout and admit the rest in order."""
+
+    async def scenario() -> tuple[AdmissionController, list[str]]:
+        admission = AdmissionController(
+            max_in_flight=1, max_queue=4, queue_timeout=0.05
+        )
+        slot = await admission.acquire()
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        order: list[str] = []
+
+        async def wait(name: str) -> None:
+            admitted_at = await admission.acquire()
+            order.append(name)
+            admission.release(admitted_at)
+
+        waiters = [asyncio.create_task(wait(n)) for n in "abc"]
+        await asyncio.sleep(0)
+        admission.release(slot)
+        await asyncio.gather(*waiters)
+        return admission, order
+
+    admission, order = asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+    assert admission.stats()["timed_out"] == 1
+    assert admission.stats()["waiting"] == admission.stats()["in_flight"] == 0
+
+
+def test_token_bucket_spaces_out_calls_beyond_burst() -> None:
+    """Delay calls beyond the burst by the refill time of their token."""
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0
+
+
+def test_backoff_honors_retry_after_hint() -> None:
+    """Never back off for less than the server's hint or more than the cap."""
+    limiter = ModelLimiter(base_delay=0.5, max_delay=8)
+    assert all(0 <= limiter.backoff(3, None) <= 4 for _ in range(50))
+    assert limiter.backoff(0, 5) >= 5
+    assert limiter.backoff(0, 60) == 8
+
+
+def test_retryable_errors_and_hints() -> None:
+    """Retry quota, 5xx and network errors and read Gemini's retry delay."""
+    quota = APIError(
+        429,
+        {
+            "error": {
+                "message": "Resource exhausted",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [
+                    {
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": "7s",
+                    }
+                ],
+            }
+        },
+    )
+    assert is_retryable(quota)
+    assert retry_after_hint(quota) == 7
+    assert not is_retryable(APIError(400, {"error": {"message": "bad request"}}))
+    assert is_retryable(httpx.ReadTimeout("slow"))
+    assert not is_retryable(ValueError("nope"))
+    assert parse_rate_limits("gemini-2.0-flash=5, other=0.5") == {
+        "gemini-2.0-flash": 5.0,
+        "other": 0.5,
+    }
+    assert retry_after_header(0.2) == "1"
+    assert retry_after_header(2.5) == "3"
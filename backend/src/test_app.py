@@ -0,0 +1,706 @@
+"""Tests for the FastAPI app, run against a fake tool-calling model."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, Iterable, Iterator
+
+import httpx
+import pytest
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from google.adk.agents import Agent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.sessions import Session
+from google.genai import types
+from pytest import MonkeyPatch
+from starlette.testclient import WebSocketTestSession
+from starlette.types import Message, Scope
+from starlette.websockets import WebSocketDisconnect
+from typing_extensions import override
+
+from src import app as app_module
+from src import metrics, telemetry
+from src.admission import AdmissionController
+from src.orchestrator import root_agent
+from src.utils import create_horse_fact
+
+MODEL_CALLS: list[LlmRequest] = []
+
+
+class FakeToolLlm(BaseLlm):
+    """Calls create_horse_fact, then streams a canned answer word by word."""
+
+    model: str = "fake-tool-llm"
+    answer: str = 'Fact: "horses" \\ run.\nDone'
+    delay: float = 0.0
+
+    @override
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        MODEL_CALLS.append(llm_request)
+        await asyncio.sleep(self.delay)
+        last = llm_request.contents[-1]
+        if not any(part.function_response for part in last.parts or []):
+            call = types.FunctionCall(name="create_horse_fact", args={})
+            yield LlmResponse(
+                content=types.Content(
+                    role="model", parts=[types.Part(function_call=call)]
+                )
+            )
+            return
+        if stream:
+            for word in self.answer.split(" "):
+                yield LlmResponse(
+                    content=types.Content(
+                        role="model", parts=[types.Part(text=word + " ")]
+                    ),
+                    partial=True,
+                )
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self.answer)]),
+            turn_complete=True,
+        )
+
+
+def texts(session: Session | None) -> list[str | None]:
+    """Return the text of the first part of each event in `session`."""
+    assert session is not None
+    return [
+        event.content.parts[0].text if event.content and event.content.parts else None
+        for event in session.events
+    ]
+
+
+def make_event(
+    text: str | None = None, partial: bool = False, call: str | None = None
+) -> Any:
+    """Return a stand-in for an ADK event holding `text` and/or a call of `call`."""
+    parts: list[Any] = []
+    if text is not None:
+        parts.append(
+            SimpleNamespace(
+                text=text, thought=None, function_call=None, function_response=None
+            )
+        )
+    if call is not None:
+        parts.append(
+            SimpleNamespace(
+                text=None,
+                thought=None,
+                function_call=SimpleNamespace(name=call),
+                function_response=None,
+            )
+        )
+    return SimpleNamespace(
+        author="agent", partial=partial, content=SimpleNamespace(parts=parts)
+    )
+
+
+async def _iterate(items: Iterable[Any]) -> AsyncGenerator[Any, None]:
+    for item in items:
+        yield item
+
+
+def collect_parts(events: list[Any]) -> list[str]:
+    """Return the data stream parts `stream_agent_parts` makes of `events`."""
+
+    async def _collect() -> list[str]:
+        return [part async for part in app_module.stream_agent_parts(_iterate(events))]
+
+    return asyncio.run(_collect())
+
+
+def test_partial_deltas_are_forwarded_and_final_aggregate_skipped() -> None:
+    """Stream partial deltas and skip the aggregate that closes the turn."""
+    events = [
+        make_event("Hel", partial=True),
+        make_event("lo", partial=True),
+        make_event("Hello"),
+    ]
+    assert collect_parts(events) == ['0:"Hel"\n', '0:"lo"\n']
+
+
+def test_final_event_forwarded_when_nothing_streamed() -> None:
+    """Forward a final event when nothing was streamed for its turn."""
+    assert collect_parts([make_event('say "hi"\n')]) == ['0:"say \\"hi\\"\\n"\n']
+
+
+def test_tool_calls_become_progress_parts() -> None:
+    """Turn tool calls into `2:` progress parts."""
+    parts = collect_parts([make_event(call="roll_a_dice"), make_event("4")])
+    assert json.loads(parts[0][2:]) == [
+        {"type": "tool_call", "tool": "roll_a_dice", "agent": "agent"}
+    ]
+    assert parts[1] == '0:"4"\n'
+
+
+@pytest.fixture(scope="module")
+def client() -> Iterator[TestClient]:
+    """Yield a client for the app, with the custom agent using FakeToolLlm."""
+    fake_agent = Agent(
+        name="custom_tools_agent",
+        model=FakeToolLlm(),
+        tools=[create_horse_fact],
+        before_tool_callback=[metrics.before_tool, telemetry.start_tool_span],
+        after_tool_callback=[metrics.after_tool, telemetry.end_tool_span],
+    )
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(root_agent, "_custom", fake_agent)
+        with TestClient(app_module.app) as test_client:
+            yield test_client
+
+
+def test_ai_sdk_stream_forwards_deltas(client: TestClient) -> None:
+    """Stream the model's text deltas to AI SDK clients."""
+    response = client.post(
+        "/invoke", json={"messages": [{"role": "user", "content": "horse please"}]}
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0].startswith("2:")
+    assert lines[-1] == 'd:{"finishReason":"stop"}'
+    deltas = [json.loads(line[2:]) for line in lines if line.startswith("0:")]
+    assert len(deltas) > 1
+    assert "".join(deltas).strip() == FakeToolLlm().answer
+
+
+class UsageToolLlm(FakeToolLlm):
+    """FakeToolLlm whose responses report token usage."""
+
+    @override
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        async for response in super().generate_content_async(llm_request, stream):
+            if not response.partial:
+                response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+                    prompt_token_count=10, candidates_token_count=3
+                )
+            yield response
+
+
+def test_ai_sdk_finish_part_reports_token_usage(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Report the token usage of all model calls in the finish part."""
+    app_module.response_cache._entries.clear()
+    usage_agent = Agent(
+        name="custom_tools_agent", model=UsageToolLlm(), tools=[create_horse_fact]
+    )
+    monkeypatch.setattr(root_agent, "_custom", usage_agent)
+    response = client.post(
+        "/invoke", json={"messages": [{"role": "user", "content": "horse usage"}]}
+    )
+    finish = response.text.splitlines()[-1]
+    # One tool call turn and one answer turn.
+    assert json.loads(finish[2:]) == {
+        "finishReason": "stop",
+        "usage": {"promptTokens": 20, "completionTokens": 6},
+    }
+    assert response.headers["x-vercel-ai-data-stream"] == "v1"
+    assert response.headers["access-control-allow-origin"] == "http://localhost:5173"
+
+
+def test_legacy_json_returns_final_text(client: TestClient) -> None:
+    """Answer legacy requests with the final response text."""
+    response = client.post("/invoke", json={"query": "horse please"})
+    assert response.status_code == 200
+    assert response.json() == {"response": FakeToolLlm().answer}
+
+
+def test_fast_path_answers_without_model_call(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Answer single dice rolls on the fast path, multiple with the model."""
+    monkeypatch.setattr(root_agent, "_fast_path_routes", {"dice"})
+    before = client.get("/routing/stats").json()["fast_path_answers"]
+    response = client.post("/invoke", json={"query": "roll a dice"})
+    two_dice = client.post("/invoke", json={"query": "roll two dice"})
+    assert response.json()["response"] in {f"You rolled a {n}." for n in range(1, 7)}
+    assert client.get("/routing/stats").json()["fast_path_answers"] == before + 1
+    # Multiple dice need more than one tool call, so the LLM route is used.
+    assert two_dice.json()["response"] == FakeToolLlm().answer
+
+
+def test_repeated_queries_are_served_from_cache(client: TestClient) -> None:
+    """Serve repeated first-turn queries from the response cache."""
+    app_module.response_cache._entries.clear()
+    payload = {"messages": [{"role": "user", "content": "Horse   facts?"}]}
+    first = client.post("/invoke", json=payload)
+    second = client.post("/invoke", json={"query": "horse facts"})
+    streamed = client.post("/invoke", json=payload)
+    bypassed = client.post(
+        "/invoke", json={"query": "horse facts"}, headers={"Cache-Control": "no-cache"}
+    )
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == {"response": FakeToolLlm().answer}
+    assert streamed.headers["X-Cache"] == "HIT"
+    assert (
+        streamed.text
+        == f"0:{json.dumps(FakeToolLlm().answer)}\n" + 'd:{"finishReason":"stop"}\n'
+    )
+    assert bypassed.headers["X-Cache"] == "MISS"
+
+
+def test_follow_up_turns_skip_cache_and_see_cached_turn(client: TestClient) -> None:
+    """Run follow-ups on the model, with cached turns in the history."""
+    app_module.response_cache._entries.clear()
+    client.post("/invoke", json={"query": "horse trivia"})
+    hit = client.post(
+        "/invoke",
+        json={
+            "id": "chat-1",
+            "messages": [{"role": "user", "content": "horse trivia"}],
+        },
+    )
+    assert hit.headers["X-Cache"] == "HIT"
+    follow_up = client.post(
+        "/invoke",
+        json={
+            "id": "chat-1",
+            "messages": [
+                {"role": "user", "content": "horse trivia"},
+                {"role": "assistant", "content": FakeToolLlm().answer},
+                {"role": "user", "content": "horse trivia"},
+            ],
+        },
+    )
+    assert follow_up.headers["X-Cache"] == "MISS"
+    session = asyncio.run(
+        app_module.session_service.get_session(
+            app_name=app_module.APP_NAME,
+            user_id=app_module.USER_ID,
+            session_id="chat-1",
+        )
+    )
+    assert texts(session)[:2] == ["horse trivia", FakeToolLlm().answer]
+    # The app passes the route it matched on to the orchestrator.
+    assert session and session.events[-1].custom_metadata == {"route": "horse"}
+
+
+def test_identical_concurrent_requests_share_one_run(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Let identical concurrent queries share one agent run."""
+    app_module.response_cache._entries.clear()
+    slow_agent = Agent(
+        name="custom_tools_agent",
+        model=FakeToolLlm(delay=0.05),
+        tools=[create_horse_fact],
+    )
+    monkeypatch.setattr(root_agent, "_custom", slow_agent)
+    monkeypatch.setattr(app_module, "RESPONSE_CACHE_ENABLED", False)
+    MODEL_CALLS.clear()
+    coalesced_before = app_module.single_flight.coalesced
+
+    async def scenario() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            responses = await asyncio.gather(
+                ac.post("/invoke", json={"query": "horse now"}),
+                ac.post("/invoke", json={"query": "Horse now?"}),
+                ac.post(
+                    "/invoke",
+                    json={
+                        "id": "c3",
+                        "messages": [{"role": "user", "content": "horse now"}],
+                    },
+                ),
+            )
+        return list(responses)
+
+    legacy_a, legacy_b, streamed = asyncio.run(scenario())
+    assert legacy_a.json() == legacy_b.json() == {"response": FakeToolLlm().answer}
+    deltas = [
+        json.loads(line[2:])
+        for line in streamed.text.splitlines()
+        if line.startswith("0:")
+    ]
+    assert "".join(deltas).strip() == FakeToolLlm().answer
+    # One tool-call turn plus one answer turn for all three requests.
+    assert len(MODEL_CALLS) == 2
+    assert app_module.single_flight.coalesced - coalesced_before == 2
+    follower = asyncio.run(
+        app_module.session_service.get_session(
+            app_name=app_module.APP_NAME, user_id=app_module.USER_ID, session_id="c3"
+        )
+    )
+    assert texts(follower)[-1] == FakeToolLlm().answer
+
+
+def test_overloaded_server_answers_503_with_retry_after(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Reject requests beyond the admission queue with a 503."""
+    app_module.response_cache._entries.clear()
+    busy = AdmissionController(max_in_flight=1, max_queue=0)
+    busy.in_flight = 1
+    monkeypatch.setattr(app_module, "admission", busy)
+    legacy = client.post("/invoke", json={"query": "horse overload"})
+    streamed = client.post(
+        "/invoke", json={"messages": [{"role": "user", "content": "horse overload"}]}
+    )
+    for response in (legacy, streamed):
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/admission/stats").json()["rejected"] == 2
+
+
+def test_runs_past_their_deadline_end_with_timeout(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """End runs past their deadline and give their slot back."""
+    app_module.response_cache._entries.clear()
+    slow_agent = Agent(
+        name="custom_tools_agent",
+        model=FakeToolLlm(delay=0.5),
+        tools=[create_horse_fact],
+    )
+    monkeypatch.setattr(root_agent, "_custom", slow_agent)
+    timed_out_before = app_module.supervisor.stats()["timed_out"]
+    headers = {"X-Request-Timeout": "0.1"}
+    legacy = client.post("/invoke", json={"query": "horse slow"}, headers=headers)
+    streamed = client.post(
+        "/invoke",
+        json={"messages": [{"role": "user", "content": "horse slower"}]},
+        headers=headers,
+    )
+    assert legacy.status_code == 504
+    assert legacy.json()["finishReason"] == "timeout"
+    assert streamed.text.splitlines()[-1] == 'd:{"finishReason":"error"}'
+    assert streamed.text.splitlines()[-2].startswith("3:")
+    assert client.get("/runs/stats").json()["timed_out"] - timed_out_before == 2
+    # Cancelled runs give their admission slot back.
+    assert client.get("/admission/stats").json()["in_flight"] == 0
+
+
+def test_metrics_record_stages_and_tools_per_format(client: TestClient) -> None:
+    """Record stage and tool metrics for each response format."""
+    app_module.response_cache._entries.clear()
+    client.post("/invoke", json={"query": "horse metrics"})
+    client.post(
+        "/invoke", json={"messages": [{"role": "user", "content": "horse metrics 2"}]}
+    )
+    for stage in ("parse", "routing", "first_model_event", "final_response"):
+        for response_format in ("legacy", "ai_sdk"):
+            labels = (stage, "horse", "custom", response_format)
+            assert metrics.STAGE_SECONDS.count(labels) >= 1
+    assert (
+        metrics.STAGE_SECONDS.count(("stream_flush", "horse", "custom", "ai_sdk")) >= 1
+    )
+    tool = ("create_horse_fact", "custom_tools_agent", "horse", "legacy")
+    assert metrics.TOOL_SECONDS.count(tool) >= 1
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'invoke_stage_seconds_count{stage="parse",route="horse",agent="custom",format="ai_sdk"}'
+        in response.text
+    )
+    assert 'agent_tool_seconds_bucket{tool="create_horse_fact"' in response.text
+
+
+def test_debug_level_traces_request_route_agent_and_tool(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Trace route, agent and tool spans at DEBUG without user content."""
+    app_module.response_cache._entries.clear()
+    records: list[dict[str, Any]] = []
+    monkeypatch.setattr(telemetry.telemetry, "_emit", records.append)
+    monkeypatch.setattr(app_module, "LOG_ADMIN_TOKEN", "secret")
+    admin = {"Authorization": "Bearer secret"}
+    settings = client.post(
+        "/logging", json={"level": "DEBUG", "sample_rate": 1}, headers=admin
+    )
+    assert settings.json()["level"] == "DEBUG"
+    try:
+        client.post("/invoke", json={"query": "horse tracing"})
+    finally:
+        client.post("/logging", json={"level": "INFO"}, headers=admin)
+    spans = {r["span"]: r for r in records if "span" in r}
+    request = next(r for r in records if r.get("path") == "/invoke")
+    assert spans["route"]["parent_id"] == request["span_id"]
+    assert spans["agent"]["parent_id"] == spans["route"]["parent_id"]
+    assert spans["tool"]["tool"] == "create_horse_fact"
+    assert spans["tool"]["trace_id"] == request["trace_id"]
+    assert any(r.get("msg") == "Model event" for r in records)
+    # User content is never logged.
+    assert "horse tracing" not in json.dumps(records)
+
+
+def test_logging_settings_need_the_admin_token_and_valid_values(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Refuse log setting changes without the token or with invalid values."""
+    monkeypatch.setattr(app_module, "LOG_ADMIN_TOKEN", "")
+    assert client.post("/logging", json={"level": "INFO"}).status_code == 403
+    monkeypatch.setattr(app_module, "LOG_ADMIN_TOKEN", "secret")
+    wrong = {"Authorization": "Bearer guess"}
+    assert client.post("/logging", json={}, headers=wrong).status_code == 401
+    admin = {"Authorization": "Bearer secret"}
+    for body in (
+        [1],
+        "DEBUG",
+        {"level": "LOUD"},
+        {"sample_rate": "x"},
+        {"sample_rate": -1},
+        {"sample_rate": 5},
+        {"sample_rate": True},
+    ):
+        response = client.post("/logging", json=body, headers=admin)
+        assert response.status_code == 400, body
+    not_json = client.post("/logging", content=b"{", headers=admin)
+    assert not_json.status_code == 400
+    rate = telemetry.telemetry.sample_rate
+    accepted = client.post("/logging", json={"sample_rate": rate}, headers=admin)
+    assert accepted.status_code == 200
+
+
+def test_batch_streams_ndjson_results_with_per_item_errors(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Stream batch results in completion order, with per-item errors."""
+    app_module.response_cache._entries.clear()
+    slow_agent = Agent(
+        name="custom_tools_agent",
+        model=FakeToolLlm(delay=0.02),
+        tools=[create_horse_fact],
+    )
+    monkeypatch.setattr(root_agent, "_custom", slow_agent)
+    response = client.post(
+        "/invoke/batch",
+        json={
+            "items": [
+                {"query": "horse batch one", "id": "a"},
+                {"id": "empty"},
+                "horse batch two",
+                {"query": "horse batch one", "conversation_id": "batch-c", "id": "c"},
+            ],
+            "concurrency": 2,
+        },
+    )
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results, summary = lines[:-1], lines[-1]
+    assert summary["done"] and summary["items"] == 4 and summary["errors"] == 1
+    by_index = {result["index"]: result for result in results}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[0]["id"] == "a"
+    assert by_index[0]["response"] == FakeToolLlm().answer
+    assert by_index[3]["conversation_id"] == "batch-c"
+    assert by_index[1] == {
+        "index": 1,
+        "conversation_id": by_index[1]["conversation_id"],
+        "id": "empty",
+        "error": "No query provided",
+        "status": 400,
+        "elapsed_ms": by_index[1]["elapsed_ms"],
+    }
+    # The invalid item finishes first: results arrive in completion order.
+    assert results[0]["index"] == 1
+    assert all("elapsed_ms" in result for result in results)
+
+    # Repeated first-turn items are answered from the response cache.
+    again = client.post("/invoke/batch", json={"queries": ["horse batch two"]})
+    assert json.loads(again.text.splitlines()[0])["cache"] == "HIT"
+    assert client.post("/invoke/batch", json={"items": []}).status_code == 400
+
+
+def test_batch_rejects_malformed_bodies(client: TestClient) -> None:
+    """Reject batch bodies that are not a valid batch."""
+    for body in (["horse"], {"items": ["horse"], "concurrency": "many"}):
+        response = client.post("/invoke/batch", json=body)
+        assert response.status_code == 400
+        assert "error" in response.json()
+    response = client.post("/invoke/batch", content=b"{not json")
+    assert response.status_code == 400
+
+
+def test_batch_compacts_sessions_after_the_response(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Compact each batch session once, after the response."""
+    app_module.response_cache._entries.clear()
+    compacted: list[str] = []
+
+    async def compact(app_name: str, user_id: str, session_id: str) -> None:
+        compacted.append(session_id)
+
+    monkeypatch.setattr(app_module, "COMPACTION_ENABLED", True)
+    monkeypatch.setattr(app_module.compactor, "compact", compact)
+    items = [
+        {"query": "horse batch compact", "conversation_id": "batch-k"},
+        {"query": "horse batch compact again", "conversation_id": "batch-k"},
+    ]
+    response = client.post("/invoke/batch", json={"items": items, "concurrency": 1})
+    assert json.loads(response.text.splitlines()[0])["response"] == FakeToolLlm().answer
+    # Run as the response's background task, once per session.
+    assert compacted == ["batch-k"]
+
+
+def receive_until_done(
+    websocket: WebSocketTestSession, request_ids: list[str]
+) -> dict[str, list[dict[str, Any]]]:
+    """Collect WebSocket messages per request_id until every turn has ended."""
+    messages: dict[str, list[dict[str, Any]]] = {}
+    open_turns = set(request_ids)
+    while open_turns:
+        message = websocket.receive_json()
+        messages.setdefault(message["request_id"], []).append(message)
+        if message["type"] in ("done", "error"):
+            open_turns.discard(message["request_id"])
+    return messages
+
+
+def test_websocket_multiplexes_conversations_and_cancels_turns(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    """Run concurrent turns over one WebSocket and cancel one."""
+    app_module.response_cache._entries.clear()
+    slow_agent = Agent(
+        name="custom_tools_agent",
+        model=FakeToolLlm(delay=0.05),
+        tools=[create_horse_fact],
+    )
+    monkeypatch.setattr(root_agent, "_custom", slow_agent)
+    cancelled_before = app_module.supervisor.stats()["cancelled"]
+    with client.websocket_connect("/ws") as websocket:
+        for request_id, conversation_id in (("r1", "ws-a"), ("r2", "ws-b")):
+            websocket.send_json(
+                {
+                    "type": "invoke",
+                    "request_id": request_id,
+                    "conversation_id": conversation_id,
+                    "query": "horse over websocket",
+                }
+            )
+        websocket.send_json(
+            {"type": "invoke", "request_id": "r3", "query": "horse slow"}
+        )
+        websocket.send_json({"type": "cancel", "request_id": "r3"})
+        websocket.send_json({"type": "bogus"})
+        messages = receive_until_done(websocket, ["r1", "r2", "r3"])
+
+    for request_id, conversation_id in (("r1", "ws-a"), ("r2", "ws-b")):
+        turn = messages[request_id]
+        assert turn[0] == {
+            "type": "start",
+            "conversation_id": conversation_id,
+            "request_id": request_id,
+        }
+        assert turn[1]["type"] == "progress"
+        text = "".join(m["text"] for m in turn if m["type"] == "text")
+        assert text.strip() == FakeToolLlm().answer
+        assert turn[-1]["finishReason"] == "stop"
+    assert messages["r3"][-1]["finishReason"] == "cancelled"
+    assert app_module.supervisor.stats()["cancelled"] - cancelled_before == 1
+    assert client.get("/admission/stats").json()["in_flight"] == 0
+    session = asyncio.run(
+        app_module.session_service.get_session(
+            app_name=app_module.APP_NAME, user_id=app_module.USER_ID, session_id="ws-b"
+        )
+    )
+    assert texts(session)[0] == "horse over websocket"
+
+
+def test_sse_channel_requires_an_open_stream(client: TestClient) -> None:
+    """Reject messages to SSE channels that are not open."""
+    response = client.post(
+        "/channels/nobody/", json={"type": "invoke", "query": "horse"}
+    )
+    assert response.status_code == 404
+    missing = client.post("/channels/nobody", json={"type": "invoke", "query": "horse"})
+    assert missing.status_code == 404
+    assert missing.json() == {"error": "No open channel: nobody"}
+
+
+def channel_request(
+    method: str,
+    path: str,
+    body: dict[str, Any] | None = None,
+    headers: dict[str, str] | None = None,
+) -> Request:
+    """Return a Request for a direct call of a channel endpoint."""
+
+    async def receive() -> Message:
+        return {
+            "type": "http.request",
+            "body": json.dumps(body).encode(),
+            "more_body": False,
+        }
+
+    scope: Scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(k.encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    return Request(scope, receive)
+
+
+def test_sse_channel_streams_answers_to_its_own_client_only(client: TestClient) -> None:
+    """Accept messages only with the token the channel opened with."""
+    app_module.response_cache._entries.clear()
+    message = {
+        "type": "invoke",
+        "request_id": "r1",
+        "conversation_id": "sse-a",
+        "query": "horse over sse",
+    }
+
+    async def scenario() -> tuple[int, int, int, list[dict[str, Any]]]:
+        # The stream is infinite, so the endpoints are called directly.
+        stream = await app_module.channel_events(channel_request("GET", "/"), "tab")
+        assert isinstance(stream, StreamingResponse)
+        events: Any = stream.body_iterator
+        assert await anext(events) == ": connected\n\n"
+        opened = json.loads((await anext(events)).removeprefix("data: "))
+        token = opened.pop("token")
+        assert opened == {"type": "open", "channel_id": "tab"}
+
+        foreign = await app_module.channel_events(channel_request("GET", "/"), "tab")
+        guessed = await app_module.channel_message(
+            channel_request("POST", "/", message, {"x-channel-token": "guess"}), "tab"
+        )
+        accepted = await app_module.channel_message(
+            channel_request("POST", "/", message, {"x-channel-token": token}), "tab"
+        )
+        messages: list[dict[str, Any]] = []
+        while not messages or messages[-1]["type"] not in ("done", "error"):
+            messages.append(json.loads((await anext(events)).removeprefix("data: ")))
+        await events.aclose()
+        return foreign.status_code, guessed.status_code, accepted.status_code, messages
+
+    foreign, guessed, accepted, messages = asyncio.run(scenario())
+    assert (foreign, guessed, accepted) == (403, 403, 202)
+    assert messages[0] == {
+        "type": "start",
+        "conversation_id": "sse-a",
+        "request_id": "r1",
+    }
+    text = "".join(m["text"] for m in messages if m["type"] == "text")
+    assert text.strip() == FakeToolLlm().answer
+    assert messages[-1]["finishReason"] == "stop"
+    assert len(app_module.channels) == 0
+
+
+def test_websocket_rejects_foreign_origins(client: TestClient) -> None:
+    """Close WebSockets opened from origins that are not allowed."""
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(
+            "/ws", headers={"origin": "https://evil.example"}
+        ):
+            pass
+    assert closed.value.code == 1008
+    with client.websocket_connect(
+        "/ws", headers={"origin": "http://localhost:5173"}
+    ) as ws:
+        ws.send_json({"type": "bogus", "request_id": "x"})
+        assert ws.receive_json()["type"] == "error"
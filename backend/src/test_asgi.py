@@ -0,0 +1,129 @@
+"""Tests for the lazily loading ASGI entry point."""
+
+import asyncio
+import json
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from fastapi import FastAPI
+
+from src.asgi import ASGIApp, LazyApp, Message, Scope
+
+WARM_UP = asyncio.Event()
+EVENTS: list[str] = []
+
+
+@asynccontextmanager
+async def slow_lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Start once WARM_UP is set, recording startup and shutdown."""
+    await WARM_UP.wait()
+    EVENTS.append("started")
+    yield
+    EVENTS.append("stopped")
+
+
+slow_app = FastAPI(lifespan=slow_lifespan)
+
+
+@slow_app.get("/hello")
+async def hello() -> dict[str, str]:
+    """Greet the world."""
+    return {"hello": "world"}
+
+
+async def call(app: ASGIApp, path: str) -> tuple[int, Any]:
+    """Send a GET request straight to an ASGI app and return (status, body)."""
+    sent: list[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    scope: Scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [],
+    }
+    await app(scope, receive, send)
+    body = b"".join(
+        m.get("body", b"") for m in sent if m["type"] == "http.response.body"
+    )
+    return sent[0]["status"], json.loads(body)
+
+
+def test_lazy_app_answers_health_at_once_and_serves_after_warm_up() -> None:
+    """Answer health checks during warm-up and serve requests after it."""
+
+    async def scenario() -> tuple[
+        list[str],
+        tuple[int, Any],
+        tuple[int, Any],
+        bool,
+        tuple[int, Any],
+        tuple[int, Any],
+    ]:
+        WARM_UP.clear()
+        EVENTS.clear()
+        lazy = LazyApp("src.test_asgi:slow_app")
+        lifespan: asyncio.Queue[Message] = asyncio.Queue()
+        replies: list[str] = []
+        await lifespan.put({"type": "lifespan.startup"})
+
+        async def send(message: Message) -> None:
+            replies.append(message["type"])
+
+        lifespan_task = asyncio.create_task(
+            lazy({"type": "lifespan"}, lifespan.get, send)
+        )
+        await asyncio.sleep(0.05)
+        health = await call(lazy, "/health")
+        not_ready = await call(lazy, "/ready")
+        waiting = asyncio.create_task(call(lazy, "/hello"))
+        await asyncio.sleep(0.05)
+        waited = not waiting.done()
+        WARM_UP.set()
+        hello = await waiting
+        ready = await call(lazy, "/ready")
+        await lifespan.put({"type": "lifespan.shutdown"})
+        await lifespan_task
+        return replies, health, not_ready, waited, hello, ready
+
+    replies, health, not_ready, waited, hello, ready = asyncio.run(scenario())
+    assert replies == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert health[0] == 200 and health[1]["ready"] is False
+    assert not_ready[0] == 503
+    assert waited
+    assert hello == (200, {"hello": "world"})
+    assert ready[0] == 200 and ready[1]["ready_after_ms"] > 0
+    assert EVENTS == ["started", "stopped"]
+
+
+def test_failed_warm_up_is_reported() -> None:
+    """Answer 503 with the error when the app cannot be loaded."""
+
+    async def scenario() -> tuple[tuple[int, Any], tuple[int, Any]]:
+        lazy = LazyApp("src.no_such_module:app")
+        return await call(lazy, "/hello"), await call(lazy, "/health")
+
+    (status, body), health = asyncio.run(scenario())
+    assert status == 503 and "no_such_module" in body["error"]
+    assert health[0] == 503
+
+
+def test_lazy_entry_point_does_not_import_the_agent_stack() -> None:
+    """Import neither google nor fastapi modules for the entry point."""
+    code = (
+        "import sys, src.asgi; "
+        "print([m for m in sys.modules if m.startswith(('google', 'fastapi'))])"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "[]"
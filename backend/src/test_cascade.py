@@ -0,0 +1,173 @@
+"""Tests of model cascades."""
+
+import asyncio
+from typing import Any, AsyncGenerator
+
+from google.adk.agents import Agent
+from google.adk.events import Event
+from google.adk.models import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService, Session
+from google.genai import types
+from typing_extensions import override
+
+from src.cascade import escalation_reason, parse_cascades
+from src.orchestrator import SmartOrchestrator
+from src.routing import Route
+from src.utils import roll_a_dice
+
+
+class ScriptedLlm(BaseLlm):
+    """Optionally calls roll_a_dice, then answers with a fixed text."""
+
+    model: str = "scripted"
+    answer: str = ""
+    call_tool: bool = False
+    calls: int = 0
+
+    @override
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """Call the tool once if `call_tool`, then answer with `answer`."""
+        self.calls += 1
+        last = llm_request.contents[-1]
+        if self.call_tool and not any(
+            part.function_response for part in last.parts or []
+        ):
+            call = types.FunctionCall(name="roll_a_dice", args={})
+            yield LlmResponse(
+                content=types.Content(
+                    role="model", parts=[types.Part(function_call=call)]
+                )
+            )
+            return
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self.answer)])
+        )
+
+
+def text_event(text: str, **fields: Any) -> Event:
+    """Return a model event with `text` and the given fields."""
+    return Event(
+        author="agent",
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        **fields,
+    )
+
+
+def run(
+    orchestrator: SmartOrchestrator, prompt: str
+) -> tuple[list[Event], Session | None]:
+    """Run `prompt` through `orchestrator` and return its events and session."""
+
+    async def scenario() -> tuple[list[Event], Session | None]:
+        sessions = InMemorySessionService()
+        await sessions.create_session(app_name="app", user_id="user", session_id="sess")
+        runner = Runner(agent=orchestrator, app_name="app", session_service=sessions)
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+        events = [
+            event
+            async for event in runner.run_async(
+                user_id="user", session_id="sess", new_message=message
+            )
+        ]
+        session = await sessions.get_session(
+            app_name="app", user_id="user", session_id="sess"
+        )
+        return events, session
+
+    return asyncio.run(scenario())
+
+
+def make_orchestrator(cheap: BaseLlm, strong: BaseLlm) -> SmartOrchestrator:
+    """Return an orchestrator cascading the dice route from `cheap` to `strong`."""
+    orchestrator = SmartOrchestrator(
+        fast_path_routes=(),
+        routes=[Route(name="dice", agent="custom", keywords=("dice",))],
+        cascades={"dice": (cheap,)},
+    )
+    orchestrator._custom = Agent(
+        name="custom_tools_agent", model=strong, tools=[roll_a_dice]
+    )
+    return orchestrator
+
+
+def test_parse_cascades() -> None:
+    """Parse cascades, skipping routes without models."""
+    assert parse_cascades("search=lite>flash-8b, dice=lite,horse=,broken") == {
+        "search": ("lite", "flash-8b"),
+        "dice": ("lite",),
+    }
+
+
+def test_escalation_reasons() -> None:
+    """Escalate errors, empty answers, refusals and ungrounded answers."""
+    assert escalation_reason([text_event("It is sunny.")]) is None
+    assert escalation_reason([text_event("  ")]) == "empty"
+    assert (
+        escalation_reason([text_event("I'm sorry, I can't help with that.")])
+        == "refusal"
+    )
+    assert escalation_reason([text_event("", error_code="429")]) == "model_error"
+    assert (
+        escalation_reason([text_event("It is sunny.")], grounded=True) == "no_grounding"
+    )
+    grounded = text_event("It is sunny.", grounding_metadata=types.GroundingMetadata())
+    assert escalation_reason([grounded], grounded=True) is None
+    failed = Event(
+        author="agent",
+        content=types.Content(
+            role="user",
+            parts=[
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        name="roll_a_dice", response={"error": "boom"}
+                    )
+                )
+            ],
+        ),
+    )
+    assert escalation_reason([failed, text_event("You rolled a 3.")]) == "tool_error"
+
+
+def test_cheap_tier_answer_is_served_with_its_tool_calls() -> None:
+    """Serve a good cheap answer along with the tool calls leading to it."""
+    cheap = ScriptedLlm(answer="You rolled a die.", call_tool=True)
+    strong = ScriptedLlm(answer="strong")
+    orchestrator = make_orchestrator(cheap, strong)
+    events, session = run(orchestrator, "roll a dice")
+
+    assert cheap.calls == 2 and strong.calls == 0
+    assert events[-1].content and events[-1].content.parts
+    assert events[-1].content.parts[0].text == "You rolled a die."
+    # The tool call, its result and the answer reach the real session once.
+    assert session is not None and len(session.events) == 4
+    stats = orchestrator.cascade_stats()["dice"]["custom_tools_agent"]
+    assert stats["answered_by_tier"] == [1, 0] and stats["escalation_rate"] == 0.0
+
+
+def test_refusals_escalate_to_the_route_agent() -> None:
+    """Escalate a cheap refusal to the route's own agent."""
+    cheap = ScriptedLlm(answer="I'm sorry, I cannot help with dice.")
+    strong = ScriptedLlm(answer="You rolled a 4.")
+    orchestrator = make_orchestrator(cheap, strong)
+    events, session = run(orchestrator, "roll a dice")
+
+    assert cheap.calls == 1 and strong.calls == 1
+    assert session is not None
+    texts = [
+        part.text
+        for event in session.events
+        if event.content
+        for part in event.content.parts or []
+    ]
+    assert texts == ["roll a dice", "You rolled a 4."]
+    assert events[-1].content and events[-1].content.parts
+    assert events[-1].content.parts[0].text == "You rolled a 4."
+    stats = orchestrator.cascade_stats()["dice"]["custom_tools_agent"]
+    assert stats["escalations"] == {"refusal": 1}
+    assert stats["answered_by_tier"] == [0, 1] and stats["escalation_rate"] == 1.0
+    assert stats["latency_saved_ms"] <= 0
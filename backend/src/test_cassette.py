@@ -0,0 +1,122 @@
+"""Tests for recording and replaying model cassettes."""
+
+import asyncio
+import random
+from pathlib import Path
+from typing import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from pytest import MonkeyPatch
+
+from src.admission import AdmittedGemini
+from src.cassette import CassetteGemini, CassetteMiss
+from src.fake_gemini import FakeGemini
+from src.utils import roll_a_dice
+
+
+def run_agent(model: CassetteGemini, prompt: str, session_id: str = "s") -> str | None:
+    """Run a dice agent on `model` and return the text of its last event."""
+
+    async def _run() -> str | None:
+        sessions = InMemorySessionService()
+        await sessions.create_session(
+            app_name="app", user_id="u", session_id=session_id
+        )
+        agent = Agent(name="dice_agent", model=model, tools=[roll_a_dice])
+        runner = Runner(agent=agent, app_name="app", session_service=sessions)
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+        events = [
+            event
+            async for event in runner.run_async(
+                user_id="u", session_id=session_id, new_message=message
+            )
+        ]
+        content = events[-1].content
+        assert content is not None and content.parts
+        return content.parts[0].text
+
+    return asyncio.run(_run())
+
+
+@pytest.fixture
+def live_model(monkeypatch: MonkeyPatch) -> list[LlmRequest]:
+    """Make the "live" Gemini call answer from a seeded fake instead."""
+    fake = FakeGemini(latency_ms=0, tokens_per_second=0, answer_tokens=6, seed=7)
+    calls = []
+
+    def call_model(
+        self: AdmittedGemini, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        calls.append(llm_request)
+        return fake._call_model(llm_request, stream)
+
+    monkeypatch.setattr(AdmittedGemini, "_call_model", call_model)
+    return calls
+
+
+def test_recorded_runs_replay_without_model_calls(
+    tmp_path: Path, live_model: list[LlmRequest], monkeypatch: MonkeyPatch
+) -> None:
+    """Replay recorded runs, in parallel, without calling the model."""
+    monkeypatch.setattr(random, "randint", lambda low, high: 3)
+    recorder = CassetteGemini(
+        model="gemini-x", mode="record", cassette_dir=str(tmp_path)
+    )
+    recorded = run_agent(recorder, "Roll   a dice\n")
+    # A tool-call turn and an answer turn.
+    assert len(live_model) == 2
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+    live_model.clear()
+    player = CassetteGemini(model="gemini-x", mode="replay", cassette_dir=str(tmp_path))
+
+    async def replay_in_parallel() -> list[str | None]:
+        return await asyncio.gather(
+            *(
+                asyncio.to_thread(run_agent, player, "Roll a dice", f"s{i}")
+                for i in range(4)
+            )
+        )
+
+    # Whitespace differences still match.
+    assert asyncio.run(replay_in_parallel()) == [recorded] * 4
+    assert live_model == []
+
+
+def test_changed_prompts_are_clear_misses(
+    tmp_path: Path, live_model: list[LlmRequest]
+) -> None:
+    """Show how a request without a cassette differs from the closest one."""
+    recorder = CassetteGemini(
+        model="gemini-x", mode="record", cassette_dir=str(tmp_path)
+    )
+    run_agent(recorder, "roll a dice")
+    player = CassetteGemini(model="gemini-x", mode="replay", cassette_dir=str(tmp_path))
+    with pytest.raises(CassetteMiss) as miss:
+        run_agent(player, "roll two dice")
+    message = str(miss.value)
+    assert "Closest recorded request differs" in message
+    assert '-     "text": "roll a dice"' in message
+    assert '+     "text": "roll two dice"' in message
+
+
+def test_different_tool_results_are_misses(
+    tmp_path: Path, live_model: list[LlmRequest], monkeypatch: MonkeyPatch
+) -> None:
+    """Miss a recorded run when a tool returns a different result."""
+    monkeypatch.setattr(random, "randint", lambda low, high: 3)
+    recorder = CassetteGemini(
+        model="gemini-x", mode="record", cassette_dir=str(tmp_path)
+    )
+    run_agent(recorder, "roll a dice")
+    monkeypatch.setattr(random, "randint", lambda low, high: 5)
+    player = CassetteGemini(model="gemini-x", mode="replay", cassette_dir=str(tmp_path))
+    with pytest.raises(CassetteMiss) as miss:
+        run_agent(player, "roll a dice")
+    assert '"result": 5' in str(miss.value)
@@ -0,0 +1,141 @@
+"""Tests for multiplexed channels and the channel registry."""
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from src.channels import Channel, ChannelRegistry, origin_allowed
+
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+async def counting_turn(
+    connection: object, message: dict[str, Any], send: Send
+) -> None:
+    """Send `message["steps"]` numbered texts, then a done message."""
+    for step in range(message["steps"]):
+        await send({"type": "text", "text": str(step)})
+    await send({"type": "done", "finishReason": "stop"})
+
+
+def test_turns_are_tagged_with_their_request_id() -> None:
+    """Tag every message of a turn with the turn's request_id."""
+
+    async def scenario() -> list[dict[str, Any]]:
+        channel = Channel(counting_turn)
+        await channel.receive({"type": "invoke", "request_id": "a", "steps": 2}, None)
+        await channel.receive({"type": "invoke", "request_id": "b", "steps": 1}, None)
+        await channel.receive("not an object", None)
+        messages: list[dict[str, Any]] = []
+        async for message in channel.messages():
+            messages.append(message)
+            if sum(m.get("type") == "done" for m in messages) == 2:
+                break
+        return messages
+
+    messages = asyncio.run(scenario())
+    assert [
+        m["text"] for m in messages if m.get("request_id") == "a" and "text" in m
+    ] == [
+        "0",
+        "1",
+    ]
+    assert {"type": "done", "finishReason": "stop", "request_id": "b"} in messages
+    assert {"type": "error", "error": "Messages must be JSON objects"} in messages
+
+
+def test_full_buffer_pauses_turns_until_the_client_reads() -> None:
+    """Pause turns while the outgoing buffer is full."""
+
+    async def scenario() -> tuple[int, bool, int]:
+        channel = Channel(counting_turn, max_buffered=3)
+        await channel.receive({"type": "invoke", "request_id": "a", "steps": 100}, None)
+        await asyncio.sleep(0.01)
+        buffered = channel.outgoing.qsize()
+        turn_running = "a" in channel.turns
+        received = 0
+        async for message in channel.messages():
+            received += 1
+            if message["type"] == "done":
+                break
+        return buffered, turn_running, received
+
+    buffered, turn_running, received = asyncio.run(scenario())
+    assert buffered == 3
+    assert turn_running
+    assert received == 101
+
+
+def test_cancel_and_limits() -> None:
+    """Reject turns beyond the limit and end cancelled turns."""
+
+    async def forever(connection: object, message: dict[str, Any], send: Send) -> None:
+        await asyncio.sleep(60)
+
+    async def scenario() -> tuple[Any, Any, dict[str, asyncio.Task[None]]]:
+        channel = Channel(forever, max_turns=1)
+        await channel.receive({"type": "invoke", "request_id": "a"}, None)
+        await channel.receive({"type": "invoke", "request_id": "b"}, None)
+        await channel.receive({"type": "cancel", "request_id": "a"}, None)
+        first = await channel.outgoing.get()
+        second = await channel.outgoing.get()
+        await asyncio.sleep(0.01)
+        return first, second, dict(channel.turns)
+
+    first, second, turns = asyncio.run(scenario())
+    assert first == {
+        "type": "error",
+        "request_id": "b",
+        "error": "At most 1 turns may run at once",
+    }
+    assert second == {"type": "done", "finishReason": "cancelled", "request_id": "a"}
+    assert turns == {}
+
+
+def test_closing_cancels_turns_and_ends_the_stream() -> None:
+    """Cancel running turns and end the message stream on close."""
+
+    async def forever(connection: object, message: dict[str, Any], send: Send) -> None:
+        await asyncio.sleep(60)
+
+    async def scenario() -> tuple[
+        ChannelRegistry, asyncio.Task[None], list[dict[str, Any]]
+    ]:
+        registry = ChannelRegistry()
+        channel = Channel(forever)
+        registry.open("c", channel)
+        await channel.receive({"type": "invoke", "request_id": "a"}, None)
+        await asyncio.sleep(0)
+        turn = channel.turns["a"]
+        registry.close("c", channel)
+        messages = [message async for message in channel.messages()]
+        await asyncio.sleep(0)
+        return registry, turn, messages
+
+    registry, turn, messages = asyncio.run(scenario())
+    assert turn.cancelled()
+    assert messages == []
+    assert len(registry) == 0
+
+
+def test_channels_are_bound_to_the_client_that_opened_them() -> None:
+    """Only let the client holding a channel's token use or replace it."""
+    registry = ChannelRegistry()
+    first, second, third = (Channel(counting_turn) for _ in range(3))
+    token = registry.open("c", first)
+    assert registry.open("c", second) is None
+    assert registry.open("c", second, "guess") is None
+    assert registry.get("c", "guess") is None and registry.get("c", None) is None
+    assert registry.get("c", token) is first
+    # The owner may reconnect, replacing its stream and keeping its token.
+    assert registry.open("c", third, token) == token
+    assert first.closed and not second.closed
+    assert registry.get("c", token) is third
+
+
+def test_only_listed_or_same_origins_are_allowed() -> None:
+    """Allow listed and same origins, and clients without an Origin."""
+    allowed = ["http://localhost:5173"]
+    assert origin_allowed(None, "api.example", allowed)
+    assert origin_allowed("http://localhost:5173", "api.example", allowed)
+    assert origin_allowed("https://api.example", "api.example", allowed)
+    assert not origin_allowed("https://evil.example", "api.example", allowed)
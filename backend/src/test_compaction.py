@@ -0,0 +1,133 @@
+"""Tests for session history compaction."""
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.genai import types
+from pytest import MonkeyPatch
+
+from src import compaction
+from src.compaction import SUMMARY_PREFIX, HistoryCompactor, event_tokens
+from src.fake_gemini import FakeGemini
+from src.session_store import BoundedSessionService
+from src.sqlite_session_service import SqliteSessionService
+
+
+def make_event(author: str, text: str) -> Event:
+    """Return an event of `author` holding `text`."""
+    return Event(
+        author=author,
+        invocation_id="inv",
+        content=types.Content(
+            role="user" if author == "user" else "model",
+            parts=[types.Part(text=text)],
+        ),
+    )
+
+
+def texts(session: Session | None) -> list[str | None]:
+    """Return the text of each event in `session`."""
+    assert session is not None
+    return [
+        part.text
+        for event in session.events
+        if event.content
+        for part in event.content.parts or []
+    ]
+
+
+async def fake_summarizer(text: str) -> str:
+    """Summarize `text` as its number of lines."""
+    return f"{text.count(chr(10)) + 1} lines"
+
+
+async def fill(
+    service: BoundedSessionService | SqliteSessionService, turns: int
+) -> None:
+    """Create session "s" holding `turns` question and answer turns."""
+    session = await service.create_session(app_name="app", user_id="u", session_id="s")
+    for turn in range(turns):
+        await service.append_event(session, make_event("user", f"question {turn}"))
+        await service.append_event(session, make_event("agent", f"answer {turn}"))
+
+
+def compact_and_reload(
+    service: BoundedSessionService | SqliteSessionService, **kwargs: Any
+) -> tuple[bool, Session | None, HistoryCompactor]:
+    """Compact a six turn session with `kwargs` and return it reloaded."""
+
+    async def scenario() -> tuple[bool, Session | None, HistoryCompactor]:
+        await fill(service, turns=6)
+        compactor = HistoryCompactor(service, summarize=fake_summarizer, **kwargs)
+        compacted = await compactor.compact("app", "u", "s")
+        session = await service.get_session(app_name="app", user_id="u", session_id="s")
+        return compacted, session, compactor
+
+    return asyncio.run(scenario())
+
+
+def test_compaction_folds_old_turns_into_summary() -> None:
+    """Replace the turns before the kept window with one summary event."""
+    compacted, session, compactor = compact_and_reload(
+        BoundedSessionService(), max_events=8, keep_events=4
+    )
+    assert compacted
+    assert texts(session) == [
+        SUMMARY_PREFIX + "8 lines",
+        "question 4",
+        "answer 4",
+        "question 5",
+        "answer 5",
+    ]
+    stats = compactor.stats("s")["sessions"]["u/s"]
+    assert stats["events_before"] == 12 and stats["events_after"] == 5
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_compaction_skips_sessions_under_budget() -> None:
+    """Leave sessions within both budgets alone."""
+    compacted, session, compactor = compact_and_reload(
+        BoundedSessionService(), max_events=100, max_tokens=10_000
+    )
+    assert not compacted
+    assert len(texts(session)) == 12
+    assert compactor.stats()["compactions"] == 0
+
+
+def test_token_budget_triggers_compaction(tmp_path: Path) -> None:
+    """Compact sessions over the token budget."""
+    service = SqliteSessionService(str(tmp_path / "s.db"))
+    compacted, session, _ = compact_and_reload(
+        service, max_events=100, max_tokens=20, keep_events=2
+    )
+    asyncio.run(service.close())
+    assert compacted
+    summary, *recent = texts(session)
+    assert summary is not None and summary.startswith(SUMMARY_PREFIX)
+    assert recent == [
+        "question 5",
+        "answer 5",
+    ]
+
+
+def test_event_tokens_counts_text() -> None:
+    """Estimate about one token per four characters."""
+    assert event_tokens(make_event("user", "x" * 40)) == 11
+
+
+def test_model_summarizer_uses_the_configured_backend(monkeypatch: MonkeyPatch) -> None:
+    """Summarize with a model built by `agent_model`."""
+    monkeypatch.setenv("MODEL_BACKEND", "fake")
+    monkeypatch.delenv("MODEL_CASSETTE_MODE", raising=False)
+    monkeypatch.setenv("FAKE_GEMINI_LATENCY_MS", "0")
+    monkeypatch.setenv("FAKE_GEMINI_TOKENS_PER_SECOND", "0")
+    compaction.summary_model.cache_clear()
+    try:
+        assert isinstance(compaction.summary_model(), FakeGemini)
+        summary = asyncio.run(compaction.model_summarizer("user: hi\nagent: hello"))
+    finally:
+        compaction.summary_model.cache_clear()
+    assert summary.strip()
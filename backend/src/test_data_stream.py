@@ -0,0 +1,90 @@
+"""Tests for the AI SDK data stream encoding."""
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator
+
+from src.data_stream import (
+    data_part,
+    encode_updates,
+    error_part,
+    finish_part,
+    text_part,
+)
+
+
+async def _iterate(
+    updates: list[tuple[str, Any]], gaps: dict[int, float] | None = None
+) -> AsyncGenerator[tuple[str, Any], None]:
+    for index, update in enumerate(updates):
+        if gaps and index in gaps:
+            await asyncio.sleep(gaps[index])
+        yield update
+
+
+def encode(
+    updates: list[tuple[str, Any]],
+    gaps: dict[int, float] | None = None,
+    **options: Any,
+) -> list[str]:
+    """Return the chunks `encode_updates` makes of `updates`.
+
+    `gaps` maps update indexes to seconds to wait before yielding them.
+    """
+
+    async def _collect() -> list[str]:
+        return [
+            chunk async for chunk in encode_updates(_iterate(updates, gaps), **options)
+        ]
+
+    return asyncio.run(_collect())
+
+
+def test_parts_are_json_escaped() -> None:
+    """Escape text, error and data parts as JSON on one line."""
+    text = 'He said "hi"\\ \n\tand\u2028left'
+    part = text_part(text)
+    assert part.endswith("\n") and part.count("\n") == 1
+    assert json.loads(part[2:]) == text
+    assert error_part('bad "tool"\n') == '3:"bad \\"tool\\"\\n"\n'
+    assert data_part([{"type": "tool_call"}]) == '2:[{"type":"tool_call"}]\n'
+
+
+def test_finish_part_carries_usage_when_known() -> None:
+    """Add token usage to the finish part only when it is known."""
+    assert finish_part("stop") == 'd:{"finishReason":"stop"}\n'
+    usage = {"promptTokens": 12, "completionTokens": 5}
+    assert finish_part("stop", usage) == (
+        'd:{"finishReason":"stop","usage":{"promptTokens":12,"completionTokens":5}}\n'
+    )
+
+
+def test_deltas_are_coalesced_after_the_first() -> None:
+    """Send the first delta alone and coalesce the rest up to max_chars."""
+    updates = [("text", f"w{n} ") for n in range(6)]
+    chunks = encode(updates, max_chars=8, max_delay=10)
+    assert chunks == [text_part("w0 "), text_part("w1 w2 w3 "), text_part("w4 w5 ")]
+
+
+def test_buffered_text_is_flushed_after_max_delay_and_before_data() -> None:
+    """Flush buffered text after max_delay and ahead of data parts."""
+    updates = [
+        ("text", "a"),
+        ("text", "b"),
+        ("text", "c"),
+        ("progress", [{"type": "tool_call"}]),
+        ("text", "d"),
+    ]
+    chunks = encode(updates, gaps={2: 0.1}, max_chars=100, max_delay=0.02)
+    assert chunks == [
+        text_part("a"),
+        text_part("b"),
+        text_part("c") + data_part([{"type": "tool_call"}]),
+        text_part("d"),
+    ]
+
+
+def test_zero_delay_sends_every_delta() -> None:
+    """Send every delta on its own when max_delay is 0."""
+    updates = [("text", "a"), ("text", "b")]
+    assert encode(updates, max_delay=0) == [text_part("a"), text_part("b")]
@@ -0,0 +1,114 @@
+"""Tests for the local Gemini stand-in."""
+
+import asyncio
+from typing import Any
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from google.genai.errors import ClientError
+from pytest import MonkeyPatch
+
+from src import admission
+from src.admission import is_retryable, retry_after_hint
+from src.fake_gemini import FakeGemini
+
+
+def request(
+    text: str, tools: types.ToolListUnion | None = None, tool_result: bool = False
+) -> LlmRequest:
+    """Return a request asking `text`, optionally answered by a tool result."""
+    contents = [types.Content(role="user", parts=[types.Part(text=text)])]
+    if tool_result:
+        response = types.FunctionResponse(name="roll_a_dice", response={"result": 4})
+        contents.append(
+            types.Content(role="user", parts=[types.Part(function_response=response)])
+        )
+    return LlmRequest(
+        model="fake", contents=contents, config=types.GenerateContentConfig(tools=tools)
+    )
+
+
+FUNCTIONS: types.ToolListUnion = [
+    types.Tool(
+        function_declarations=[
+            types.FunctionDeclaration(name="create_horse_fact"),
+            types.FunctionDeclaration(name="roll_a_dice"),
+        ]
+    )
+]
+
+
+def generate(
+    model: FakeGemini, llm_request: LlmRequest, stream: bool = False
+) -> list[LlmResponse]:
+    """Return the responses of `model` to `llm_request`."""
+
+    async def _collect() -> list[LlmResponse]:
+        return [r async for r in model.generate_content_async(llm_request, stream)]
+
+    return asyncio.run(_collect())
+
+
+def fast_model(**fields: Any) -> FakeGemini:
+    """Return a seeded fake model that answers without delay."""
+    return FakeGemini(latency_ms=0, tokens_per_second=0, seed=1, **fields)
+
+
+def first_part(response: LlmResponse) -> types.Part:
+    """Return the first part of the content of `response`."""
+    assert response.content is not None and response.content.parts
+    return response.content.parts[0]
+
+
+def test_calls_the_tool_named_in_the_query_then_answers() -> None:
+    """Call the tool the query names, then stream an answer to its result."""
+    model = fast_model(answer_tokens=5)
+    [call] = generate(model, request("roll the dice", FUNCTIONS))
+    function_call = first_part(call).function_call
+    assert function_call is not None and function_call.name == "roll_a_dice"
+    responses = generate(model, request("roll the dice", FUNCTIONS, True), stream=True)
+    partials = [r for r in responses if r.partial]
+    assert len(partials) == 5
+    final = responses[-1]
+    assert final.turn_complete
+    assert first_part(final).text == "".join(first_part(p).text or "" for p in partials)
+    assert final.usage_metadata is not None
+    assert final.usage_metadata.candidates_token_count == 5
+
+
+def test_search_requests_get_grounding_metadata() -> None:
+    """Ground answers to requests that declare google_search."""
+    search: types.ToolListUnion = [types.Tool(google_search=types.GoogleSearch())]
+    [answer] = generate(fast_model(), request("weather today", search))
+    assert answer.grounding_metadata is not None
+    assert answer.grounding_metadata.web_search_queries == ["weather today"]
+
+
+def test_injected_quota_errors_are_retried(monkeypatch: MonkeyPatch) -> None:
+    """Retry injected 429s, honoring their retry delay."""
+    monkeypatch.setattr(admission.model_limiter, "max_retries", 2)
+    model = fast_model(error_rate=1.0, retry_delay_seconds=0.01)
+    retries = admission.model_limiter.retries
+    with pytest.raises(ClientError) as error:
+        generate(model, request("hello"))
+    assert is_retryable(error.value)
+    assert retry_after_hint(error.value) == 0.01
+    assert admission.model_limiter.retries - retries == 2
+
+
+def test_injected_timeouts(monkeypatch: MonkeyPatch) -> None:
+    """Fail calls with a retryable timeout at the timeout rate."""
+    monkeypatch.setattr(admission.model_limiter, "max_retries", 0)
+    model = fast_model(timeout_rate=1.0, timeout_seconds=0)
+    with pytest.raises(Exception) as error:
+        generate(model, request("hello"))
+    assert is_retryable(error.value)
+
+
+def test_latency_follows_configured_median() -> None:
+    """Draw times to first token around the configured median."""
+    model = FakeGemini(latency_ms=100, latency_sigma=0.5, seed=3)
+    samples = sorted(model._latency() for _ in range(2001))
+    assert 0.09 < samples[1000] < 0.11
@@ -0,0 +1,150 @@
+"""Tests of hedged agent runs."""
+
+import asyncio
+import time
+from typing import AsyncGenerator
+
+from google.adk.agents import Agent
+from google.adk.events import Event
+from google.adk.models import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService, Session
+from google.genai import types
+from typing_extensions import override
+
+from src.hedging import HedgeBudget, Hedger
+from src.orchestrator import SmartOrchestrator
+
+
+class SlowThenFastLlm(BaseLlm):
+    """Answers after the n-th delay in `delays`, recording cancelled calls."""
+
+    model: str = "slow-then-fast"
+    delays: list[float] = []
+    calls: int = 0
+    cancelled: int = 0
+
+    @override
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """Answer after the next delay, counting the call if it is cancelled."""
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        text = f"answered after {delay}s"
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=text)])
+        )
+
+
+def run_search(
+    budget: HedgeBudget, delays: list[float], cheap: BaseLlm | None = None
+) -> tuple[SlowThenFastLlm, Hedger, list[Event], Session, float]:
+    """Run a search query on a hedged route, cascading from `cheap` if given."""
+    model = SlowThenFastLlm(delays=delays)
+    orchestrator = SmartOrchestrator(
+        fast_path_routes=(),
+        routes=[],
+        cascades={"search": (cheap,)} if cheap else {},
+        hedge_routes={"search"},
+    )
+    orchestrator._index = None
+    orchestrator._search = Agent(name="AgentSearch", model=model)
+    hedger = Hedger("search", budget, initial_delay=0.05)
+    orchestrator._hedgers[("search", "AgentSearch")] = hedger
+
+    async def scenario() -> tuple[list[Event], Session | None, float]:
+        sessions = InMemorySessionService()
+        await sessions.create_session(app_name="app", user_id="user", session_id="sess")
+        runner = Runner(agent=orchestrator, app_name="app", session_service=sessions)
+        message = types.Content(
+            role="user", parts=[types.Part(text="weather in paris")]
+        )
+        started = time.perf_counter()
+        events = [
+            event
+            async for event in runner.run_async(
+                user_id="user", session_id="sess", new_message=message
+            )
+        ]
+        elapsed = time.perf_counter() - started
+        session = await sessions.get_session(
+            app_name="app", user_id="user", session_id="sess"
+        )
+        return events, session, elapsed
+
+    events, session, elapsed = asyncio.run(scenario())
+    assert session is not None
+    return model, hedger, events, session, elapsed
+
+
+def last_text(events: list[Event]) -> str | None:
+    """Return the text of the last event."""
+    content = events[-1].content
+    assert content and content.parts
+    return content.parts[0].text
+
+
+def test_budget_caps_hedges_at_a_share_of_runs() -> None:
+    """Allow a hedge per `1 / share` runs once the burst is spent."""
+    budget = HedgeBudget(share=0.05, burst=1)
+    assert budget.try_hedge()
+    for _ in range(19):
+        budget.add_run()
+        assert not budget.try_hedge()
+    budget.add_run()
+    assert budget.try_hedge()
+    assert budget.stats()["hedges"] == 2 and budget.stats()["denied"] == 19
+
+
+def test_delay_follows_the_first_event_percentile() -> None:
+    """Wait the initial delay, then the percentile of times to first event."""
+    hedger = Hedger(
+        "search", HedgeBudget(), percentile=0.9, initial_delay=2.0, min_samples=10
+    )
+    assert hedger.delay() == 2.0
+    hedger._first_event_times.extend(number / 100 for number in range(1, 101))
+    assert hedger.delay() == 0.91
+
+
+def test_slow_run_is_hedged_and_cancelled() -> None:
+    """Hedge a slow run, serve the hedge and cancel the slow run."""
+    model, hedger, events, session, elapsed = run_search(
+        HedgeBudget(), delays=[5.0, 0.0]
+    )
+    assert elapsed < 1
+    assert last_text(events) == "answered after 0.0s"
+    assert [event.author for event in session.events] == ["user", "AgentSearch"]
+    assert model.calls == 2 and model.cancelled == 1
+    assert hedger.stats()["hedges"] == 1 and hedger.stats()["hedge_wins"] == 1
+
+
+def test_no_hedge_once_the_budget_is_spent() -> None:
+    """Wait for the slow run when the budget allows no hedge."""
+    model, hedger, events, _, _ = run_search(
+        HedgeBudget(share=0, burst=0), delays=[0.2, 0.0]
+    )
+    assert last_text(events) == "answered after 0.2s"
+    assert model.calls == 1 and hedger.stats()["hedges"] == 0
+
+
+def test_cascaded_route_hedges_only_its_own_agent() -> None:
+    """Run the cheaper tiers of a hedged route unhedged and hedge the last tier."""
+    cheap = SlowThenFastLlm(delays=[0.2])
+    model, hedger, events, session, elapsed = run_search(
+        HedgeBudget(), delays=[5.0, 0.0], cheap=cheap
+    )
+    assert elapsed < 1
+    # The cheap answer has no grounding, so it is escalated to the route agent.
+    assert cheap.calls == 1 and cheap.cancelled == 0
+    assert last_text(events) == "answered after 0.0s"
+    assert [event.author for event in session.events] == ["user", "AgentSearch"]
+    assert model.calls == 2 and model.cancelled == 1
+    assert hedger.stats()["runs"] == 1 and hedger.stats()["hedge_wins"] == 1
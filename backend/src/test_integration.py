@@ -1,12 +1,23 @@
+"""End-to-end tests of the /invoke endpoint.
+
+By default the app runs in-process and answers from the model cassettes
+(see conftest.py). Set INTEGRATION_BASE_URL, e.g. to http://localhost:8000,
+to send the prompts to a running server instead.
+
+The committed cassettes are synthetic, so prompts whose answers are live facts
+(today's date, search results) only run against Gemini.
+"""
+
+import os
+import re
 from datetime import date
-import pytest
+from typing import Iterator
+
 import httpx
-import json
-import re
+import pytest
+from fastapi.testclient import TestClient
 
-# The address of the running Uvicorn server
-BASE_URL = "http://localhost:8000"
-INVOKE_URL = f"{BASE_URL}/invoke"
+BASE_URL = os.getenv("INTEGRATION_BASE_URL")
 
 # from `create_horse_fact` in `src/utils.py`
 HORSE_FACTS_SET = {
@@ -16,85 +27,90 @@ HORSE_FACTS_SET = {
 }
 
 
+def replaying() -> bool:
+    """Return whether the in-process app answers from cassettes."""
+    return BASE_URL is None and os.getenv("MODEL_CASSETTE_MODE") == "replay"
+
+
+live_only = pytest.mark.skipif(
+    replaying(), reason="checks a live fact; the cassettes are synthetic"
+)
+
 TEST_CASES = [
-    ("what is today's date? use YYYY-MM-DD format", date.today().strftime("%Y-%m-%d")),
+    pytest.param(
+        "what is today's date? use YYYY-MM-DD format", "TODAY", marks=live_only
+    ),
     ("how many legs does a horse have?", "HORSE_FACT"),
     ("how many horses exist today?", "HORSE_FACT"),
-    (
+    pytest.param(
         "how many lines in a shakespearean sonnet? reply with only an integer answer.",
         "14",
+        marks=live_only,
+    ),
+    pytest.param(
+        "what python version was released on June 11, 2025?", "3.13.5", marks=live_only
     ),
-    ("what python version was released on June 11, 2025?", "3.13.5"),
     ("how many horses exist today?", "HORSE_FACT"),
     ("could you roll 2d20?", "I cannot"),
     ("roll a die", "ROLL_DIE"),
 ]
 
 
-@pytest.mark.parametrize("prompt, expected_answer", TEST_CASES)
-def test_invoke_endpoint(prompt, expected_answer):
-    """
-    Sends a prompt to the /invoke endpoint and checks if the response
-    contains the expected answer.
+@pytest.fixture(scope="module")
+def client() -> Iterator[httpx.Client]:
+    """Yield a client for the running server, or for the app in-process."""
+    if BASE_URL is not None:
+        with httpx.Client(base_url=BASE_URL, timeout=60) as live_client:
+            yield live_client
+        return
+    if not replaying() and not os.getenv("GOOGLE_API_KEY"):
+        pytest.skip("Live model calls need a GOOGLE_API_KEY.")
+    from src.app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
 
-    This test requires the Uvicorn server to be running separately.
+def invoke(client: httpx.Client, prompt: str) -> httpx.Response:
+    """Post `prompt` to /invoke, skipping the test when live Gemini is out of quota.
+
+    In replay mode a missing cassette fails the request with the `CassetteMiss`
+    diff in its error.
     """
-    print(f"\n--- Testing prompt: '{prompt}' ---")
     try:
-        # Use the legacy format for the request
-        payload = {"query": prompt}
-        headers = {"Content-Type": "application/json"}
-
-        with httpx.Client() as client:
-            response = client.post(INVOKE_URL, json=payload, headers=headers)
-
-            # Check if the request was successful
-            assert response.status_code == 200
-
-            # Parse and print the JSON response
-            response_data = response.json()
-            print(f"Server response: {json.dumps(response_data, indent=2)}")
-
-            response_text = response_data["response"].strip()
-
-            # Basic validation on the response
-            assert "response" in response_data
-            assert isinstance(response_text, str)
-            assert len(response_text) > 0
-
-            # If an expected answer is provided, perform validation
-            if expected_answer:
-                if expected_answer == "HORSE_FACT":
-                    print("Checking for membership in HORSE_FACTS_SET")
-                    assert response_text in HORSE_FACTS_SET
-                elif expected_answer == "ROLL_DIE":
-                    print("Checking for a valid die roll (1-6)")
-                    roll = None
-                    # 1. Try to parse as a raw number
-                    try:
-                        roll = int(response_text)
-                    except ValueError:
-                        # 2. If that fails, try regex matching "You rolled a X."
-                        match = re.search(
-                            r"you rolled a (\d+)\.", response_text, re.IGNORECASE
-                        )
-                        if match:
-                            roll = int(match.group(1))
-
-                    if roll is not None:
-                        assert 1 <= roll <= 6
-                    else:
-                        pytest.fail(
-                            f"Expected a die roll between 1 and 6, but got '{response_text}'"
-                        )
-                else:
-                    print(f"Checking for substring: '{expected_answer}'")
-                    assert expected_answer.lower() in response_text.lower()
-
+        response = client.post("/invoke", json={"query": prompt})
     except httpx.ConnectError:
-        pytest.fail(
-            f"Connection to {INVOKE_URL} failed. "
-            "Please ensure the Uvicorn server is running in the background."
-        )
-    except Exception as e:
-        pytest.fail(f"An unexpected error occurred: {e}")
+        pytest.fail(f"Connection to {BASE_URL} failed. Is the server running?")
+    if not replaying() and "RESOURCE_EXHAUSTED" in response.text:
+        pytest.skip(f"Gemini quota exceeded: {response.text}")
+    return response
+
+
+def die_roll(text: str) -> int | None:
+    """Return the die roll in an answer like "4" or "You rolled a 4.", or None."""
+    if text.isdigit():
+        return int(text)
+    match = re.search(r"you rolled a (\d+)\.", text, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+@pytest.mark.parametrize("prompt, expected_answer", TEST_CASES)
+def test_invoke_endpoint(
+    client: httpx.Client, prompt: str, expected_answer: str
+) -> None:
+    """Send a prompt to /invoke and check the answer contains what is expected."""
+    response = invoke(client, prompt)
+    assert response.status_code == 200, response.text
+
+    response_text = response.json()["response"].strip()
+    assert response_text
+
+    if expected_answer == "TODAY":
+        assert date.today().strftime("%Y-%m-%d") in response_text
+    elif expected_answer == "HORSE_FACT":
+        assert response_text in HORSE_FACTS_SET
+    elif expected_answer == "ROLL_DIE":
+        roll = die_roll(response_text)
+        assert roll is not None and 1 <= roll <= 6, response_text
+    else:
+        assert expected_answer.lower() in response_text.lower()
@@ -0,0 +1,115 @@
+"""Tests of the local BM25 index."""
+
+import os
+from pathlib import Path
+from typing import Any
+
+from src.local_index import CHAMPIONS, LocalIndex, tokenize
+from src.orchestrator import SmartOrchestrator
+
+DOCS = {
+    "stables.md": "The stables open at dawn. Grooms feed the horses oats and hay.",
+    "policies/vacation.txt": "Vacation requests need two weeks notice and manager approval.",
+    "policies/expenses.txt": "Expenses above 500 dollars need a receipt and manager approval.",
+}
+
+
+def write(root: str | Path, path: str, text: str) -> None:
+    """Write a document with an mtime later than any earlier version."""
+    full = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w") as f:
+        f.write(text)
+    # Make sure the new version has a later mtime than the indexed one.
+    stat = os.stat(full)
+    os.utime(full, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def make_index(tmp_path: Path, **kwargs: Any) -> tuple[LocalIndex, Path]:
+    """Return an index of DOCS written under `tmp_path`, and the docs directory."""
+    docs = tmp_path / "docs"
+    for path, text in DOCS.items():
+        write(docs, path, text)
+    return LocalIndex(str(docs), str(tmp_path / "index"), **kwargs), docs
+
+
+def test_tokenize_drops_stopwords_and_punctuation() -> None:
+    """Drop stopwords and punctuation from terms."""
+    assert tokenize("What is the Vacation policy, for 2025?") == [
+        "vacation",
+        "policy",
+        "2025",
+    ]
+
+
+def test_search_ranks_by_bm25_and_reports_match(tmp_path: Path) -> None:
+    """Rank documents by BM25 and report how well the best ones match."""
+    index, _ = make_index(tmp_path)
+    assert index.refresh()["added"] == 3
+    hits = index.search("how much notice for vacation requests?")
+    assert hits[0].path == os.path.join("policies", "vacation.txt")
+    assert 0.5 < hits[0].match <= 1
+    assert "two weeks notice" in hits[0].snippet
+    assert {hit.path for hit in index.search("manager approval", k=5)} == {
+        os.path.join("policies", "vacation.txt"),
+        os.path.join("policies", "expenses.txt"),
+    }
+    # Terms no document contains lower the match of the best document.
+    assert index.search("vacation weather forecast paris")[0].match < 0.3
+    assert index.search("the of and") == []
+
+
+def test_refresh_is_incremental_and_persisted(tmp_path: Path) -> None:
+    """Index only changed documents, merge segments and reopen from disk."""
+    index, docs = make_index(tmp_path, max_segments=2)
+    index.refresh()
+    unchanged = index.refresh()
+    assert (unchanged["added"], unchanged["updated"], unchanged["removed"]) == (0, 0, 0)
+
+    write(docs, "policies/vacation.txt", "Vacation is now unlimited, ask your lead.")
+    write(docs, "parking.md", "Parking permits are issued by reception.")
+    os.remove(docs / "stables.md")
+    result = index.refresh()
+    assert (result["added"], result["updated"], result["removed"]) == (1, 1, 1)
+    assert result["segments"] == 2
+    assert index.search("horses oats") == []
+    assert "unlimited" in index.search("vacation")[0].snippet
+    assert index.stats()["documents"] == 3 and index.stats()["deleted"] == 2
+
+    write(docs, "parking.md", "Parking permits are issued by security.")
+    assert index.refresh()["segments"] == 1  # merged, dropping deleted documents
+    assert index.stats()["deleted"] == 0
+    assert len(os.listdir(tmp_path / "index" / "segments")) == 1
+
+    reopened = LocalIndex(str(docs), str(tmp_path / "index"))
+    reopened.load()
+    assert reopened.stats()["documents"] == 3
+    assert reopened.search("parking permits")[0].path == "parking.md"
+    assert reopened.refresh()["added"] == 0
+
+
+def test_frequent_terms_use_champion_lists(tmp_path: Path) -> None:
+    """Find the best documents for terms with champion lists."""
+    docs = tmp_path / "docs"
+    for number in range(CHAMPIONS + 100):
+        write(docs, f"{number}.txt", "horse " + "filler " * (number % 7))
+    write(docs, "best.txt", "horse horse horse saddle")
+    index = LocalIndex(str(docs), str(tmp_path / "index"))
+    index.refresh()
+    assert index.search("horse")[0].path == "best.txt"
+    assert index.search("saddle horse")[0].path == "best.txt"
+    assert len(index.search("horse", k=10)) == 10
+
+
+def test_orchestrator_answers_from_local_index_above_threshold(tmp_path: Path) -> None:
+    """Answer from the local index only when it matches well enough."""
+    index, _ = make_index(tmp_path)
+    index.refresh()
+    orchestrator = SmartOrchestrator(index=index)
+    assert (
+        orchestrator._search_target("vacation requests notice") is orchestrator._local
+    )
+    assert (
+        orchestrator._search_target("weather in paris tomorrow") is orchestrator._search
+    )
+    assert orchestrator.local_search_stats() == {"local_answers": 1, "web_fallbacks": 1}
@@ -0,0 +1,78 @@
+"""Tests for the Prometheus metrics registry and tool timings."""
+
+from types import SimpleNamespace
+from typing import Any
+
+from pytest import MonkeyPatch
+
+from src import metrics
+from src.metrics import InFlight, Registry
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    """Render cumulative bucket counts, the sum and the count."""
+    registry = Registry()
+    latency = registry.histogram("stage_seconds", "Stage latency.", ("stage",))
+    for value in (0.0002, 0.003, 0.003, 120.0):
+        latency.observe(value, ("parse",))
+    text = registry.render()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.0005"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.005"} 3' in text
+    assert 'stage_seconds_bucket{stage="parse",le="60.0"} 3' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 4' in text
+    assert 'stage_seconds_count{stage="parse"} 4' in text
+    assert latency.count(("parse",)) == 4
+
+
+def test_counters_escape_labels_and_can_be_disabled() -> None:
+    """Escape quotes in label values and stop counting when disabled."""
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    requests.inc(('say "hi"',))
+    requests.inc(('say "hi"',), 2)
+    assert 'requests_total{route="say \\"hi\\""} 3' in registry.render()
+    registry.enabled = False
+    requests.inc(('say "hi"',))
+    assert requests.value(('say "hi"',)) == 3
+
+
+def test_gauges_are_read_when_rendered() -> None:
+    """Read gauge values from their callback on every render."""
+    registry = Registry()
+    counts: dict[tuple[str, ...], float] = {("idle",): 2, ("active",): 1}
+    registry.gauge("connections", "Open connections.", ("state",), lambda: counts)
+    text = registry.render()
+    assert "# TYPE connections gauge" in text
+    assert 'connections{state="idle"} 2' in text
+    counts[("active",)] = 5
+    assert 'connections{state="active"} 5' in registry.render()
+
+
+def test_in_flight_calls_are_bounded() -> None:
+    """Drop the oldest in-flight call once the map is full."""
+    calls = InFlight(max_calls=2)
+    for number in range(3):
+        calls[("inv", str(number))] = number
+    assert list(calls) == [("inv", "1"), ("inv", "2")]
+
+
+def test_tool_timings_do_not_mix_calls_without_ids(monkeypatch: MonkeyPatch) -> None:
+    """Time concurrent calls without function call ids separately."""
+    observed = []
+    monkeypatch.setattr(
+        metrics, "_observe_tool", lambda tool, agent, seconds: observed.append(agent)
+    )
+    tool: Any = SimpleNamespace(name="roll_a_dice")
+    first: Any = SimpleNamespace(
+        invocation_id="inv", function_call_id=None, agent_name="first"
+    )
+    second: Any = SimpleNamespace(
+        invocation_id="inv", function_call_id=None, agent_name="second"
+    )
+    metrics.before_tool(tool, {}, first)
+    metrics.before_tool(tool, {}, second)
+    metrics.on_tool_error(tool, {}, second, RuntimeError("boom"))
+    metrics.after_tool(tool, {}, first, {})
+    assert observed == ["second", "first"]
+    assert not metrics._tool_starts
@@ -0,0 +1,145 @@
+"""Tests for the shared model connection pool."""
+
+import asyncio
+import json
+from typing import Any
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+from pytest import MonkeyPatch
+
+from src.admission import AdmittedGemini
+from src.model_pool import ModelConnectionPool
+
+ANSWER = {"candidates": [{"content": {"role": "model", "parts": [{"text": "Neigh"}]}}]}
+
+
+async def start_server(
+    delay: float = 0.0,
+) -> tuple[asyncio.Server, str, dict[str, int]]:
+    """Start a keep-alive HTTP/1.1 server answering every request with ANSWER."""
+    stats = {"connections": 0, "requests": 0}
+    body = json.dumps(ANSWER).encode()
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        stats["connections"] += 1
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode().split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":")[1])
+            await reader.readexactly(length)
+            stats["requests"] += 1
+            await asyncio.sleep(delay)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                + (b"" if head.startswith(b"HEAD") else body)
+            )
+            await writer.drain()
+
+    async def guarded(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            await serve(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    server = await asyncio.start_server(guarded, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}", stats
+
+
+def test_warm_up_opens_connections_that_requests_reuse() -> None:
+    """Reuse the connections opened by the warm-up."""
+
+    async def scenario() -> tuple[int, dict[str, Any], dict[str, Any], dict[str, int]]:
+        server, url, served = await start_server(delay=0.05)
+        pool = ModelConnectionPool(http2=False, max_keepalive=4)
+        opened = await pool.warm_up(url, 3)
+        warm = pool.stats()
+        for _ in range(5):
+            await pool.client.get(url)
+        await asyncio.gather(*(pool.client.get(url) for _ in range(3)))
+        stats = pool.stats()
+        await pool.client.aclose()
+        server.close()
+        return opened, warm, stats, served
+
+    opened, warm, stats, served = asyncio.run(scenario())
+    assert opened == 3
+    assert warm["idle"] == 3 and warm["active"] == 0
+    assert served["connections"] == 3
+    assert stats["requests"] == 11
+    assert stats["connections_opened"] == 3
+    assert stats["connections_warmed"] == 3
+    assert stats["new_connections_per_second"] == 3 / 60
+    assert stats["in_flight_requests"] == 0
+
+
+def test_connection_counts_are_omitted_without_the_httpcore_pool(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """Report no connection counts when httpcore's pool is gone."""
+
+    async def scenario() -> dict[str, Any]:
+        pool = ModelConnectionPool(http2=False)
+        with monkeypatch.context() as patch:
+            patch.delattr(pool._transport(), "_pool")
+            stats = pool.stats()
+        await pool.client.aclose()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["idle"] is None and stats["active"] is None
+
+
+def test_warm_up_failures_are_ignored() -> None:
+    """Ignore warm-up requests that fail."""
+
+    async def scenario() -> tuple[int, dict[str, Any]]:
+        pool = ModelConnectionPool(http2=False)
+        opened = await pool.warm_up("http://127.0.0.1:9", 2, timeout=1)
+        await pool.client.aclose()
+        return opened, pool.stats()
+
+    opened, stats = asyncio.run(scenario())
+    assert opened == 0
+    assert stats["requests"] == 2
+
+
+def test_gemini_models_share_the_pool(monkeypatch: MonkeyPatch) -> None:
+    """Send the calls of every Gemini model over one connection."""
+
+    async def scenario() -> tuple[list[str | None], dict[str, Any], dict[str, int]]:
+        server, url, served = await start_server()
+        monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+        monkeypatch.setenv("GOOGLE_GEMINI_BASE_URL", url)
+        pool = ModelConnectionPool(http2=False)
+        client_kwargs = {
+            "http_options": types.HttpOptions(httpx_async_client=pool.client)
+        }
+        models = [
+            AdmittedGemini(model="gemini-2.0-flash", client_kwargs=client_kwargs)
+            for _ in range(2)
+        ]
+        texts: list[str | None] = []
+        for model in models * 2:
+            request = LlmRequest(
+                model=model.model,
+                contents=[types.Content(role="user", parts=[types.Part(text="Hi")])],
+            )
+            async for response in model.generate_content_async(request):
+                assert response.content and response.content.parts
+                texts.append(response.content.parts[0].text)
+        stats = pool.stats()
+        await pool.client.aclose()
+        server.close()
+        return texts, stats, served
+
+    texts, stats, served = asyncio.run(scenario())
+    assert texts == ["Neigh"] * 4
+    assert stats["requests"] == 4
+    assert served["connections"] == 1
+    assert stats["idle"] == 1
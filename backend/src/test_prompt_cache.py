@@ -0,0 +1,110 @@
+"""Tests of explicit prompt caching."""
+
+import asyncio
+import datetime
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.apps import App
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from google.genai.errors import ClientError
+from pytest import MonkeyPatch
+
+from src import fake_gemini
+from src.fake_gemini import FakeGemini
+from src.prompt_cache import LocalCaches, PromptCacheStats
+
+INSTRUCTION = "You are a patient stable hand. " * 200
+
+
+def usage(prompt: int, cached: int | None = None) -> LlmResponse:
+    """Return a response reporting `prompt` tokens, `cached` of them from a cache."""
+    return LlmResponse(
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt, cached_content_token_count=cached
+        )
+    )
+
+
+def test_stats_count_hits_and_tokens_saved() -> None:
+    """Count cache hits and tokens saved, ignoring partial responses."""
+    stats = PromptCacheStats()
+    stats.observe("m", usage(1000))
+    stats.observe("m", usage(1000, cached=900))
+    stats.observe("m", LlmResponse(partial=True))
+    assert stats.stats() == {
+        "calls": 2,
+        "hits": 1,
+        "hit_rate": 0.5,
+        "prompt_tokens": 2000,
+        "tokens_saved": 900,
+        "saved_share": 0.45,
+        "caches_created": 0,
+    }
+
+
+def test_local_caches_expire_and_delete() -> None:
+    """Forget local cache entries when deleted or expired."""
+    now = [datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)]
+    caches = LocalCaches(clock=lambda: now[0])
+    config = types.CreateCachedContentConfig(system_instruction=INSTRUCTION, ttl="60s")
+
+    async def scenario() -> None:
+        first = await caches.create(model="m", config=config)
+        second = await caches.create(model="m", config=config)
+        assert first.usage_metadata and first.name and second.name
+        assert (first.usage_metadata.total_token_count or 0) > 1000
+        await caches.delete(name=first.name)
+        now[0] += datetime.timedelta(seconds=61)
+        with pytest.raises(ClientError):
+            await caches.get(name=second.name)
+
+    asyncio.run(scenario())
+    assert (caches.created, caches.deleted, len(caches)) == (2, 1, 0)
+
+
+def test_agent_prefix_is_cached_reused_and_invalidated(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """Create the cache on the second turn, reuse it, and replace it on change."""
+    caches = LocalCaches()
+    monkeypatch.setattr(fake_gemini, "local_caches", caches)
+    model = FakeGemini(latency_ms=0, tokens_per_second=0, tool_call_rate=0, seed=1)
+    agent = Agent(name="stable_hand", model=model, instruction=INSTRUCTION)
+    sessions = InMemorySessionService()
+    config = ContextCacheConfig(min_tokens=0, cache_intervals=5)
+    runner = Runner(
+        app=App(name="app", root_agent=agent, context_cache_config=config),
+        session_service=sessions,
+    )
+
+    async def turn(text: str) -> types.GenerateContentResponseUsageMetadata | None:
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        events = [
+            event
+            async for event in runner.run_async(
+                user_id="user", session_id="sess", new_message=message
+            )
+        ]
+        return events[-1].usage_metadata
+
+    async def scenario() -> list[types.GenerateContentResponseUsageMetadata | None]:
+        await sessions.create_session(app_name="app", user_id="user", session_id="sess")
+        results = [await turn(f"question {number}") for number in range(3)]
+        # A changed instruction no longer matches the cached prefix.
+        agent.instruction = INSTRUCTION + "Answer in French."
+        results.append(await turn("question 3"))
+        return results
+
+    first, second, third, changed = asyncio.run(scenario())
+    assert first and second and third and changed
+    # The first turn only fingerprints the prefix; the second creates the cache.
+    assert first.cached_content_token_count is None
+    assert (second.cached_content_token_count or 0) > 1000
+    assert third.cached_content_token_count == second.cached_content_token_count
+    assert changed.cached_content_token_count is None
+    assert caches.created == 1 and caches.deleted == 1
@@ -0,0 +1,71 @@
+"""Tests for the response cache."""
+
+from src.response_cache import CacheKey, ResponseCache, normalize_query, parse_ttls
+
+
+class FakeClock:
+    """Clock whose time is set by the test."""
+
+    def __init__(self, now: float = 0.0) -> None:
+        """Start the clock at `now`."""
+        self.now = now
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def cache_key(cache: ResponseCache, query: str, route: str = "search") -> CacheKey:
+    """Return the key of `query`, which must be cacheable."""
+    key = cache.key(query, route)
+    assert key is not None
+    return key
+
+
+def test_normalize_query() -> None:
+    """Ignore case, repeated whitespace and trailing punctuation."""
+    assert normalize_query("  What DAY is  today?? ") == "what day is today"
+
+
+def test_parse_ttls() -> None:
+    """Parse comma separated route TTLs."""
+    assert parse_ttls("search=60, dice=0") == {"search": 60.0, "dice": 0.0}
+
+
+def test_entries_expire_after_route_ttl() -> None:
+    """Stop serving entries once their route's TTL has passed."""
+    clock = FakeClock()
+    cache = ResponseCache(ttls={"search": 10}, clock=clock)
+    key = cache_key(cache, "q")
+    cache.put(key, "a")
+    assert cache.get(key) == "a"
+    clock.now = 11
+    assert cache.get(key) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_zero_ttl_routes_are_not_cached() -> None:
+    """Give no key to queries of routes with a TTL of 0."""
+    assert ResponseCache(ttls={"dice": 0}).key("roll", "dice") is None
+
+
+def test_time_bucket_changes_key() -> None:
+    """Key the same query differently in the next time bucket."""
+    clock = FakeClock(3599)
+    cache = ResponseCache(bucket_seconds=3600, clock=clock)
+    before = cache.key("what day is today", "search")
+    clock.now = 3600
+    assert cache.key("what day is today", "search") != before
+
+
+def test_lru_eviction() -> None:
+    """Evict the least recently used entry once the cache is full."""
+    cache = ResponseCache(max_entries=2)
+    keys = [cache_key(cache, q) for q in ("a", "b", "c")]
+    cache.put(keys[0], "A")
+    cache.put(keys[1], "B")
+    cache.get(keys[0])
+    cache.put(keys[2], "C")
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "A"
+    assert cache.stats()["evictions"] == 1
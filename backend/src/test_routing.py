@@ -0,0 +1,79 @@
+"""Tests for the compiled route table."""
+
+from types import SimpleNamespace
+
+from google.adk.agents.run_config import RunConfig
+
+from src.orchestrator import (
+    DEFAULT_ROUTES,
+    SEARCH_ROUTE,
+    SmartOrchestrator,
+    routed_run_config,
+)
+from src.routing import (
+    KeywordAutomaton,
+    Route,
+    RouteTable,
+    required_literal,
+    user_text,
+)
+
+
+def test_keyword_automaton_finds_overlapping_keywords() -> None:
+    """Report every keyword group in a text, including overlapping ones."""
+    automaton = KeywordAutomaton([("he", 0), ("she", 1), ("hers", 2), ("his", 3)])
+    assert automaton.groups("ushers") == {0, 1, 2}
+    assert automaton.groups("this") == {3}
+    assert automaton.groups("nothing") == set()
+
+
+def test_default_routes_match_previous_substring_rules() -> None:
+    """Route the default queries as the substring checks used to."""
+    table = RouteTable(DEFAULT_ROUTES, default=SEARCH_ROUTE)
+    assert table.match("Tell me about HORSES").name == "horse"
+    assert table.match("please roll the dice").name == "dice"
+    assert table.match("what is the sky color").name == "search"
+    assert table.stats() == {"horse": 1, "dice": 1, "search": 1}
+
+
+def test_first_listed_route_wins_across_keywords_and_patterns() -> None:
+    """Pick the first listed route whether keywords or patterns matched."""
+    routes = [
+        Route(name="weather", agent="search", patterns=(r"\bforecast\b",)),
+        Route(name="dice", agent="custom", keywords=("dice",)),
+        Route(name="notation", agent="custom", patterns=(r"\d+d\d+",)),
+    ]
+    table = RouteTable(routes, default=SEARCH_ROUTE)
+    assert table.match("roll 2d20 dice, what's the forecast?").name == "weather"
+    assert table.match("roll 2d20 dice").name == "dice"
+    assert table.match("roll 2d20").name == "notation"
+    assert table.match("roll").name == "search"
+
+
+def test_user_text_prefers_invocation_user_content() -> None:
+    """Read the user content of an invocation context before other fields."""
+    ctx = SimpleNamespace(
+        user_content=SimpleNamespace(
+            parts=[SimpleNamespace(text="roll "), SimpleNamespace(text="dice")]
+        )
+    )
+    assert user_text(ctx) == "roll dice"
+    assert user_text(SimpleNamespace(parts=[SimpleNamespace(text="hi")])) == "hi"
+
+
+def test_required_literal() -> None:
+    """Find the longest top-level literal of a pattern."""
+    assert required_literal(r"\bForecast\s+today\b") == "forecast"
+    assert required_literal(r"\d+d\d+") == "d"
+    assert required_literal(r"sun|rain") is None
+
+
+def test_orchestrator_takes_the_route_the_app_matched() -> None:
+    """Count the route passed in the run config instead of matching again."""
+    config = routed_run_config(RunConfig(custom_metadata={"trace": "t"}), "dice")
+    assert config.custom_metadata == {"trace": "t", "route": "dice"}
+    orchestrator = SmartOrchestrator(fast_path_routes=(), routes=DEFAULT_ROUTES)
+    route, target = orchestrator.route("tell me about horses", "dice")
+    assert route.name == "dice" and target is orchestrator._custom
+    assert orchestrator.route("tell me about horses", "gone")[0].name == "horse"
+    assert orchestrator.route_stats() == {"horse": 1, "dice": 1, "search": 0}
@@ -0,0 +1,143 @@
+"""Tests for the bounded in-memory session service."""
+
+import asyncio
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.genai import types
+
+from src.session_store import BoundedSessionService
+
+
+class FakeClock:
+    """Clock whose time is set by the test."""
+
+    def __init__(self) -> None:
+        """Start the clock at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def make_event(author: str, text: str) -> Event:
+    """Return an event of `author` holding `text`."""
+    return Event(
+        author=author,
+        invocation_id="inv",
+        content=types.Content(
+            role="user" if author == "user" else "model",
+            parts=[types.Part(text=text)],
+        ),
+    )
+
+
+def texts(session: Session | None) -> list[str | None]:
+    """Return the text of each event in `session`."""
+    assert session is not None
+    return [
+        part.text
+        for event in session.events
+        if event.content
+        for part in event.content.parts or []
+    ]
+
+
+def test_lru_eviction_keeps_recently_used_sessions() -> None:
+    """Evict the least recently used session once the store is full."""
+
+    async def scenario() -> tuple[BoundedSessionService, list[Session | None]]:
+        store = BoundedSessionService(max_sessions=2)
+        for session_id in ("a", "b"):
+            await store.ensure_session(
+                app_name="app", user_id="u", session_id=session_id
+            )
+        # Touch "a" so "b" becomes least recently used.
+        await store.get_session(app_name="app", user_id="u", session_id="a")
+        await store.ensure_session(app_name="app", user_id="u", session_id="c")
+        return store, [
+            await store.get_session(app_name="app", user_id="u", session_id=sid)
+            for sid in ("a", "b", "c")
+        ]
+
+    store, (a, b, c) = asyncio.run(scenario())
+    assert a is not None and b is None and c is not None
+    assert store.stats()["evicted_sessions"] == 1
+    assert len(store) == 2
+
+
+def test_idle_sessions_expire() -> None:
+    """Drop sessions idle for longer than the TTL."""
+    clock = FakeClock()
+
+    async def scenario() -> tuple[BoundedSessionService, Session | None]:
+        store = BoundedSessionService(idle_ttl_seconds=10, clock=clock)
+        await store.ensure_session(app_name="app", user_id="u", session_id="old")
+        clock.now = 5
+        await store.ensure_session(app_name="app", user_id="u", session_id="new")
+        clock.now = 12
+        return store, await store.get_session(
+            app_name="app", user_id="u", session_id="old"
+        )
+
+    store, old = asyncio.run(scenario())
+    assert old is None
+    assert store.stats() == {
+        "sessions": 1,
+        "evicted_sessions": 0,
+        "expired_sessions": 1,
+        "trimmed_events": 0,
+    }
+
+
+def test_event_cap_trims_to_a_user_turn() -> None:
+    """Start the trimmed history at a user turn."""
+
+    async def scenario() -> Session | None:
+        store = BoundedSessionService(max_events=3)
+        await store.ensure_session(app_name="app", user_id="u", session_id="s")
+        for turn in range(3):
+            session = await store.get_session(
+                app_name="app", user_id="u", session_id="s"
+            )
+            assert session is not None
+            await store.append_event(session, make_event("user", f"q{turn}"))
+            await store.append_event(session, make_event("agent", f"a{turn}"))
+        return await store.get_session(app_name="app", user_id="u", session_id="s")
+
+    assert texts(asyncio.run(scenario())) == ["q2", "a2"]
+
+
+def test_event_cap_keeps_the_last_user_turn_of_a_long_tool_exchange() -> None:
+    """Keep the last user turn when the capped window holds none."""
+
+    async def scenario() -> tuple[Session | None, BoundedSessionService]:
+        store = BoundedSessionService(max_events=3)
+        await store.ensure_session(app_name="app", user_id="u", session_id="s")
+        session = await store.get_session(app_name="app", user_id="u", session_id="s")
+        assert session is not None
+        await store.append_event(session, make_event("user", "q0"))
+        await store.append_event(session, make_event("agent", "a0"))
+        await store.append_event(session, make_event("user", "q1"))
+        for step in range(4):
+            await store.append_event(session, make_event("agent", f"step{step}"))
+        return await store.get_session(
+            app_name="app", user_id="u", session_id="s"
+        ), store
+
+    session, store = asyncio.run(scenario())
+    assert texts(session) == ["q1", "step0", "step1", "step2", "step3"]
+    assert store.stats()["trimmed_events"] == 2
+
+
+def test_ensure_session_is_idempotent() -> None:
+    """Create a session only once however often it is ensured."""
+
+    async def scenario() -> BoundedSessionService:
+        store = BoundedSessionService()
+        await store.ensure_session(app_name="app", user_id="u", session_id="s")
+        await store.ensure_session(app_name="app", user_id="u", session_id="s")
+        return store
+
+    assert len(asyncio.run(scenario())) == 1
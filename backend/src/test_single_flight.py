@@ -0,0 +1,100 @@
+"""Tests for coalescing concurrent runs."""
+
+import asyncio
+from typing import Any, AsyncIterator
+
+from src.single_flight import SharedRun, SingleFlight
+
+
+async def numbers(
+    count: int, started: list[int], delay: float = 0.01
+) -> AsyncIterator[int]:
+    """Yield `count` numbers, `delay` seconds apart, noting the start."""
+    started.append(1)
+    for number in range(count):
+        await asyncio.sleep(delay)
+        yield number
+
+
+async def consume(events: AsyncIterator[Any]) -> list[Any]:
+    """Return all events of `events`."""
+    return [event async for event in events]
+
+
+def test_concurrent_callers_share_one_run() -> None:
+    """Share one run between callers, including those joining late."""
+
+    async def scenario() -> tuple[
+        SingleFlight, list[int], bool, bool, list[Any], list[Any]
+    ]:
+        flight = SingleFlight()
+        started: list[int] = []
+        first, leader = flight.join("q", lambda: numbers(5, started))
+        first_events = first.subscribe()
+        head = await anext(first_events)
+        await asyncio.sleep(0.025)
+        # Joins partway through and still sees every event.
+        second, second_leader = flight.join("q", lambda: numbers(5, started))
+        results = await asyncio.gather(
+            consume(first_events), consume(second.subscribe())
+        )
+        return flight, started, leader, second_leader, [head] + results[0], results[1]
+
+    flight, started, leader, second_leader, first, second = asyncio.run(scenario())
+    assert started == [1]
+    assert leader and not second_leader
+    assert first == second == [0, 1, 2, 3, 4]
+    assert flight.stats() == {"runs": 1, "coalesced_requests": 1, "in_flight": 0}
+
+
+def test_finished_runs_are_not_joined() -> None:
+    """Start a fresh run once the previous run for the key finished."""
+
+    async def scenario() -> tuple[list[int], bool]:
+        flight = SingleFlight()
+        started: list[int] = []
+        run, _ = flight.join("q", lambda: numbers(1, started))
+        await consume(run.subscribe())
+        run, leader = flight.join("q", lambda: numbers(1, started))
+        await consume(run.subscribe())
+        return started, leader
+
+    started, leader = asyncio.run(scenario())
+    assert started == [1, 1] and leader
+
+
+def test_errors_reach_every_subscriber() -> None:
+    """Raise the run's error in every subscriber."""
+
+    async def failing() -> AsyncIterator[None]:
+        await asyncio.sleep(0.01)
+        raise ValueError("quota")
+        yield
+
+    async def scenario() -> list[Any]:
+        run, _ = SingleFlight().join("q", failing)
+        return list(
+            await asyncio.gather(
+                consume(run.subscribe()),
+                consume(run.subscribe()),
+                return_exceptions=True,
+            )
+        )
+
+    assert [str(e) for e in asyncio.run(scenario())] == ["quota", "quota"]
+
+
+def test_run_is_cancelled_when_all_subscribers_leave() -> None:
+    """Cancel the run once its last subscriber detaches."""
+
+    async def scenario() -> SharedRun:
+        run, _ = SingleFlight().join("q", lambda: numbers(100, []))
+        events = run.subscribe()
+        await anext(events)
+        await events.aclose()
+        await asyncio.sleep(0.02)
+        return run
+
+    run = asyncio.run(scenario())
+    assert run.finished
+    assert isinstance(run.error, asyncio.CancelledError)
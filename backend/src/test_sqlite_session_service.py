@@ -0,0 +1,186 @@
+"""Tests for the SQLite session service."""
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+import pytest
+from google.adk.events import Event, EventActions
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from google.genai import types
+
+from src.sqlite_session_service import SqliteSessionService
+
+
+def make_event(
+    author: str, text: str, state_delta: dict[str, Any] | None = None
+) -> Event:
+    """Return an event of `author` holding `text` and `state_delta`."""
+    return Event(
+        author=author,
+        invocation_id="inv",
+        content=types.Content(
+            role="user" if author == "user" else "model",
+            parts=[types.Part(text=text)],
+        ),
+        actions=EventActions(state_delta=state_delta or {}),
+    )
+
+
+def texts(session: Session | None) -> list[str | None]:
+    """Return the text of each event in `session`."""
+    assert session is not None
+    return [
+        part.text
+        for event in session.events
+        if event.content
+        for part in event.content.parts or []
+    ]
+
+
+def test_buffered_events_are_visible_before_flush(tmp_path: Path) -> None:
+    """Serve appended events from the buffer before they are written."""
+
+    async def scenario() -> tuple[Session | None, int]:
+        service = SqliteSessionService(str(tmp_path / "s.db"), flush_interval=60)
+        session = await service.create_session(
+            app_name="app", user_id="u", session_id="s"
+        )
+        await service.append_event(session, make_event("user", "hi"))
+        before_flush = await service.get_session(
+            app_name="app", user_id="u", session_id="s"
+        )
+        flushed = service.flushed_events
+        await service.close()
+        return before_flush, flushed
+
+    session, flushed = asyncio.run(scenario())
+    assert texts(session) == ["hi"]
+    assert flushed == 0
+
+
+def test_sessions_survive_restart(tmp_path: Path) -> None:
+    """Load sessions and their scoped state after the service is reopened."""
+    db_path = str(tmp_path / "s.db")
+
+    async def write() -> None:
+        service = SqliteSessionService(db_path)
+        session = await service.create_session(
+            app_name="app", user_id="u", session_id="s", state={"user:lang": "en"}
+        )
+        await service.append_event(
+            session, make_event("user", "q1", {"topic": "horses"})
+        )
+        await service.append_event(session, make_event("agent", "a1", {"app:hits": 1}))
+        await service.close()
+
+    async def read() -> tuple[Session | None, ListSessionsResponse]:
+        service = SqliteSessionService(db_path)
+        session = await service.get_session(app_name="app", user_id="u", session_id="s")
+        listed = await service.list_sessions(app_name="app", user_id="u")
+        await service.close()
+        return session, listed
+
+    asyncio.run(write())
+    session, listed = asyncio.run(read())
+    assert texts(session) == ["q1", "a1"]
+    assert session is not None
+    assert session.state == {"topic": "horses", "app:hits": 1, "user:lang": "en"}
+    assert [s.id for s in listed.sessions] == ["s"]
+
+
+def test_recent_event_window_starts_at_user_turn(tmp_path: Path) -> None:
+    """Start a window of recent events at a user turn."""
+
+    async def scenario() -> Session | None:
+        service = SqliteSessionService(str(tmp_path / "s.db"), batch_size=2)
+        session = await service.create_session(
+            app_name="app", user_id="u", session_id="s"
+        )
+        for turn in range(3):
+            await service.append_event(session, make_event("user", f"q{turn}"))
+            await service.append_event(session, make_event("agent", f"a{turn}"))
+        await service.flush()
+        recent = await service.get_session(
+            app_name="app",
+            user_id="u",
+            session_id="s",
+            config=GetSessionConfig(num_recent_events=3),
+        )
+        await service.close()
+        return recent
+
+    assert texts(asyncio.run(scenario())) == ["q2", "a2"]
+
+
+def test_ensure_and_delete_session(tmp_path: Path) -> None:
+    """Create a session once however often it is ensured, then delete it."""
+
+    async def scenario() -> tuple[Session | None, Session | None]:
+        service = SqliteSessionService(str(tmp_path / "s.db"))
+        await service.ensure_session(app_name="app", user_id="u", session_id="s")
+        await service.ensure_session(app_name="app", user_id="u", session_id="s")
+        created = await service.get_session(app_name="app", user_id="u", session_id="s")
+        await service.delete_session(app_name="app", user_id="u", session_id="s")
+        deleted = await service.get_session(app_name="app", user_id="u", session_id="s")
+        await service.close()
+        return created, deleted
+
+    created, deleted = asyncio.run(scenario())
+    assert created is not None and deleted is None
+
+
+def test_failed_flush_keeps_state_deltas_for_retry(tmp_path: Path) -> None:
+    """Keep buffered events and state deltas when a flush fails."""
+    db_path = str(tmp_path / "s.db")
+
+    async def write() -> None:
+        service = SqliteSessionService(db_path, flush_interval=60)
+        session = await service.create_session(
+            app_name="app", user_id="u", session_id="s"
+        )
+        await service.append_event(
+            session, make_event("agent", "a1", {"app:hits": 1, "user:lang": "en"})
+        )
+
+        def failing_write(*args: Any) -> None:
+            raise sqlite3.OperationalError("database is locked")
+
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(service, "_write_batch", failing_write)
+            with pytest.raises(sqlite3.OperationalError):
+                await service.flush()
+        await service.close()
+
+    async def read() -> Session | None:
+        service = SqliteSessionService(db_path)
+        session = await service.get_session(app_name="app", user_id="u", session_id="s")
+        await service.close()
+        return session
+
+    asyncio.run(write())
+    session = asyncio.run(read())
+    assert texts(session) == ["a1"]
+    assert session is not None
+    assert session.state == {"app:hits": 1, "user:lang": "en"}
+
+
+def test_known_sessions_are_bounded(tmp_path: Path) -> None:
+    """Remember only the most recently ensured session keys."""
+
+    async def scenario() -> list[tuple[str, str, str]]:
+        service = SqliteSessionService(str(tmp_path / "s.db"), known_sessions=2)
+        for session_id in ("a", "b", "c"):
+            await service.ensure_session(
+                app_name="app", user_id="u", session_id=session_id
+            )
+        known = list(service._known)
+        await service.close()
+        return known
+
+    assert asyncio.run(scenario()) == [("app", "u", "b"), ("app", "u", "c")]
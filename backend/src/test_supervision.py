@@ -0,0 +1,154 @@
+"""Tests for supervised agent runs."""
+
+import asyncio
+from typing import Any, AsyncIterator
+
+import pytest
+
+from src.supervision import (
+    ClientDisconnected,
+    RunSupervisor,
+    RunTimeout,
+    SupervisedRun,
+)
+
+
+async def slow_run(
+    steps: int, cleanup: list[str], delay: float = 0.05
+) -> AsyncIterator[int]:
+    """Yield `steps` numbers `delay` seconds apart, noting when it is closed."""
+    try:
+        for step in range(steps):
+            await asyncio.sleep(delay)  # e.g. a model or tool call
+            yield step
+    finally:
+        cleanup.append("closed")
+
+
+async def consume(run: SupervisedRun) -> list[Any]:
+    """Return all events of `run`."""
+    return [event async for event in run.events()]
+
+
+def test_completed_runs_yield_all_events() -> None:
+    """Yield every event of a run that completes."""
+
+    async def scenario() -> tuple[RunSupervisor, list[str], list[Any]]:
+        supervisor = RunSupervisor()
+        cleanup: list[str] = []
+        events = await consume(supervisor.start(slow_run(3, cleanup, 0)))
+        return supervisor, cleanup, events
+
+    supervisor, cleanup, events = asyncio.run(scenario())
+    assert events == [0, 1, 2]
+    assert cleanup == ["closed"]
+    assert supervisor.stats()["completed"] == 1
+
+
+def test_disconnect_cancels_the_run_mid_call() -> None:
+    """Cancel the run while it waits once the client disconnects."""
+
+    async def scenario() -> tuple[RunSupervisor, list[str], list[Any]]:
+        supervisor, gone = RunSupervisor(), asyncio.Event()
+        cleanup: list[str] = []
+        run = supervisor.start(slow_run(100, cleanup), disconnected=gone.wait)
+        seen = []
+        with pytest.raises(ClientDisconnected):
+            async for event in run.events():
+                seen.append(event)
+                gone.set()
+        return supervisor, cleanup, seen
+
+    supervisor, cleanup, seen = asyncio.run(scenario())
+    assert seen == [0]
+    assert cleanup == ["closed"]
+    assert supervisor.stats()["cancelled"] == 1
+
+
+def test_deadline_stops_the_run() -> None:
+    """Stop the run and raise RunTimeout once the deadline passes."""
+
+    async def scenario() -> tuple[RunSupervisor, list[str]]:
+        supervisor = RunSupervisor(timeout=0.12)
+        cleanup: list[str] = []
+        run = supervisor.start(
+            slow_run(100, cleanup), timeout=supervisor.deadline(None)
+        )
+        with pytest.raises(RunTimeout):
+            await consume(run)
+        return supervisor, cleanup
+
+    supervisor, cleanup = asyncio.run(scenario())
+    assert cleanup == ["closed"]
+    assert supervisor.stats() == {
+        "completed": 0,
+        "failed": 0,
+        "cancelled": 0,
+        "timed_out": 1,
+    }
+
+
+def test_consumer_leaving_early_cancels_the_run() -> None:
+    """Cancel the run when its consumer stops iterating."""
+
+    async def scenario() -> tuple[RunSupervisor, list[str]]:
+        supervisor = RunSupervisor()
+        cleanup: list[str] = []
+        run = supervisor.start(slow_run(100, cleanup))
+        events = run.events()
+        await anext(events)
+        await events.aclose()
+        await asyncio.sleep(0)
+        return supervisor, cleanup
+
+    supervisor, cleanup = asyncio.run(scenario())
+    assert cleanup == ["closed"]
+    assert supervisor.stats()["cancelled"] == 1
+
+
+def test_failures_are_raised_and_counted() -> None:
+    """Raise the run's error to the consumer and count the failure."""
+
+    async def broken() -> AsyncIterator[int]:
+        yield 1
+        raise ValueError("tool failed")
+
+    async def scenario() -> RunSupervisor:
+        supervisor = RunSupervisor()
+        with pytest.raises(ValueError):
+            await consume(supervisor.start(broken()))
+        return supervisor
+
+    assert asyncio.run(scenario()).stats()["failed"] == 1
+
+
+def test_requests_can_only_shorten_the_deadline() -> None:
+    """Accept shorter requested deadlines and ignore longer or invalid ones."""
+    supervisor = RunSupervisor(timeout=30)
+    assert supervisor.deadline(None) == 30
+    assert supervisor.deadline("5") == 5
+    assert supervisor.deadline("300") == 30
+    assert supervisor.deadline("soon") == 30
+    assert RunSupervisor(timeout=0).deadline(None) is None
+    assert RunSupervisor(timeout=0).deadline("2.5") == 2.5
+
+
+def test_bounded_buffer_pauses_the_run_until_the_consumer_reads() -> None:
+    """Pause the run once the buffer is full until the consumer reads."""
+    produced = []
+
+    async def run() -> AsyncIterator[int]:
+        for step in range(10):
+            produced.append(step)
+            yield step
+
+    async def scenario() -> tuple[int, list[Any]]:
+        supervised = RunSupervisor().start(run(), max_buffered=2)
+        await asyncio.sleep(0.05)
+        paused_at = len(produced)
+        events = await consume(supervised)
+        return paused_at, events
+
+    paused_at, events = asyncio.run(scenario())
+    assert paused_at <= 3
+    assert events == list(range(10))
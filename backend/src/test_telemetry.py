@@ -0,0 +1,137 @@
+"""Tests for structured logging and trace spans."""
+
+import asyncio
+import json
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from pytest import MonkeyPatch
+
+from src import telemetry as telemetry_module
+from src.telemetry import Telemetry
+
+
+def read_records(path: Path) -> list[dict[str, Any]]:
+    """Return the JSON records written to `path`."""
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_records_are_written_as_json_lines(tmp_path: Path) -> None:
+    """Write records at or above the level as JSON lines with truncated fields."""
+    sink = tmp_path / "log.jsonl"
+    log = Telemetry(sink=str(sink), max_field_chars=20)
+    log.debug("hidden")
+    log.info("Compacted session", session_id="s1", note="x" * 25)
+    log.flush()
+    [record] = read_records(sink)
+    assert record["msg"] == "Compacted session"
+    assert record["session_id"] == "s1"
+    assert record["note"] == "x" * 20 + "...[5 more]"
+    assert log.stats()["written"] == 1
+
+
+def test_level_and_sampling_can_change_at_runtime(tmp_path: Path) -> None:
+    """Apply a new level and sample rate to the records that follow."""
+    sink = tmp_path / "log.jsonl"
+    log = Telemetry(sink=str(sink))
+    log.configure(level="debug", sample_rate=0)
+    log.debug("unsampled")
+    log.warning("always kept")
+    log.configure(sample_rate=1)
+    log.debug("sampled")
+    log.flush()
+    assert [r["msg"] for r in read_records(sink)] == ["always kept", "sampled"]
+    assert log.stats()["level"] == "DEBUG"
+
+
+def test_spans_nest_within_a_trace(tmp_path: Path) -> None:
+    """Record spans of tasks as children of the span that started them."""
+    sink = tmp_path / "log.jsonl"
+    log = Telemetry(sink=str(sink), level="DEBUG")
+
+    async def agent_run() -> None:
+        with log.span("agent", agent="custom"):
+            log.debug("Model event")
+            await asyncio.sleep(0)
+
+    async def request() -> None:
+        with log.span("request"):
+            # Tasks inherit the current span, like agent runs do.
+            await asyncio.create_task(agent_run())
+
+    asyncio.run(request())
+    log.flush()
+    event, agent, request_span = read_records(sink)
+    assert agent["parent_id"] == request_span["span_id"]
+    assert request_span["parent_id"] is None
+    assert event["span_id"] == agent["span_id"]
+    assert {r["trace_id"] for r in (event, agent, request_span)} == {
+        request_span["trace_id"]
+    }
+    assert agent["duration_ms"] >= 0
+
+
+def test_failed_spans_are_kept_without_debug(tmp_path: Path) -> None:
+    """Record failed spans even when debug records are off."""
+    sink = tmp_path / "log.jsonl"
+    log = Telemetry(sink=str(sink))
+    with log.span("ok"):
+        pass
+    try:
+        with log.span("tool", tool="roll_a_dice"):
+            raise ValueError("no dice")
+    except ValueError:
+        pass
+    log.flush()
+    [record] = read_records(sink)
+    assert record["span"] == "tool"
+    assert record["level"] == "ERROR"
+    assert "no dice" in record["error"]
+
+
+def test_full_queue_drops_instead_of_blocking() -> None:
+    """Drop and count records once the queue is full."""
+    log = Telemetry(max_queue=2)
+    log._writer = threading.current_thread()  # keep the writer from draining
+    for _ in range(5):
+        log.info("burst")
+    assert log.stats()["queued"] == 2
+    assert log.stats()["dropped"] == 3
+
+
+def test_file_sink_is_rotated_at_size_cap(tmp_path: Path) -> None:
+    """Rotate a file sink once it reaches its size cap."""
+    sink = tmp_path / "log.jsonl"
+    log = Telemetry(sink=str(sink), max_file_bytes=200)
+    for index in range(10):
+        log.info("filler", index=index)
+        log.flush()
+    rotated = tmp_path / "log.jsonl.1"
+    assert rotated.exists()
+    assert len(read_records(sink)) + len(read_records(rotated)) < 10
+
+
+def test_tool_spans_without_call_ids_are_kept_apart(monkeypatch: MonkeyPatch) -> None:
+    """Keep spans of concurrent tool calls without call ids apart."""
+    ended = []
+    monkeypatch.setattr(
+        telemetry_module.telemetry,
+        "end_span",
+        lambda span, error=None: ended.append((span.attributes["agent"], error)),
+    )
+    tool: Any = SimpleNamespace(name="roll_a_dice")
+    first: Any = SimpleNamespace(
+        invocation_id="inv", function_call_id=None, agent_name="first"
+    )
+    second: Any = SimpleNamespace(
+        invocation_id="inv", function_call_id=None, agent_name="second"
+    )
+    telemetry_module.start_tool_span(tool, {}, first)
+    telemetry_module.start_tool_span(tool, {}, second)
+    error = RuntimeError("boom")
+    telemetry_module.fail_tool_span(tool, {}, second, error)
+    telemetry_module.end_tool_span(tool, {}, first, {})
+    assert ended == [("second", error), ("first", None)]
+    assert not telemetry_module._tool_spans
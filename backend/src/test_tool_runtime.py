@@ -0,0 +1,129 @@
+"""Tests of the tool runtime."""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any
+
+import pytest
+from google.adk.tools.function_tool import FunctionTool
+
+from src.tool_runtime import Memo, ToolRuntime, ToolTimeout
+from src.utils import roll_a_dice
+
+
+def test_sync_tools_run_off_the_event_loop() -> None:
+    """Run sync tools on a thread while the event loop keeps ticking."""
+
+    def lookup(key: str) -> str:
+        """Look up a key."""
+        time.sleep(0.1)
+        return f"{key}@{threading.get_ident()}"
+
+    async def scenario() -> tuple[str, int, dict[str, dict[str, Any]]]:
+        runtime = ToolRuntime(max_threads=2)
+        tool = runtime.register(lookup)
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        result = await tool("horse")
+        ticker.cancel()
+        runtime.shutdown()
+        return result, ticks, runtime.stats()
+
+    result, ticks, stats = asyncio.run(scenario())
+    assert result.startswith("horse@") and result != f"horse@{threading.get_ident()}"
+    assert ticks >= 5
+    assert stats["lookup"]["calls"] == 1 and stats["lookup"]["p50_ms"] >= 100
+
+
+def test_async_tools_time_out_and_limits_queue_calls() -> None:
+    """Time out slow async calls and queue calls past the concurrency limit."""
+    running, peak = 0, 0
+
+    async def fetch(delay: float) -> float:
+        """Wait `delay` seconds."""
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(delay)
+        running -= 1
+        return delay
+
+    async def scenario() -> tuple[list[Any], dict[str, Any]]:
+        runtime = ToolRuntime()
+        tool = runtime.register(fetch, timeout=0.2, max_concurrency=1)
+        results = list(await asyncio.gather(tool(0.05), tool(0.05), tool(0.05)))
+        with pytest.raises(ToolTimeout):
+            await tool(1.0)
+        return results, runtime.stats()["fetch"]
+
+    results, stats = asyncio.run(scenario())
+    assert results == [0.05, 0.05, 0.05]
+    assert peak == 1
+    assert stats["calls"] == 4 and stats["timeouts"] == 1 and stats["errors"] == 0
+
+
+def test_cpu_bound_tools_run_in_another_process() -> None:
+    """Run CPU-bound tools on the process pool."""
+
+    async def scenario() -> int:
+        runtime = ToolRuntime(max_processes=1)
+        tool = runtime.register(os.getpid, cpu_bound=True)
+        pid: int = await tool()
+        runtime.shutdown()
+        return pid
+
+    assert asyncio.run(scenario()) != os.getpid()
+
+
+def test_memoized_tools_skip_repeated_calls() -> None:
+    """Answer repeated calls of a memoized tool from the cache."""
+    calls: list[int] = []
+
+    def square(n: int) -> int:
+        """Square a number."""
+        calls.append(n)
+        return n * n
+
+    async def scenario() -> tuple[list[int], dict[str, Any]]:
+        runtime = ToolRuntime()
+        tool = runtime.register(square, memoize=True)
+        results = [await tool(3), await tool(n=3), await tool(3), await tool(4)]
+        runtime.shutdown()
+        return results, runtime.stats()["square"]
+
+    results, stats = asyncio.run(scenario())
+    assert results == [9, 9, 9, 16]
+    assert calls == [3, 4]
+    assert stats["cache_hits"] == 2
+
+
+def test_memo_expires_and_evicts_least_recently_used() -> None:
+    """Drop memoized results past their TTL or the entry limit."""
+    now = [0.0]
+    memo = Memo(max_entries=2, ttl=10, clock=lambda: now[0])
+    memo.put(("a",), 1)
+    memo.put(("b",), 2)
+    assert memo.get(("a",)) == 1
+    memo.put(("c",), 3)
+    assert memo.get(("b",), "evicted") == "evicted" and len(memo) == 2
+    now[0] = 11
+    assert memo.get(("a",), "expired") == "expired"
+    assert Memo.key(([1],), {}) is None
+
+
+def test_registered_tools_keep_their_declaration() -> None:
+    """Keep the tool's name and docstring for ADK to declare."""
+    tool = FunctionTool(ToolRuntime().register(roll_a_dice))
+    declaration = tool._get_declaration()
+    assert tool.name == "roll_a_dice"
+    assert declaration is not None and declaration.name == "roll_a_dice"
+    assert "six-sided dice" in tool.description
@@ -0,0 +1,157 @@
+"""Tests for the hash ring and the multi-worker dispatcher."""
+
+import asyncio
+import json
+from collections import Counter
+from typing import Any, AsyncGenerator
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from src.dispatcher import Worker, WorkerPool, create_app
+from src.workers import HashRing, new_conversation_id
+
+
+def test_ring_spreads_keys_and_only_moves_those_of_a_removed_worker() -> None:
+    """Spread keys evenly and only move a removed worker's keys."""
+    ring = HashRing(range(4))
+    keys = [f"conversation-{n}" for n in range(4000)]
+    before = {key: ring.node_for(key) for key in keys}
+    assert all(count > 600 for count in Counter(before.values()).values())
+
+    ring.remove(2)
+    after = {key: ring.node_for(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == 2 for key in moved)
+    assert 2 not in after.values()
+
+    ring.add(2)
+    assert {key: ring.node_for(key) for key in keys} == before
+    assert HashRing().node_for("anything") is None
+
+
+def test_new_conversation_ids_route_back_to_their_worker() -> None:
+    """Hash new conversation IDs back to the worker that made them."""
+    ring = HashRing(range(3))
+    for index in range(3):
+        assert ring.node_for(new_conversation_id(index, 3)) == index
+    assert len(new_conversation_id(0, 1)) == 32
+
+
+def fake_worker(index: int) -> FastAPI:
+    """Return an app answering like worker `index`."""
+    app = FastAPI()
+
+    @app.get("/ready")
+    async def ready() -> dict[str, Any]:
+        return {"status": "ok", "worker": index}
+
+    @app.post("/invoke")
+    async def invoke(request: Request) -> dict[str, Any]:
+        body = await request.json()
+        return {"worker": index, "conversation_id": body.get("conversation_id")}
+
+    @app.post("/invoke/batch")
+    async def batch(request: Request) -> StreamingResponse:
+        items = (await request.json())["items"]
+
+        async def lines() -> AsyncGenerator[str, None]:
+            for position, item in reversed(list(enumerate(items))):
+                query = item["query"] if isinstance(item, dict) else item
+                yield (
+                    json.dumps({"index": position, "response": f"{index}:{query}"})
+                    + "\n"
+                )
+            yield json.dumps({"done": True}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def fake_pool(count: int) -> WorkerPool:
+    """Return a pool of `count` healthy in-process fake workers."""
+    workers = [
+        Worker(
+            index=index,
+            socket_path="",
+            client=httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=fake_worker(index)),
+                base_url="http://worker",
+            ),
+        )
+        for index in range(count)
+    ]
+    pool = WorkerPool(count, workers=workers)
+    for worker in workers:
+        asyncio.run(pool.check(worker))
+    return pool
+
+
+async def post(
+    pool: WorkerPool,
+    path: str,
+    body: object,
+    headers: dict[str, str] | None = None,
+) -> httpx.Response:
+    """Post `body` as JSON to the dispatcher of `pool`."""
+    transport = httpx.ASGITransport(app=create_app(pool))
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://dispatcher"
+    ) as client:
+        return await client.post(path, json=body, headers=headers)
+
+
+def test_turns_of_a_conversation_always_reach_the_same_worker() -> None:
+    """Send every turn of a conversation to the same worker."""
+    pool = fake_pool(3)
+    ids = [f"chat-{n}" for n in range(30)]
+
+    async def scenario() -> tuple[dict[str, set[int]], int]:
+        workers: dict[str, set[int]] = {}
+        for conversation_id in ids * 2:
+            response = await post(
+                pool, "/invoke", {"conversation_id": conversation_id, "query": "hi"}
+            )
+            assert response.headers["X-Worker"] == str(response.json()["worker"])
+            workers.setdefault(conversation_id, set()).add(response.json()["worker"])
+        by_header = await post(
+            pool, "/invoke", {"query": "hi"}, {"X-Conversation-Id": "chat-1"}
+        )
+        return workers, by_header.json()["worker"]
+
+    workers, by_header = asyncio.run(scenario())
+    assert all(len(owners) == 1 for owners in workers.values())
+    assert len(set.union(*workers.values())) == 3
+    assert by_header == pool.ring.node_for("chat-1")
+
+
+def test_unhealthy_workers_leave_the_ring() -> None:
+    """Route around workers that failed their health check."""
+    pool = fake_pool(2)
+    owner = pool.ring.node_for("chat-x")
+    assert owner is not None
+    pool._set_health(pool.workers[owner], False)
+    response = asyncio.run(
+        post(pool, "/invoke", {"conversation_id": "chat-x", "query": "hi"})
+    )
+    assert response.json()["worker"] == 1 - owner
+    assert pool.stats()["healthy"] == 1
+
+
+def test_batches_are_split_by_conversation_owner_and_merged() -> None:
+    """Split batches by conversation owner and merge the results."""
+    pool = fake_pool(2)
+    items = [{"query": f"q{n}", "conversation_id": f"batch-{n}"} for n in range(8)] + [
+        "plain"
+    ]
+    response = asyncio.run(post(pool, "/invoke/batch", {"items": items}))
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results, summary = lines[:-1], lines[-1]
+    assert summary["done"] and summary["items"] == 9 and summary["errors"] == 0
+    by_index = {result["index"]: result for result in results}
+    for n in range(8):
+        owner = pool.ring.node_for(f"batch-{n}")
+        assert by_index[n]["response"] == f"{owner}:q{n}"
+    assert by_index[8]["response"].endswith(":plain")
@@ -0,0 +1,280 @@
+"""Runs agent tools off the event loop, with timeouts, limits and memoization."""
+
+import asyncio
+import functools
+import inspect
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from src.admission import AdmissionController
+from src.metrics import registry
+from src.telemetry import telemetry
+
+TOOL_RUNTIME_SECONDS = registry.histogram(
+    "tool_runtime_seconds",
+    "Latency of tools run through the tool runtime, by how the call ended: "
+    "ok, error, timeout or cached.",
+    ("tool", "outcome"),
+)
+
+_MISSING = object()
+
+
+class ToolTimeout(TimeoutError):
+    """Raised when a tool call runs past its timeout."""
+
+
+class Memo:
+    """LRU cache of tool results with a TTL, keyed by the call's arguments."""
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create an empty cache of at most `max_entries` results kept `ttl` seconds."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[tuple[Any, ...], tuple[float, Any]] = OrderedDict()
+
+    @staticmethod
+    def key(args: tuple[Any, ...], kwargs: dict[str, Any]) -> tuple[Any, ...] | None:
+        """Return the key of a call, or None if its arguments are unhashable."""
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key: tuple[Any, ...], default: Any = None) -> Any:
+        """Return the cached result, or `default` if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires, result = entry
+        if expires <= self._clock():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: tuple[Any, ...], result: Any) -> None:
+        """Store a result, evicting the least recently used one past `max_entries`."""
+        self._entries[key] = (self._clock() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        """Return the number of cached results, expired ones included."""
+        return len(self._entries)
+
+
+class ToolStats:
+    """Call counters and recent latencies of one tool."""
+
+    def __init__(self, window: int = 512) -> None:
+        """Create zeroed counters keeping the last `window` latencies."""
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.latencies: deque[float] = deque(maxlen=window)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the counters and p50/p95 latency in milliseconds."""
+        latencies = sorted(self.latencies)
+
+        def percentile(share: float) -> float | None:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(share * len(latencies)))
+            return round(latencies[index] * 1000, 3)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cache_hits": self.cache_hits,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+        }
+
+
+class ToolRuntime:
+    """Runs agent tools without blocking the event loop.
+
+    Tools are registered with `register()`, which returns an async function
+    with the tool's name, docstring and signature for ADK to declare. Native
+    async tools are awaited; sync tools run on a bounded thread pool, or on a
+    process pool when registered with `cpu_bound=True` (the function must
+    then be importable by name, so register the original, undecorated
+    function). Each call is subject to the tool's timeout and concurrency
+    limit, and pure tools can opt into memoization with a TTL and LRU bound.
+    Latencies are recorded in `tool_runtime_seconds` and `stats()`.
+
+    A timed-out call returns control to the agent at once, but a sync tool
+    keeps running in its thread or process until it returns.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 8,
+        max_processes: int = 2,
+        default_timeout: float = 30.0,
+        max_queue: int = 64,
+    ) -> None:
+        """Create a runtime; the executors start on first use.
+
+        Args:
+            max_threads: Threads running sync tools.
+            max_processes: Processes running CPU-bound tools.
+            default_timeout: Seconds a call may take unless its tool sets one.
+            max_queue: Calls that may wait for a tool's concurrency limit.
+        """
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self.default_timeout = default_timeout
+        self.max_queue = max_queue
+        self._threads: ThreadPoolExecutor | None = None
+        self._processes: ProcessPoolExecutor | None = None
+        self._stats: dict[str, ToolStats] = {}
+
+    def _executor(self, cpu_bound: bool) -> ThreadPoolExecutor | ProcessPoolExecutor:
+        if cpu_bound:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.max_processes)
+            return self._processes
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.max_threads, thread_name_prefix="tool"
+            )
+        return self._threads
+
+    def register(
+        self,
+        func: Callable[..., Any],
+        *,
+        cpu_bound: bool = False,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        memoize: bool = False,
+        ttl: float = 300.0,
+        max_entries: int = 128,
+    ) -> Callable[..., Awaitable[Any]]:
+        """Wrap a tool so it runs through this runtime.
+
+        Args:
+            func: The tool, sync or async.
+            cpu_bound: Run a sync tool on the process pool instead of a thread.
+            timeout: Seconds a call may take; defaults to `default_timeout`,
+                and 0 disables it.
+            max_concurrency: Most calls of this tool running at once; further
+                calls wait (up to the timeout) or fail with `Overloaded` when
+                `max_queue` calls are already waiting.
+            memoize: Cache results by arguments. Only for pure tools.
+            ttl: Seconds a memoized result is reused.
+            max_entries: Most memoized results kept.
+
+        Returns:
+            An async function to pass to the agent as the tool.
+        """
+        name = func.__name__
+        is_async = inspect.iscoroutinefunction(func)
+        timeout = self.default_timeout if timeout is None else timeout
+        stats = self._stats.setdefault(name, ToolStats())
+        memo = Memo(max_entries=max_entries, ttl=ttl) if memoize else None
+        signature = inspect.signature(func) if memoize else None
+        limit = (
+            AdmissionController(
+                max_in_flight=max_concurrency,
+                max_queue=self.max_queue,
+                queue_timeout=timeout or None,
+            )
+            if max_concurrency
+            else None
+        )
+
+        async def call(args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+            if is_async:
+                return await func(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor(cpu_bound), functools.partial(func, *args, **kwargs)
+            )
+
+        async def limited(args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+            if limit is None:
+                return await call(args, kwargs)
+            admitted_at = await limit.acquire()
+            try:
+                return await call(args, kwargs)
+            finally:
+                limit.release(admitted_at)
+
+        @functools.wraps(func)
+        async def run(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            stats.calls += 1
+            key = None
+            if memo is not None and signature is not None:
+                # Key by parameter name, so f(3) and f(n=3) share an entry.
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = memo.key((), bound.arguments)
+            if memo is not None and key is not None:
+                result = memo.get(key, _MISSING)
+                if result is not _MISSING:
+                    stats.cache_hits += 1
+                    self._observe(name, stats, "cached", started)
+                    return result
+            try:
+                if timeout:
+                    result = await asyncio.wait_for(limited(args, kwargs), timeout)
+                else:
+                    result = await limited(args, kwargs)
+            except TimeoutError:
+                stats.timeouts += 1
+                self._observe(name, stats, "timeout", started)
+                telemetry.warning("Tool timed out", tool=name, timeout=timeout)
+                raise ToolTimeout(f"{name} timed out after {timeout}s") from None
+            except Exception:
+                stats.errors += 1
+                self._observe(name, stats, "error", started)
+                raise
+            self._observe(name, stats, "ok", started)
+            if memo is not None and key is not None:
+                memo.put(key, result)
+            return result
+
+        return run
+
+    @staticmethod
+    def _observe(name: str, stats: ToolStats, outcome: str, started: float) -> None:
+        seconds = time.perf_counter() - started
+        stats.latencies.append(seconds)
+        TOOL_RUNTIME_SECONDS.observe(seconds, (name, outcome))
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return per-tool call counters and p50/p95 latency in milliseconds."""
+        return {name: stats.snapshot() for name, stats in self._stats.items()}
+
+    def shutdown(self) -> None:
+        """Stop the executors, letting running calls finish."""
+        for executor in (self._threads, self._processes):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
+
+
+tool_runtime = ToolRuntime(
+    max_threads=int(os.getenv("TOOL_THREADS", "8")),
+    max_processes=int(os.getenv("TOOL_PROCESSES", "2")),
+    default_timeout=float(os.getenv("TOOL_TIMEOUT_SECONDS", "30")),
+)
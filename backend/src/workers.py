@@ -0,0 +1,89 @@
+"""Conversation affinity for multi-worker servers, see dispatcher.py."""
+
+import bisect
+import hashlib
+import os
+import uuid
+from functools import cache
+from typing import Iterable
+
+# Set by the dispatcher for each worker process it starts, see dispatcher.py.
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent hash ring mapping conversation IDs to worker indexes.
+
+    Each worker owns `replicas` points on the ring and a key belongs to the
+    worker owning the next point, so removing a worker only moves the keys it
+    owned and adding it back returns exactly those.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 64) -> None:
+        """Create a ring holding `nodes`, with `replicas` points per node."""
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._owners: list[int] = []
+        self._nodes: set[int] = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: int) -> None:
+        """Add a worker to the ring, taking back the keys it owned."""
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.replicas):
+            point = _hash(f"worker-{node}-{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: int) -> None:
+        """Remove a worker, moving its keys to the next workers on the ring."""
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> int | None:
+        """Return the worker owning `key`, or None if the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def __contains__(self, node: int) -> bool:
+        """Return whether worker `node` is on the ring."""
+        return node in self._nodes
+
+    def __len__(self) -> int:
+        """Return the number of workers on the ring."""
+        return len(self._nodes)
+
+
+@cache
+def _full_ring(count: int) -> HashRing:
+    return HashRing(range(count))
+
+
+def new_conversation_id(index: int = WORKER_INDEX, count: int = WORKER_COUNT) -> str:
+    """Return a fresh conversation ID that the dispatcher routes to this worker.
+
+    IDs are drawn until one hashes to worker `index` on the ring of all
+    `count` workers (about `count` tries), so follow-up turns of a
+    conversation started without an ID come back to the worker holding it.
+    """
+    while True:
+        conversation_id = uuid.uuid4().hex
+        if count <= 1 or _full_ring(count).node_for(conversation_id) == index:
+            return conversation_id